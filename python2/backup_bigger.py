@@ -8,9 +8,12 @@ import os
 import sys
 import time
 import gzip
-import imghdr
+import argparse
 from csv import reader
-from zipfile import ZipFile
+from multiprocessing.pool import ThreadPool
+from zipfile import ZipFile, ZIP_STORED, ZIP_DEFLATED
+from backup_dedup import DedupIndex, add_file, index_path_for
+from image_scanner import is_image, modified_after, scan
 
 # =======================
 # VARIABLES
@@ -39,40 +42,118 @@ maximum_size_allowed = 700042  # ~700KB
 
 # 1001000 #(~1MB)
 
+# maximum bytes of images per zip volume, 0 writes a single zip
+volume_size = 0
+
+# volumes written at the same time
+backup_workers = 1
+
 # Current time
 now = time.time()
 
 timestamp_file = os.path.join(backup_folder, timestamp_name)
 
 
-def from_ago(file):
-    return (now - os.stat(file).st_mtime) / (3600*24) < compress_older_days
+def from_ago(file, st=None):
+    st = st or os.stat(file)
+    return (now - st.st_mtime) / (3600*24) < compress_older_days
 
 
-def size_greater_than(file):
-    return os.path.getsize(file) > maximum_size_allowed
+def size_greater_than(file, st=None):
+    st = st or os.stat(file)
+    return st.st_size > maximum_size_allowed
 
 
-def make_backup():
-    gzipname = "{}{}{}".format(now, scriptname, '.zip')
-    gzipfile = os.path.join(backup_folder, gzipname)
+def collect_files(since=None, scan_workers=1):
+    """
+    List the images to back up as (path, size) tuples.
+
+    since is the last checkpoint timestamp: when given only files modified
+    after it are included, otherwise the compress_older_days window applies.
+    """
+    if since is not None:
+        recent = modified_after(since)
+    else:
+        recent = lambda entry: from_ago(entry.path, entry.stat)
+    predicates = [recent, lambda entry: size_greater_than(entry.path, entry.stat), is_image]
+    return [(entry.path, entry.stat.st_size)
+            for entry in scan(images_folder, predicates, workers=scan_workers)]
+
+
+def split_volumes(files, max_bytes):
+    """
+    Split files into consecutive volumes of at most max_bytes of input.
+
+    A single file larger than max_bytes gets a volume of its own.
+    """
+    if not max_bytes:
+        return [files]
+    volumes = [[]]
+    used = 0
+    for f, size in files:
+        if volumes[-1] and used + size > max_bytes:
+            volumes.append([])
+            used = 0
+        volumes[-1].append((f, size))
+        used += size
+    return volumes
+
+
+def write_volume(job):
+    """Write one zip volume, returns the bytes of input it archived."""
+    zip_path, files, compression, index = job
+    written = 0
+    with ZipFile(zip_path, 'w', compression, allowZip64=True) as zipObj:
+        for f, size in files:
+            # Add multiple files to the zip
+            if index is not None:
+                add_file(zipObj, os.path.basename(zip_path), index, f)
+            else:
+                zipObj.write(f)
+            written += size
+    return written
+
+
+def make_backup(since=None, compress=False, max_volume=0, workers=1, dedup=False, scan_workers=1):
+    """
+    Back up the selected images into one zip or a set of zip volumes.
+
+    Volumes are written concurrently, zlib releases the GIL while it
+    deflates so compressed volumes scale with the number of workers.
+    With dedup each distinct content is stored once and the set gets an
+    .index.json to restore the original tree with backup_dedup.py.
+
+    Returns:
+        tuple: (zip names, bytes archived, seconds elapsed)
+    """
+    start = time.time()
 
     # create a directory if it does not exist
     if not os.path.exists(backup_folder):
         os.makedirs(backup_folder)
 
-    # Create a ZipFile Object
-    with ZipFile(gzipfile, 'w') as zipObj:
-        # Loop through all the folder
-        for root, _, files in os.walk(images_folder, topdown=False):
-            for file in files:
-                # print root, name
-                f = os.path.join(root, file)
-                if from_ago(f) and size_greater_than(f) and imghdr.what(f):
-                    # Add multiple files to the zip
-                    zipObj.write(f)
+    volumes = split_volumes(collect_files(since, scan_workers), max_volume)
+    compression = ZIP_DEFLATED if compress else ZIP_STORED
+    if len(volumes) == 1:
+        names = ["{}{}{}".format(now, scriptname, '.zip')]
+    else:
+        names = ["{}{}.{:03d}{}".format(now, scriptname, i + 1, '.zip')
+                 for i in range(len(volumes))]
+    index = DedupIndex() if dedup else None
+    jobs = [(os.path.join(backup_folder, name), files, compression, index)
+            for name, files in zip(names, volumes)]
+
+    pool = ThreadPool(max(1, min(workers, len(jobs))))
+    try:
+        total = sum(pool.map(write_volume, jobs))
+    finally:
+        pool.close()
+        pool.join()
+    if index is not None:
+        index.save(index_path_for(backup_folder, "{}{}".format(now, scriptname)))
     # actualizamos el timestamp
     write_timestamp()
+    return names, total, time.time() - start
 
 
 def get_timestamp():
@@ -99,15 +180,43 @@ def decodeName(name):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='backup the bigger images into zip volumes')
+    parser.add_argument('-incremental', nargs='?',
+                        type=str, choices=("y", "n"), help='only images newer than the last checkpoint, is "n" by default',
+                        default="n")
+    parser.add_argument('-compress', nargs='?',
+                        type=str, choices=("y", "n"), help='deflate the zip members, is "n" (stored) by default',
+                        default="n")
+    parser.add_argument('-volume', nargs='?',
+                        type=int, help='maximum bytes of images per zip volume, 0 for a single zip',
+                        default=volume_size)
+    parser.add_argument('-workers', nargs='?',
+                        type=int, help='volumes written at the same time', default=backup_workers)
+    parser.add_argument('-dedup', nargs='?',
+                        type=str, choices=("y", "n"), help='store each distinct image once, is "n" by default',
+                        default="n")
+    parser.add_argument('-scan-workers', nargs='?', dest='scan_workers',
+                        type=int, help='folders listed at the same time, useful on NFS', default=1)
+    args = parser.parse_args()
+
+    checkpoint = None
     if os.path.isfile(timestamp_file):
+        checkpoint = float(get_timestamp())
         # comprobamos si el timestamp fue actualizado recientemente, es decir antes de image_older_days
-        if ((now - float(get_timestamp())) / (3600 * 24) < (image_older_days - 0.2)):
+        if ((now - checkpoint) / (3600 * 24) < (image_older_days - 0.2)):
             sys.exit()
     else:
         # first time and creamos el timestamp
         write_timestamp()
-    make_backup()
+    names, total, elapsed = make_backup(since=checkpoint if args.incremental == "y" else None,
+                                        compress=args.compress == "y", max_volume=args.volume,
+                                        workers=args.workers, dedup=args.dedup == "y",
+                                        scan_workers=args.scan_workers)
     # body del email, el print se envia por el cronjob como el email.
-    body = "Ha sido creado el backup {}{}{} con nuevas imagenes de los restaurantes a procesar!!!".format(
-        now, scriptname, '.zip')
-    print(body)
\ No newline at end of file
+    body = "Ha sido creado el backup {} con nuevas imagenes de los restaurantes a procesar!!!".format(
+        ", ".join(names))
+    print(body)
+    megabytes = total / (1024.0 * 1024.0)
+    print("{:.2f} MB en {:.2f} s ({:.2f} MB/s)".format(
+        megabytes, elapsed, megabytes / elapsed if elapsed else 0.0))
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Content addressed deduplication for image backups.
+
+Each unique file content is stored once in the backup set as
+blobs/<xx>/<sha256>, and a JSON index next to the archives maps every
+original path to its blob and every blob to the zip volume holding it.
+
+Restore a backup set with:
+
+    python backup_dedup.py 1611369979.42-restaurant.index.json [dest_root]
+"""
+
+# =======================
+# MODULES IMPORTS
+# =======================
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import threading
+from zipfile import ZipFile
+
+# =======================
+# VARIABLES
+# =======================
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+INDEX_VERSION = 1
+
+
+def file_sha256(file_path, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Hash a file without reading it fully into memory.
+
+    Args:
+        file_path (str): Path to the file
+        chunk_size (int): Bytes read per iteration
+
+    Returns:
+        str: Hex SHA-256 digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as fh:
+        chunk = fh.read(chunk_size)
+        while chunk:
+            digest.update(chunk)
+            chunk = fh.read(chunk_size)
+    return digest.hexdigest()
+
+
+def blob_name(digest):
+    """Archive name of the blob holding the content with this digest."""
+    return 'blobs/{}/{}'.format(digest[:2], digest)
+
+
+def index_path_for(backup_folder, set_name):
+    """Path of the index of the backup set whose zips start with set_name."""
+    return os.path.join(backup_folder, '{}.index.json'.format(set_name))
+
+
+class DedupIndex(object):
+    """
+    Maps original paths to blobs for one backup set.
+
+    Several volumes may be written at the same time, claim() makes sure only
+    the first writer of a given content stores its blob.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.blobs = {}
+        self.duplicates = 0
+        self.saved_bytes = 0
+        self._lock = threading.Lock()
+
+    def claim(self, digest, volume, size=0):
+        """
+        Claim a blob for a volume.
+
+        Args:
+            digest (str): Content digest
+            volume (str): File name of the volume that would store it
+            size (int): Content size, counted as saved on duplicates
+
+        Returns:
+            bool: True if the caller must store the blob, False if it is
+                already stored in the set
+        """
+        with self._lock:
+            if digest in self.blobs:
+                self.duplicates += 1
+                self.saved_bytes += size
+                return False
+            self.blobs[digest] = volume
+            return True
+
+    def add(self, file_path, digest):
+        with self._lock:
+            self.files[file_path] = digest
+
+    def save(self, index_path):
+        """Write the index as JSON, volumes are stored by file name."""
+        with open(index_path, 'w') as fh:
+            json.dump({'version': INDEX_VERSION, 'blobs': self.blobs,
+                       'files': self.files}, fh, sort_keys=True)
+
+
+def add_file(zip_obj, volume, index, file_path):
+    """
+    Add file_path to zip_obj unless its content is already in the set.
+
+    Args:
+        zip_obj (ZipFile): Open volume
+        volume (str): File name of the volume, as stored in the index
+        index (DedupIndex): Index of the backup set
+        file_path (str): File to back up
+
+    Returns:
+        bool: True if the content was stored, False if it was a duplicate
+    """
+    digest = file_sha256(file_path)
+    stored = index.claim(digest, volume, os.path.getsize(file_path))
+    if stored:
+        zip_obj.write(file_path, blob_name(digest))
+    index.add(file_path, digest)
+    return stored
+
+
+def restore(index_path, dest_root=None):
+    """
+    Put back the original tree of a backup set.
+
+    Args:
+        index_path (str): Path to the set's .index.json
+        dest_root (str): Restore under this folder, None restores the
+            original paths in place
+
+    Returns:
+        int: Number of files restored
+    """
+    with open(index_path) as fh:
+        index = json.load(fh)
+    folder = os.path.dirname(os.path.abspath(index_path))
+    volumes = {}
+    restored = 0
+    try:
+        for file_path, digest in sorted(index['files'].items()):
+            volume = index['blobs'][digest]
+            if volume not in volumes:
+                volumes[volume] = ZipFile(os.path.join(folder, volume))
+            target = file_path
+            if dest_root is not None:
+                relative = os.path.splitdrive(file_path)[1].lstrip('/\\')
+                target = os.path.join(dest_root, relative)
+            target_dir = os.path.dirname(target)
+            if target_dir and not os.path.isdir(target_dir):
+                os.makedirs(target_dir)
+            src = volumes[volume].open(blob_name(digest))
+            try:
+                with open(target, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+            finally:
+                src.close()
+            restored += 1
+    finally:
+        for zip_obj in volumes.values():
+            zip_obj.close()
+    return restored
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print('uso: backup_dedup.py INDEX [DEST_ROOT]')
+        sys.exit(1)
+    count = restore(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print('Restaurados {} ficheros'.format(count))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of image_sniffer against imghdr.
+
+Builds a corpus of small files with real image headers (and some non
+images) in a temporary folder, then times imghdr.what() and
+image_sniffer.sniff() over every file and checks that both agree on the
+types imghdr knows.
+
+Example:
+    python bench_image_sniffer.py -files 100000
+"""
+
+# =======================
+# MODULES IMPORTS
+# =======================
+
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+from image_sniffer import HEADER_SIZE, sniff, sniff_header, sniff_many
+
+try:
+    import imghdr
+except ImportError:  # removed in Python 3.13
+    imghdr = None
+
+# =======================
+# VARIABLES
+# =======================
+
+HEADERS = [
+    b'\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01',
+    b'\xff\xd8\xff\xe1\x00\x18Exif\x00\x00',
+    b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR',
+    b'GIF89a\x01\x00\x01\x00',
+    b'RIFF\x24\x00\x00\x00WEBPVP8 ',
+    b'BM\x36\x00\x00\x00\x00\x00',
+    b'II*\x00\x08\x00\x00\x00',
+    b'\x00\x00\x00\x1cftypavif\x00\x00\x00\x00avifmif1',
+    b'\x00\x00\x00\x18ftypheic\x00\x00\x00\x00mif1heic',
+    b'plain text, not an image at all',
+]
+
+
+def build_corpus(folder, count, seed=1):
+    """Write count files spread over 100 sub folders."""
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        subdir = os.path.join(folder, '{:02d}'.format(i % 100))
+        if not os.path.isdir(subdir):
+            os.makedirs(subdir)
+        path = os.path.join(subdir, 'img{}.bin'.format(i))
+        with open(path, 'wb') as fh:
+            fh.write(rng.choice(HEADERS).ljust(HEADER_SIZE * 4, b'\x00'))
+        paths.append(path)
+    return paths
+
+
+def timed(label, func, paths):
+    start = time.time()
+    result = func(paths)
+    elapsed = time.time() - start
+    print('{:<28} {:8.3f} s {:10.0f} files/s'.format(label, elapsed, len(paths) / elapsed))
+    return result
+
+
+def main(count, workers):
+    folder = tempfile.mkdtemp(prefix='bench_sniffer_')
+    try:
+        paths = build_corpus(folder, count)
+        print('{} files in {}'.format(len(paths), folder))
+
+        sniffed = timed('image_sniffer.sniff', lambda ps: [sniff(p) for p in ps], paths)
+        if workers > 1:
+            timed('image_sniffer.sniff_many x{}'.format(workers),
+                  lambda ps: sniff_many(ps, workers), paths)
+        headers = [h.ljust(HEADER_SIZE * 4, b'\x00')[:HEADER_SIZE] for h in HEADERS] * (count // len(HEADERS))
+        timed('image_sniffer.sniff_header', lambda hs: [sniff_header(h) for h in hs], headers)
+
+        if imghdr is None:
+            print('imghdr is not available in this Python, skipped')
+            return
+        what = timed('imghdr.what', lambda ps: [imghdr.what(p) for p in ps], paths)
+        timed('imghdr.what (header only)', lambda hs: [imghdr.what(None, h) for h in hs], headers)
+
+        mismatches = sum(1 for a, b in zip(what, sniffed) if a is not None and a != b)
+        print('types that differ from imghdr: {}'.format(mismatches))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='benchmark image_sniffer against imghdr')
+    parser.add_argument('-files', nargs='?', type=int, default=100000, help='files in the corpus')
+    parser.add_argument('-workers', nargs='?', type=int, default=1, help='threads for sniff_many')
+    args = parser.parse_args()
+    main(args.files, args.workers)
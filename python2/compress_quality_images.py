@@ -1,391 +1,673 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-"""
-Image compression and thumbnail generation utility.
-
-This script processes images by:
-1. Compressing them to reduce file size
-2. Generating thumbnails
-3. Creating backups of original files
-"""
-
-# =======================
-# MODULES IMPORTS
-# =======================
-
-import os
-import sys
-import time
-import imghdr
-import shutil
-import logging
-import argparse
-import subprocess
-from PIL import Image
-from zipfile import ZipFile
-from ConfigParser import ConfigParser  # Python 2 import
-
-# =======================
-# CONFIGURATION
-# =======================
-
-# Load configuration from config file if exists
-CONFIG_FILE = os.path.join(os.path.dirname(__file__), 'config.ini')
-config = ConfigParser()
-
-# Default configuration
-DEFAULT_CONFIG = {
-    'paths': {
-        'images_folder': '/home/userfolder/public_html/webimages/upload/MenuItem',
-        'backup_folder': '/home/userfolder/backup/',
-        'tmp_folder': '/home/userfolder/tmp',
-        'logs_folder': '/home/userfolder/logs/cronjob'
-    },
-    'settings': {
-        'script_name': '-restaurant',
-        'image_older_hours': '23',
-        'image_older_days': '1',
-        'minimum_size_allowed': '89000'
-    }
-}
-
-# Try to load config file, use defaults if not available
-if os.path.exists(CONFIG_FILE):
-    config.read(CONFIG_FILE)
-else:
-    # Create sections
-    config.add_section('paths')
-    config.add_section('settings')
-    
-    # Set default values
-    for section, options in DEFAULT_CONFIG.items():
-        for option, value in options.items():
-            config.set(section, option, value)
-    
-    # Write default config file
-    with open(CONFIG_FILE, 'w') as f:
-        config.write(f)
-
-# Get configuration values
-IMAGES_FOLDER = config.get('paths', 'images_folder')
-BACKUP_FOLDER = config.get('paths', 'backup_folder')
-TMP_FOLDER = config.get('paths', 'tmp_folder')
-LOGS_FOLDER = config.get('paths', 'logs_folder')
-
-SCRIPT_NAME = config.get('settings', 'script_name')
-IMAGE_OLDER_HOURS = config.getint('settings', 'image_older_hours')
-IMAGE_OLDER_DAYS = config.getint('settings', 'image_older_days')
-MINIMUM_SIZE_ALLOWED = config.getint('settings', 'minimum_size_allowed')
-
-SIZES = {
-    'standard': (600, 600),
-    'small': (100, 100)
-}
-
-# =======================
-# LOGGING SETUP
-# =======================
-
-def setup_logging():
-    """Configure logging with proper format and file location."""
-    # Create logs directory if it doesn't exist
-    if not os.path.exists(LOGS_FOLDER):
-        os.makedirs(LOGS_FOLDER)
-
-    log_file = os.path.join(LOGS_FOLDER, "compress_quality_images.log")
-    
-    # Configure logging
-    logging.basicConfig(
-        filename=log_file,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', 
-        datefmt='%d/%m/%Y %I:%M:%S %p',
-        level=logging.INFO
-    )
-    
-    # Add console handler for debugging
-    console = logging.StreamHandler()
-    console.setLevel(logging.WARNING)
-    logging.getLogger('').addHandler(console)
-
-setup_logging()
-
-# =======================
-# IMAGE PROCESSING FUNCTIONS
-# =======================
-
-def from_ago(file_path, fmt_hours=False):
-    """
-    Check if file was modified within specified time period.
-    
-    Args:
-        file_path (str): Path to the file
-        fmt_hours (bool): If True, check hours instead of days
-        
-    Returns:
-        bool: True if file is newer than threshold, False otherwise
-    """
-    now = time.time()
-    if fmt_hours:
-        return (now - os.stat(file_path).st_mtime) / 3600 < IMAGE_OLDER_HOURS
-    return (now - os.stat(file_path).st_mtime) / (3600 * 24) < IMAGE_OLDER_DAYS
-
-
-def size_greater_than(file_path):
-    """
-    Check if file size is greater than minimum allowed.
-    
-    Args:
-        file_path (str): Path to the file
-        
-    Returns:
-        bool: True if file is larger than threshold, False otherwise
-    """
-    return os.path.getsize(file_path) > MINIMUM_SIZE_ALLOWED
-
-
-def remove_empty_zips():
-    for root, _, files in os.walk(BACKUP_FOLDER, topdown=False):
-        for _file in files:
-            infile = os.path.join(root, _file)
-            # remove .zip with 1K or 22 byte
-            if _file.lower().endswith(".zip") and os.stat(infile).st_size < 24:
-                os.remove(infile)
-
-
-def select_quality(file_path):
-    """
-    Select appropriate compression quality based on file size.
-    
-    Args:
-        file_path (str): Path to the file
-        
-    Returns:
-        int: Quality value (10-65)
-    """
-    try:
-        image_filesize = os.path.getsize(file_path)
-
-        if image_filesize > 6000000:
-            return 10
-        elif image_filesize > 1900000:
-            return 40
-        elif image_filesize > 1000000:
-            return 42
-        elif image_filesize > 350000:
-            return 65
-        elif image_filesize > 90000:
-            return 55
-        else:
-            return 60
-    except os.error:
-        logging.exception("Error determining file size")
-        return 65
-
-
-def always_jpg(image_header):
-    """
-    Convert PNG to JPEG format identifier.
-    
-    Args:
-        image_header (str): Image format identifier
-        
-    Returns:
-        str: Format to use (always 'jpeg' for PNG)
-    """
-    if image_header and image_header.lower() == "png":
-        return "jpeg"
-    return image_header
-
-
-def is_transparent(image):
-    """
-    Check if an image has transparency.
-    
-    Args:
-        image (PIL.Image): PIL Image object
-        
-    Returns:
-        bool: True if image has transparency, False otherwise
-    """
-    if not isinstance(image, Image.Image):
-        return False
-    return (image.mode in ('RGBA', 'LA') or
-            (image.mode == 'P' and 'transparency' in image.info))
-
-
-def resize_with_aspect_ratio(im, infile, format_im='jpeg'):
-    """
-    maintain its aspect ratio
-    """
-    try:
-        width, height = im.size
-        width_to_apply, height_to_apply = SIZES.get('standard', (600, 600))
-        # applied (width_to_apply, height_to_apply) only if it is less than original image size
-        if (width_to_apply, height_to_apply) < (width, height):
-            # maintain ratio to width
-            height_to_apply = int(width_to_apply * height / width)
-            im = im.resize((width_to_apply, height_to_apply), Image.ANTIALIAS)
-        else:
-            im = im.resize((width, height), Image.ANTIALIAS)
-        im.save(infile, format=format_im, optimize=True, progressive=True)
-    except BaseException as error:
-        logging.exception(error)
-        return im, False
-    return im, True
-
-
-def generate_thumbnail(im, dirpath, filename, format_im='jpeg'):
-    try:
-        width_to_apply, height_to_apply = SIZES.get('small', (100, 100))
-        im.thumbnail((width_to_apply, height_to_apply))
-        #  save each image into separate folders according to dimensions in dictionary
-        new_filename = '{0}x{1}_resized_{2}'.format(width_to_apply,
-                                                    height_to_apply, filename)
-        infile = os.path.join(dirpath, new_filename)
-        im.save(infile, format=format_im, optimize=True, progressive=True)
-    except BaseException as error:
-        logging.exception(error)
-
-
-def colorspace(im, no_rgba=True, bw=False, replace_alpha=False, **kwargs):
-    """
-    Convert images to the correct color space.
-    
-    Args:
-        im (PIL.Image): PIL Image object
-        no_rgba (bool): Convert transparent images to RGB
-        bw (bool): Convert to grayscale
-        replace_alpha (str): Color to replace transparency with
-        
-    Returns:
-        PIL.Image: Converted image
-    """
-    is_transp = is_transparent(im)
-    is_grayscale = im.mode in ('L', 'LA')
-    new_mode = im.mode
-    
-    if is_grayscale or bw:
-        new_mode = 'L'
-    else:
-        new_mode = 'RGB'
-
-    if no_rgba and is_transp:
-        new_mode = 'RGB'
-    elif is_transp:
-        if replace_alpha:
-            if im.mode != 'RGBA':
-                im = im.convert('RGBA')
-            base = Image.new('RGBA', im.size, replace_alpha)
-            base.paste(im, mask=im)
-            im = base
-        else:
-            new_mode = new_mode + 'A'
-
-    if im.mode != new_mode:
-        im = im.convert(new_mode)
-
-    return im
-
-
-def optimize(infile, _format="jpg", filesize="290k"):
-    runstring = {
-        "jpeg": u"jpegoptim -P -p -q --strip-all --all-progressive --size=%(fsize)s %(file)s",
-        "jpg": u"jpegoptim -P -p -q --strip-all --all-progressive --size=%(fsize)s %(file)s",
-        "jfif": u"jpegoptim -P -p -q --strip-all --all-progressive --size=%(fsize)s %(file)s",
-    }
-    if _format in runstring:
-        sp = subprocess.Popen(runstring[_format] %
-                              {'file': infile, 'fsize': filesize}, shell=True)
-        sp.wait()
-
-
-def compress_quality_images(path_src=IMAGES_FOLDER, _resize_img="y", _optimize_jpeg="y", _generate_thumbnail="y"):
-    now = time.time()
-    gzip_name = "{}{}{}".format(now, SCRIPT_NAME, '.zip')
-    gzip_file = os.path.join(BACKUP_FOLDER, gzip_name)
-    infile_tmp = ""
-
-    # create a directory if it does not exist
-    try:
-        if not os.path.exists(BACKUP_FOLDER):
-            os.makedirs(BACKUP_FOLDER)
-    except OSError as error:
-        logging.exception(error)
-        sys.exit()
-
-    # Create a ZipFile Object
-    with ZipFile(gzip_file, 'w') as zipObj:
-        # Loop through all the folder
-        for dirpath, _, filenames in os.walk(path_src, topdown=False):
-            for filename in filenames:
-                try:
-                    saved = False
-                    infile = os.path.join(dirpath, filename)
-                    image_header = imghdr.what(infile)
-
-                    if from_ago(infile, True) and size_greater_than(infile) and image_header:
-                        # for PNG compress
-                        formatpim = always_jpg(image_header)
-                        file_tmp = "tmp_{}".format(filename)
-                        infile_tmp = os.path.join(TMP_FOLDER, file_tmp)
-                        with Image.open(infile) as pim:
-                            pim = colorspace(pim)
-                            resized = False
-                            # resize image
-                            if _resize_img == "y":
-                                pim, resized = resize_with_aspect_ratio(
-                                    pim, infile_tmp, formatpim)
-                            if not resized or size_greater_than(infile_tmp):
-                                # check file size and optimize
-                                _quality = select_quality(infile_tmp)
-                                pim.save(infile_tmp, format=formatpim,
-                                         optimize=True, progressive=True, quality=_quality)
-                            # thumbnail
-                            if _generate_thumbnail == "y":
-                                generate_thumbnail(pim, dirpath, filename, formatpim)
-
-                            saved = True
-
-                        if _optimize_jpeg == "y" and os.stat(infile_tmp).st_size > 70000:
-                            optimize(infile_tmp, image_header, '70k')
-
-                        if saved:
-                            # Add file to the zip
-                            zipObj.write(infile)
-
-                            # Move src to dst. (mv src dst)
-                            shutil.move(infile_tmp, infile)
-                except OSError as error:
-                    logging.exception('%s raised an os error', error)
-                # Problem compress the image
-                except IOError as error:
-                    logging.exception('%s raised an exception', error)
-                    if os.path.exists(infile_tmp):
-                        os.remove(infile_tmp)
-                except BaseException as error:
-                    logging.exception('%s raised an exception--', error)
-
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(
-        description='compress images using PIL library')
-    parser.add_argument('-src', nargs='?',
-                        type=str, help='an path', default=IMAGES_FOLDER)
-    parser.add_argument('-resize', nargs='?',
-                        type=str, choices=("y", "n"), help='resize maintain ratio, is "y" by default', default="y")
-    parser.add_argument('-thumbnail', nargs='?',
-                        type=str, choices=("y", "n"), help='make image into a thumbnail', default="y")
-    parser.add_argument('-jpegoptim', nargs='?',
-                        type=str, choices=("y", "n"), help='run the jpegoptim binary, is "y" by default', default="y")
-    args = parser.parse_args()
-
-    if args.src:
-        logging.info('run script en %s', args.src)
-        # script_name is global variable
-        SCRIPT_NAME = "-{}".format(os.path.basename(args.src)).lower()
-    else:
-        logging.info('run script en %s', IMAGES_FOLDER)
-
-    compress_quality_images(args.src, _resize_img=args.resize, _optimize_jpeg=args.jpegoptim,
-                            _generate_thumbnail=args.thumbnail)
-    remove_empty_zips()
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Image compression and thumbnail generation utility.
+
+This script processes images by:
+1. Compressing them to reduce file size
+2. Generating thumbnails
+3. Creating backups of original files
+"""
+
+# =======================
+# MODULES IMPORTS
+# =======================
+
+import os
+import sys
+import stat
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from io import BytesIO
+import subprocess
+import multiprocessing
+from PIL import Image
+from zipfile import ZipFile
+from ConfigParser import ConfigParser  # Python 2 import
+from image_manifest import ImageManifest
+from backup_dedup import DedupIndex, add_file, index_path_for
+from renditions import FIT_WIDTH, render_renditions
+from image_scanner import has_extension, scan, scan_paths, smaller_than
+
+# =======================
+# CONFIGURATION
+# =======================
+
+# Load configuration from config file if exists
+CONFIG_FILE = os.path.join(os.path.dirname(__file__), 'config.ini')
+config = ConfigParser()
+
+# Default configuration
+DEFAULT_CONFIG = {
+    'paths': {
+        'images_folder': '/home/userfolder/public_html/webimages/upload/MenuItem',
+        'backup_folder': '/home/userfolder/backup/',
+        'tmp_folder': '/home/userfolder/tmp',
+        'logs_folder': '/home/userfolder/logs/cronjob',
+        'manifest_file': os.path.join(os.path.dirname(__file__), 'manifest.sqlite')
+    },
+    'settings': {
+        'script_name': '-restaurant',
+        'image_older_hours': '23',
+        'image_older_days': '1',
+        'minimum_size_allowed': '89000',
+        'target_size': '0'
+    }
+}
+
+# Try to load config file, use defaults if not available
+if os.path.exists(CONFIG_FILE):
+    config.read(CONFIG_FILE)
+else:
+    # Create sections
+    config.add_section('paths')
+    config.add_section('settings')
+    
+    # Set default values
+    for section, options in DEFAULT_CONFIG.items():
+        for option, value in options.items():
+            config.set(section, option, value)
+    
+    # Write default config file
+    with open(CONFIG_FILE, 'w') as f:
+        config.write(f)
+
+
+def config_get(section, option):
+    """Read an option, falling back to DEFAULT_CONFIG for options added later."""
+    if config.has_option(section, option):
+        return config.get(section, option)
+    return DEFAULT_CONFIG[section][option]
+
+
+# Get configuration values
+IMAGES_FOLDER = config.get('paths', 'images_folder')
+BACKUP_FOLDER = config.get('paths', 'backup_folder')
+TMP_FOLDER = config.get('paths', 'tmp_folder')
+LOGS_FOLDER = config.get('paths', 'logs_folder')
+MANIFEST_FILE = config_get('paths', 'manifest_file')
+
+SCRIPT_NAME = config.get('settings', 'script_name')
+IMAGE_OLDER_HOURS = config.getint('settings', 'image_older_hours')
+IMAGE_OLDER_DAYS = config.getint('settings', 'image_older_days')
+MINIMUM_SIZE_ALLOWED = config.getint('settings', 'minimum_size_allowed')
+TARGET_SIZE = config_get('settings', 'target_size')
+
+SIZES = {
+    'standard': (600, 600),
+    'small': (100, 100)
+}
+
+# Pillow's JPEG quality when save() gets no quality argument
+DEFAULT_QUALITY = 75
+
+# quality of images that are not resized, what they always got
+UNRESIZED_QUALITY = 65
+
+# quality range searched by encode_to_target()
+MIN_QUALITY = 10
+MAX_QUALITY = DEFAULT_QUALITY
+
+# =======================
+# LOGGING SETUP
+# =======================
+
+def setup_logging():
+    """Configure logging with proper format and file location."""
+    # Create logs directory if it doesn't exist
+    if not os.path.exists(LOGS_FOLDER):
+        os.makedirs(LOGS_FOLDER)
+
+    log_file = os.path.join(LOGS_FOLDER, "compress_quality_images.log")
+    
+    # Configure logging
+    logging.basicConfig(
+        filename=log_file,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', 
+        datefmt='%d/%m/%Y %I:%M:%S %p',
+        level=logging.INFO
+    )
+    
+    # Add console handler for debugging
+    console = logging.StreamHandler()
+    console.setLevel(logging.WARNING)
+    logging.getLogger('').addHandler(console)
+
+setup_logging()
+
+# =======================
+# IMAGE PROCESSING FUNCTIONS
+# =======================
+
+def from_ago(file_path, fmt_hours=False, st=None):
+    """
+    Check if file was modified within specified time period.
+    
+    Args:
+        file_path (str): Path to the file
+        fmt_hours (bool): If True, check hours instead of days
+        st (os.stat_result): Stat of the file if already known
+        
+    Returns:
+        bool: True if file is newer than threshold, False otherwise
+    """
+    now = time.time()
+    st = st or os.stat(file_path)
+    if fmt_hours:
+        return (now - st.st_mtime) / 3600 < IMAGE_OLDER_HOURS
+    return (now - st.st_mtime) / (3600 * 24) < IMAGE_OLDER_DAYS
+
+
+def size_greater_than(file_path, st=None):
+    """
+    Check if file size is greater than minimum allowed.
+    
+    Args:
+        file_path (str): Path to the file
+        st (os.stat_result): Stat of the file if already known
+        
+    Returns:
+        bool: True if file is larger than threshold, False otherwise
+    """
+    st = st or os.stat(file_path)
+    return st.st_size > MINIMUM_SIZE_ALLOWED
+
+
+def remove_empty_zips():
+    # remove .zip with 1K or 22 byte
+    for entry in scan(BACKUP_FOLDER, [has_extension(".zip"), smaller_than(24)]):
+        os.remove(entry.path)
+
+
+def select_quality(file_path, st=None):
+    """
+    Select appropriate compression quality based on file size.
+    
+    Args:
+        file_path (str): Path to the file
+        st (os.stat_result): Stat of the file if already known
+        
+    Returns:
+        int: Quality value (10-65)
+    """
+    try:
+        image_filesize = (st or os.stat(file_path)).st_size
+
+        if image_filesize > 6000000:
+            return 10
+        elif image_filesize > 1900000:
+            return 40
+        elif image_filesize > 1000000:
+            return 42
+        elif image_filesize > 350000:
+            return 65
+        elif image_filesize > 90000:
+            return 55
+        else:
+            return 60
+    except os.error:
+        logging.exception("Error determining file size")
+        return 65
+
+
+def always_jpg(image_header):
+    """
+    Convert PNG to JPEG format identifier.
+    
+    Args:
+        image_header (str): Image format identifier
+        
+    Returns:
+        str: Format to use (always 'jpeg' for PNG)
+    """
+    if image_header and image_header.lower() == "png":
+        return "jpeg"
+    return image_header
+
+
+def can_compress(image_header):
+    """
+    Check if Pillow can write the format the image would be saved in.
+
+    Args:
+        image_header (str): Image format identifier
+
+    Returns:
+        bool: False for formats such as HEIC that need a Pillow plugin
+    """
+    Image.init()
+    return always_jpg(image_header).upper() in Image.SAVE
+
+
+def is_transparent(image):
+    """
+    Check if an image has transparency.
+    
+    Args:
+        image (PIL.Image): PIL Image object
+        
+    Returns:
+        bool: True if image has transparency, False otherwise
+    """
+    if not isinstance(image, Image.Image):
+        return False
+    return (image.mode in ('RGBA', 'LA') or
+            (image.mode == 'P' and 'transparency' in image.info))
+
+
+def save_resized(im, infile, format_im='jpeg'):
+    """
+    Save the standard rendition, already resized maintaining its aspect ratio.
+
+    Returns:
+        bool: True if saved, False otherwise
+    """
+    try:
+        im.save(infile, format=format_im, optimize=True, progressive=True)
+    except BaseException as error:
+        logging.exception(error)
+        return False
+    return True
+
+
+def save_thumbnail(im, dirpath, filename, format_im='jpeg'):
+    """
+    Save the small rendition next to the original image.
+    """
+    try:
+        width_to_apply, height_to_apply = SIZES.get('small', (100, 100))
+        #  save each image into separate folders according to dimensions in dictionary
+        new_filename = '{0}x{1}_resized_{2}'.format(width_to_apply,
+                                                    height_to_apply, filename)
+        infile = os.path.join(dirpath, new_filename)
+        im.save(infile, format=format_im, optimize=True, progressive=True)
+    except BaseException as error:
+        logging.exception(error)
+
+
+def colorspace(im, no_rgba=True, bw=False, replace_alpha=False, **kwargs):
+    """
+    Convert images to the correct color space.
+    
+    Args:
+        im (PIL.Image): PIL Image object
+        no_rgba (bool): Convert transparent images to RGB
+        bw (bool): Convert to grayscale
+        replace_alpha (str): Color to replace transparency with
+        
+    Returns:
+        PIL.Image: Converted image
+    """
+    is_transp = is_transparent(im)
+    is_grayscale = im.mode in ('L', 'LA')
+    new_mode = im.mode
+    
+    if is_grayscale or bw:
+        new_mode = 'L'
+    else:
+        new_mode = 'RGB'
+
+    if no_rgba and is_transp:
+        new_mode = 'RGB'
+    elif is_transp:
+        if replace_alpha:
+            if im.mode != 'RGBA':
+                im = im.convert('RGBA')
+            base = Image.new('RGBA', im.size, replace_alpha)
+            base.paste(im, mask=im)
+            im = base
+        else:
+            new_mode = new_mode + 'A'
+
+    if im.mode != new_mode:
+        im = im.convert(new_mode)
+
+    return im
+
+
+def parse_size(size):
+    """
+    Parse a jpegoptim style size ("70k", "1m" or plain bytes).
+
+    Args:
+        size (str): Size string, empty or "0" disables the byte budget
+
+    Returns:
+        int: Size in bytes, 0 when disabled
+    """
+    size = (size or "0").strip().lower()
+    multipliers = {'k': 1024, 'm': 1024 * 1024}
+    if size[-1:] in multipliers:
+        return int(size[:-1]) * multipliers[size[-1]]
+    return int(size)
+
+
+def encode_to_target(im, format_im, target_bytes):
+    """
+    Encode an image in memory at the highest quality that fits target_bytes.
+
+    The quality is binary searched between MIN_QUALITY and MAX_QUALITY, each
+    step encodes into a BytesIO so nothing touches the disk until the caller
+    writes the result.
+
+    Args:
+        im (PIL.Image): Image to encode
+        format_im (str): Output format, quality only applies to jpeg
+        target_bytes (int): Byte budget
+
+    Returns:
+        tuple: (data, quality), data may exceed target_bytes when even
+            MIN_QUALITY does not fit
+    """
+    def encode(quality):
+        buf = BytesIO()
+        im.save(buf, format=format_im, optimize=True, progressive=True, quality=quality)
+        return buf.getvalue()
+
+    best = encode(MAX_QUALITY)
+    if format_im != "jpeg" or len(best) <= target_bytes:
+        return best, MAX_QUALITY
+
+    best_quality = MIN_QUALITY
+    best = None
+    low, high = MIN_QUALITY, MAX_QUALITY - 1
+    while low <= high:
+        quality = (low + high) // 2
+        data = encode(quality)
+        if len(data) <= target_bytes:
+            best, best_quality = data, quality
+            low = quality + 1
+        else:
+            high = quality - 1
+    if best is None:
+        best = encode(MIN_QUALITY)
+    return best, best_quality
+
+
+def optimize(infile, _format="jpg", filesize="290k"):
+    runstring = {
+        "jpeg": u"jpegoptim -P -p -q --strip-all --all-progressive --size=%(fsize)s %(file)s",
+        "jpg": u"jpegoptim -P -p -q --strip-all --all-progressive --size=%(fsize)s %(file)s",
+        "jfif": u"jpegoptim -P -p -q --strip-all --all-progressive --size=%(fsize)s %(file)s",
+    }
+    if _format in runstring:
+        sp = subprocess.Popen(runstring[_format] %
+                              {'file': infile, 'fsize': filesize}, shell=True)
+        sp.wait()
+
+
+def compress_image(task):
+    """
+    Compress a single image into TMP_FOLDER and write its thumbnail.
+
+    This is the unit of work sent to the process pool, so it only touches
+    the temporary file and the thumbnail; the backup archive and the final
+    move are left to the caller.
+
+    Args:
+        task (tuple): (infile, dirpath, filename, image_header, resize,
+            optimize_jpeg, generate_thumbnail, target_bytes)
+
+    Returns:
+        tuple: (infile, infile_tmp, quality) where infile_tmp is None on failure
+    """
+    (infile, dirpath, filename, image_header,
+     _resize_img, _optimize_jpeg, _generate_thumbnail, target_bytes) = task
+    infile_tmp = ""
+    try:
+        saved = False
+        # for PNG compress
+        formatpim = always_jpg(image_header)
+        # unique name, workers may handle files with the same name at once
+        fd, infile_tmp = tempfile.mkstemp(prefix="tmp_", suffix="_{}".format(filename),
+                                          dir=TMP_FOLDER)
+        os.close(fd)
+
+        # decode once and build every size needed, None keeps the full size
+        sizes = {'standard': SIZES.get('standard', (600, 600)) if _resize_img == "y" else None}
+        if _generate_thumbnail == "y":
+            sizes['small'] = SIZES.get('small', (100, 100))
+        renditions, timings = render_renditions(infile, sizes, fits={'standard': FIT_WIDTH},
+                                                prepare=colorspace)
+        logging.info('%s decoded in %.3fs, resampled in %.3fs',
+                     infile, timings['decode'], timings['resample'])
+
+        pim = renditions['standard']
+        if target_bytes:
+            # byte budget: search the quality in memory and write once
+            data, _quality = encode_to_target(pim, formatpim, target_bytes)
+            with open(infile_tmp, 'wb') as fh:
+                fh.write(data)
+            # jpegoptim only gets a chance when the search could not fit
+            run_jpegoptim = len(data) > target_bytes
+            jpegoptim_size = '{}k'.format(target_bytes // 1024)
+        else:
+            resized = False
+            _quality = DEFAULT_QUALITY
+            # resize image
+            if _resize_img == "y":
+                resized = save_resized(pim, infile_tmp, formatpim)
+            # the tmp file is empty if not resized
+            tmp_st = os.stat(infile_tmp) if resized else None
+            if not resized or size_greater_than(infile_tmp, tmp_st):
+                # check file size and optimize
+                _quality = select_quality(infile_tmp, tmp_st) if resized else UNRESIZED_QUALITY
+                pim.save(infile_tmp, format=formatpim,
+                         optimize=True, progressive=True, quality=_quality)
+            run_jpegoptim = os.stat(infile_tmp).st_size > 70000
+            jpegoptim_size = '70k'
+        # thumbnail
+        if _generate_thumbnail == "y":
+            save_thumbnail(renditions['small'], dirpath, filename, formatpim)
+
+        saved = True
+
+        if _optimize_jpeg == "y" and run_jpegoptim:
+            optimize(infile_tmp, image_header, jpegoptim_size)
+
+        if saved:
+            return infile, infile_tmp, _quality
+    except OSError as error:
+        logging.exception('%s raised an os error', error)
+    # Problem compress the image
+    except IOError as error:
+        logging.exception('%s raised an exception', error)
+    except BaseException as error:
+        logging.exception('%s raised an exception--', error)
+    if infile_tmp and os.path.exists(infile_tmp):
+        os.remove(infile_tmp)
+    return infile, None, None
+
+
+def archive_and_replace(zip_obj, infile, infile_tmp, index=None):
+    """
+    Add the original image to the backup and replace it with the compressed one.
+
+    Only the parent process calls this, so the ZipFile has a single writer.
+
+    Args:
+        zip_obj (ZipFile): Open backup archive
+        infile (str): Path to the original image
+        infile_tmp (str): Path to the compressed image in TMP_FOLDER
+        index (DedupIndex): Store each distinct content once when given
+
+    Returns:
+        bool: True if the original was replaced, False otherwise
+    """
+    try:
+        # Add file to the zip
+        if index is not None:
+            add_file(zip_obj, os.path.basename(zip_obj.filename), index, infile)
+        else:
+            zip_obj.write(infile)
+
+        # mkstemp creates the file 0600, give it the original's mode (and
+        # owner when running as root) so the web server can still read it
+        st = os.stat(infile)
+        os.chmod(infile_tmp, stat.S_IMODE(st.st_mode))
+        if hasattr(os, 'geteuid') and os.geteuid() == 0:
+            os.chown(infile_tmp, st.st_uid, st.st_gid)
+
+        # Move src to dst. (mv src dst)
+        shutil.move(infile_tmp, infile)
+    except (OSError, IOError) as error:
+        logging.exception('%s raised an os error', error)
+        if os.path.exists(infile_tmp):
+            os.remove(infile_tmp)
+        return False
+    return True
+
+
+def iter_tasks(path_src, _resize_img, _optimize_jpeg, _generate_thumbnail, target_bytes, manifest=None,
+               scan_workers=1, paths=None):
+    """
+    Scan path_src and yield a compress_image() task for each eligible image.
+
+    The scanner stats every file once for the age and size checks. Files the
+    manifest already knows about are skipped before the header is read, and
+    files that turn out not to be images are recorded so they are not opened
+    again. When paths is given only those files are checked, path_src is not
+    walked.
+    """
+    # stat based checks only, the header is read after the manifest lookup
+    predicates = [lambda entry: from_ago(entry.path, True, entry.stat),
+                  lambda entry: size_greater_than(entry.path, entry.stat)]
+    if paths:
+        entries = scan_paths(paths, predicates)
+    else:
+        entries = scan(path_src, predicates, workers=scan_workers)
+    for entry in entries:
+        try:
+            if manifest is not None and manifest.is_processed(entry.path, entry.stat):
+                continue
+            image_header = entry.image_type
+            if image_header and can_compress(image_header):
+                yield (entry.path, entry.dirpath, entry.name, image_header,
+                       _resize_img, _optimize_jpeg, _generate_thumbnail, target_bytes)
+            elif manifest is not None:
+                manifest.record(entry.path)
+        except OSError as error:
+            logging.exception('%s raised an os error', error)
+        except IOError as error:
+            logging.exception('%s raised an exception', error)
+
+
+def compress_quality_images(path_src=IMAGES_FOLDER, _resize_img="y", _optimize_jpeg="y", _generate_thumbnail="y",
+                            workers=1, use_manifest="y", target_size=TARGET_SIZE, dedup="n", scan_workers=1,
+                            paths=None):
+    """
+    Compress every eligible image under path_src, backing up the originals.
+
+    Args:
+        path_src (str): Folder to walk
+        _resize_img (str): "y" to resize to the standard size
+        _optimize_jpeg (str): "y" to run jpegoptim on the result
+        _generate_thumbnail (str): "y" to write a thumbnail next to the image
+        workers (int): Number of worker processes, 1 processes images inline
+        use_manifest (str): "y" to skip images recorded in MANIFEST_FILE
+        target_size (str): Byte budget such as "70k", "0" (the default) keeps
+            the select_quality() size buckets
+        dedup (str): "y" to store each distinct original once, with an
+            .index.json next to the zip for backup_dedup.restore(); "n" (the
+            default) keeps the originals under their own paths
+        scan_workers (int): Folders listed at the same time, for NFS mounts
+        paths (list): Only process these files instead of walking path_src,
+            used by the watch daemon
+
+    Returns:
+        dict: Run summary with compressed, failed, hits and misses counts
+    """
+    now = time.time()
+    gzip_name = "{}{}{}".format(now, SCRIPT_NAME, '.zip')
+    gzip_file = os.path.join(BACKUP_FOLDER, gzip_name)
+
+    # create a directory if it does not exist
+    try:
+        if not os.path.exists(BACKUP_FOLDER):
+            os.makedirs(BACKUP_FOLDER)
+    except OSError as error:
+        logging.exception(error)
+        sys.exit()
+
+    manifest = ImageManifest(MANIFEST_FILE) if use_manifest == "y" else None
+    index = DedupIndex() if dedup == "y" else None
+    summary = {'compressed': 0, 'failed': 0, 'hits': 0, 'misses': 0}
+
+    tasks = iter_tasks(path_src, _resize_img, _optimize_jpeg, _generate_thumbnail,
+                       parse_size(target_size), manifest, scan_workers, paths)
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(compress_image, tasks)
+    else:
+        results = (compress_image(task) for task in tasks)
+
+    # Create a ZipFile Object, only this process writes to it
+    try:
+        with ZipFile(gzip_file, 'w') as zipObj:
+            for infile, infile_tmp, _quality in results:
+                if infile_tmp and archive_and_replace(zipObj, infile, infile_tmp, index):
+                    summary['compressed'] += 1
+                    if manifest is not None:
+                        manifest.record(infile, _quality)
+                else:
+                    summary['failed'] += 1
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if index is not None and index.files:
+            index.save(index_path_for(BACKUP_FOLDER, "{}{}".format(now, SCRIPT_NAME)))
+        if manifest is not None:
+            summary['hits'] = manifest.hits
+            summary['misses'] = manifest.misses
+            manifest.close()
+
+    logging.info('Run summary: compressed %d, failed %d, manifest hits %d, misses %d',
+                 summary['compressed'], summary['failed'], summary['hits'], summary['misses'])
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='compress images using PIL library')
+    parser.add_argument('-src', nargs='?',
+                        type=str, help='an path', default=IMAGES_FOLDER)
+    parser.add_argument('-resize', nargs='?',
+                        type=str, choices=("y", "n"), help='resize maintain ratio, is "y" by default', default="y")
+    parser.add_argument('-thumbnail', nargs='?',
+                        type=str, choices=("y", "n"), help='make image into a thumbnail', default="y")
+    parser.add_argument('-jpegoptim', nargs='?',
+                        type=str, choices=("y", "n"), help='run the jpegoptim binary, is "y" by default', default="y")
+    parser.add_argument('-workers', nargs='?',
+                        type=int, help='number of worker processes, is 1 (no pool) by default', default=1)
+    parser.add_argument('-manifest', nargs='?',
+                        type=str, choices=("y", "n"), help='skip images already in the manifest, is "y" by default',
+                        default="y")
+    parser.add_argument('-target', nargs='?',
+                        type=str, help='byte budget per image such as "70k", is "0" (quality buckets) by default',
+                        default=TARGET_SIZE)
+    parser.add_argument('-dedup', nargs='?',
+                        type=str, choices=("y", "n"), help='store each distinct original once, is "n" by default',
+                        default="n")
+    parser.add_argument('-scan-workers', nargs='?', dest='scan_workers',
+                        type=int, help='folders listed at the same time, useful on NFS, is 1 by default', default=1)
+    parser.add_argument('-files', nargs='+',
+                        type=str, help='only process these images instead of walking -src', default=None)
+    args = parser.parse_args()
+
+    if args.src:
+        logging.info('run script en %s', args.src)
+        # script_name is global variable
+        SCRIPT_NAME = "-{}".format(os.path.basename(args.src)).lower()
+    else:
+        logging.info('run script en %s', IMAGES_FOLDER)
+
+    compress_quality_images(args.src, _resize_img=args.resize, _optimize_jpeg=args.jpegoptim,
+                            _generate_thumbnail=args.thumbnail, workers=args.workers,
+                            use_manifest=args.manifest, target_size=args.target,
+                            dedup=args.dedup, scan_workers=args.scan_workers, paths=args.files)
+    remove_empty_zips()
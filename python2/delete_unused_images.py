@@ -5,8 +5,14 @@
 # =======================
 
 import os
-import imghdr
+import time
+import argparse
+import threading
 from csv import reader
+from itertools import islice
+from multiprocessing.pool import ThreadPool
+from image_scanner import list_dir
+from image_sniffer import sniff
 
 # =======================
 # VARIABLES
@@ -18,33 +24,180 @@ csvfile = "libro_imagenes.csv"
 # Location of files to compress/delete
 folder = "/public_html/webimages/upload/MenuItem"
 
+# rows read from the csv at a time
+chunk_size = 50000
 
-def purge_imgs():
+# directories purged at the same time
+purge_workers = 8
+
+# dry run plans are written here unless -plan is given
+backup_folder = "/here_backup_dir/"
+
+
+def default_plan_path(folder_path):
+    """Timestamped plan file in folder_path, created if missing."""
+    if not os.path.exists(folder_path):
+        os.makedirs(folder_path)
+    return os.path.join(folder_path, 'delete_plan_{}.tsv'.format(time.strftime('%Y%m%d-%H%M%S')))
+
+
+def read_chunks(csv_path, size):
+    """Yield lists of at most size file names from the first csv column."""
     # read csv file as a list of lists
-    with open(csvfile, 'rt') as read_obj:
+    with open(csv_path, 'rt') as read_obj:
         # pass the file object to reader() to get the reader object
         csv_reader = reader(read_obj)
-        # Pass reader object to list() to get a list of lists
-        # list_of_rows = list(csv_reader)
-        for row in csv_reader:
-            if len(row):
-                file = row[0]
-                name, ext = os.path.splitext(file)
-                file_fullpath = os.path.join(folder, file)
-                try:
-                    if os.path.isfile(file_fullpath) and imghdr.what(file_fullpath):
-                        print('eliminada ', name, ext,
-                              imghdr.what(file_fullpath))
-                        # remove file
-                        os.remove(file_fullpath)
-                    else:
-                        print('No eliminada', file_fullpath)
-                except BaseException as e:
-                    print('Error: ', e)
+        while True:
+            rows = list(islice(csv_reader, size))
+            if not rows:
+                return
+            yield [row[0] for row in rows if len(row) and row[0]]
+
+
+class DirListings(object):
+    """
+    Names of the regular files of each directory, listed once per run.
+
+    Files deleted through forget() are dropped so later chunks of the csv
+    see the current state without listing the directory again.
+    """
+
+    def __init__(self):
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def files(self, dirpath):
+        with self._lock:
+            names = self._files.get(dirpath)
+        if names is None:
+            try:
+                entries, _ = list_dir(dirpath)
+                names = set(entry.name for entry in entries)
+            except OSError:
+                names = set()
+            with self._lock:
+                self._files[dirpath] = names
+        return names
+
+    def forget(self, dirpath, name):
+        with self._lock:
+            self._files[dirpath].discard(name)
+
+
+def purge_dir(job):
+    """
+    Delete the listed images of one directory.
+
+    Returns:
+        list: (action, path, detail) tuples, action is 'delete', 'missing',
+            'not_image' or 'error'
+    """
+    dirpath, names, listings, dry_run = job
+    existing = listings.files(dirpath)
+    plan = []
+    for name in sorted(names):
+        file_fullpath = os.path.join(dirpath, name)
+        if name not in existing:
+            plan.append(('missing', file_fullpath, ''))
+            continue
+        try:
+            image_type = sniff(file_fullpath)
+            if not image_type:
+                plan.append(('not_image', file_fullpath, ''))
+                continue
+            if not dry_run:
+                # remove file
+                os.remove(file_fullpath)
+                listings.forget(dirpath, name)
+            plan.append(('delete', file_fullpath, image_type))
+        except (OSError, IOError) as e:
+            plan.append(('error', file_fullpath, str(e)))
+    return plan
+
+
+def purge_imgs(csv_path=csvfile, root=folder, dry_run=False, plan_file=None,
+               workers=purge_workers, rows_per_chunk=chunk_size):
+    """
+    Delete the images listed in csv_path, relative to root.
+
+    The csv is streamed in chunks, paths are deduplicated and grouped by
+    directory so every directory is listed once, and each group is purged
+    by a bounded thread pool.
+
+    Args:
+        csv_path (str): CSV file with a relative image path per row
+        root (str): Folder the csv paths are relative to
+        dry_run (bool): Only plan, do not delete anything
+        plan_file (str): Write one tab separated line per path here
+        workers (int): Directories purged at the same time
+        rows_per_chunk (int): Rows read from the csv at a time
+
+    Returns:
+        dict: Count per action plus 'rows' and 'duplicates'
+    """
+    start = time.time()
+    summary = {'rows': 0, 'duplicates': 0, 'delete': 0, 'missing': 0,
+               'not_image': 0, 'error': 0}
+    seen = set()
+    listings = DirListings()
+    plan_out = open(plan_file, 'w') if plan_file else None
+    pool = ThreadPool(max(1, workers))
+    try:
+        for chunk in read_chunks(csv_path, rows_per_chunk):
+            summary['rows'] += len(chunk)
+            groups = {}
+            for file in chunk:
+                file_fullpath = os.path.normpath(os.path.join(root, file))
+                if file_fullpath in seen:
+                    summary['duplicates'] += 1
+                    continue
+                seen.add(file_fullpath)
+                dirpath, name = os.path.split(file_fullpath)
+                groups.setdefault(dirpath, set()).add(name)
+            jobs = [(dirpath, names, listings, dry_run) for dirpath, names in groups.items()]
+            for plan in pool.imap_unordered(purge_dir, jobs):
+                for action, path, detail in plan:
+                    summary[action] += 1
+                    if action == 'error':
+                        print('Error: ', path, detail)
+                    if plan_out is not None:
+                        plan_out.write('{}\t{}\t{}\n'.format(action, path, detail))
+    finally:
+        pool.close()
+        pool.join()
+        if plan_out is not None:
+            plan_out.close()
+    summary['seconds'] = time.time() - start
+    return summary
 
 
 if __name__ == "__main__":
-    if os.path.isdir(folder):
-        purge_imgs()
+    parser = argparse.ArgumentParser(
+        description='delete the images listed in a csv file')
+    parser.add_argument('-csv', nargs='?', type=str, default=csvfile, help='csv with the images to delete')
+    parser.add_argument('-folder', nargs='?', type=str, default=folder, help='folder the csv paths are relative to')
+    parser.add_argument('-dry-run', nargs='?', dest='dry_run',
+                        type=str, choices=("y", "n"), help='only write the plan, is "n" by default', default="n")
+    parser.add_argument('-plan', nargs='?', type=str, default=None,
+                        help='write the plan to this file, a dry run writes it to -backup by default')
+    parser.add_argument('-backup', nargs='?', type=str, default=backup_folder,
+                        help='folder for the timestamped dry run plan')
+    parser.add_argument('-workers', nargs='?', type=int, default=purge_workers, help='directories purged at once')
+    parser.add_argument('-chunk', nargs='?', type=int, default=chunk_size, help='csv rows read at a time')
+    args = parser.parse_args()
+
+    if os.path.isdir(args.folder):
+        plan_path = args.plan
+        if args.dry_run == "y" and not plan_path:
+            # a dry run is only useful with its plan
+            plan_path = default_plan_path(args.backup)
+        result = purge_imgs(args.csv, args.folder, dry_run=args.dry_run == "y", plan_file=plan_path,
+                            workers=args.workers, rows_per_chunk=args.chunk)
+        print('{} filas, {} duplicadas, {} {}, {} no encontradas, {} no son imagenes, {} errores en {:.1f} s'.format(
+            result['rows'], result['duplicates'], result['delete'],
+            'a eliminar' if args.dry_run == "y" else 'eliminadas',
+            result['missing'], result['not_image'], result['error'], result['seconds']))
+        if plan_path:
+            print('Plan: {}'.format(plan_path))
     else:
         print('No es un directorio')
@@ -11,10 +11,10 @@ Generates thumbnails for all images in a specified directory.
 # =======================
 
 import os
-import imghdr
 import logging
 import argparse
-from PIL import Image
+from renditions import render_renditions
+from image_scanner import scan, stat_entry
 
 # =======================
 # CONFIGURATION
@@ -66,10 +66,10 @@ def setup_logging(logs_folder):
 
 def generate_thumbnail(im, dirpath, filename, format_im='jpeg', sizes=None):
     """
-    Generate thumbnail from image.
+    Save the thumbnail rendition of an image.
     
     Args:
-        im (PIL.Image): PIL Image object
+        im (PIL.Image): Thumbnail sized PIL Image object
         dirpath (str): Directory path for saving thumbnail
         filename (str): Original filename
         format_im (str): Image format (jpeg, png, etc.)
@@ -83,16 +83,13 @@ def generate_thumbnail(im, dirpath, filename, format_im='jpeg', sizes=None):
         
     try:
         width_to_apply, height_to_apply = sizes.get('small', (100, 100))
-        # Create a copy to avoid modifying the original
-        thumb_im = im.copy()
-        thumb_im.thumbnail((width_to_apply, height_to_apply))
         
         # Save each image with appropriate filename
         new_filename = '{0}x{1}_resized_{2}'.format(
             width_to_apply, height_to_apply, filename)
         infile = os.path.join(dirpath, new_filename)
         
-        thumb_im.save(infile, format=format_im, optimize=True, progressive=True)
+        im.save(infile, format=format_im, optimize=True, progressive=True)
         logging.info("Generated thumbnail: %s", new_filename)
         return True
     except Exception as error:
@@ -100,7 +97,7 @@ def generate_thumbnail(im, dirpath, filename, format_im='jpeg', sizes=None):
         return False
 
 
-def process_image(filepath, filename, dirpath):
+def process_image(filepath, filename, dirpath, entry=None):
     """
     Process a single image file.
     
@@ -108,32 +105,38 @@ def process_image(filepath, filename, dirpath):
         filepath (str): Full path to image file
         filename (str): Filename of image
         dirpath (str): Directory path
+        entry (ScanEntry): Scanner entry of the file, reuses its header
         
     Returns:
         bool: True if successful, False otherwise
     """
     try:
         # Check if file is an image
-        image_header = imghdr.what(filepath)
+        entry = entry or stat_entry(filepath)
+        image_header = entry.image_type if entry is not None else None
         if not image_header:
             logging.debug("Not an image file: %s", filepath)
             return False
             
-        # Open and process image
-        with Image.open(filepath) as img:
-            return generate_thumbnail(img, dirpath, filename, image_header)
+        # Decode once, at reduced scale for JPEG, straight to the thumbnail size
+        sizes = {'small': DEFAULT_CONFIG['sizes'].get('small', (100, 100))}
+        renditions, timings = render_renditions(filepath, sizes)
+        logging.info("Decoded %s in %.3fs, resampled in %.3fs",
+                     filename, timings['decode'], timings['resample'])
+        return generate_thumbnail(renditions['small'], dirpath, filename, image_header)
             
     except Exception as error:
         logging.exception("Error processing %s: %s", filepath, error)
         return False
 
 
-def main(path_src=None):
+def main(path_src=None, scan_workers=1):
     """
     Main function to process all images in directory.
     
     Args:
         path_src (str): Source directory for images
+        scan_workers (int): Folders listed at the same time, for NFS mounts
     """
     if path_src is None:
         path_src = DEFAULT_CONFIG['images_folder']
@@ -146,15 +149,13 @@ def main(path_src=None):
     failed = 0
     
     # Loop through all the folder
-    for dirpath, _, filenames in os.walk(path_src, topdown=False):
-        for filename in filenames:
-            total_files += 1
-            infile = os.path.join(dirpath, filename)
-            
-            if process_image(infile, filename, dirpath):
-                successful += 1
-            else:
-                failed += 1
+    for entry in scan(path_src, workers=scan_workers):
+        total_files += 1
+        
+        if process_image(entry.path, entry.name, entry.dirpath, entry):
+            successful += 1
+        else:
+            failed += 1
                 
     logging.info("Thumbnail generation complete. Total: %d, Success: %d, Failed: %d", 
                  total_files, successful, failed)
@@ -165,6 +166,8 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Generate thumbnails for images')
     parser.add_argument('-src', '--source', help='Source directory for images')
     parser.add_argument('-log', '--log-folder', help='Folder for log files')
+    parser.add_argument('-scan-workers', '--scan-workers', type=int, default=1,
+                        help='Folders listed at the same time, useful on NFS')
     args = parser.parse_args()
     
     # Setup logging
@@ -172,4 +175,4 @@ if __name__ == '__main__':
     setup_logging(log_folder)
     
     # Run main function
-    main(args.source)
\ No newline at end of file
+    main(args.source, args.scan_workers)
\ No newline at end of file
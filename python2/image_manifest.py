@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Persistent manifest of already processed images.
+
+The manifest is a small SQLite database keyed by path that remembers the
+size, mtime and content hash of every image the compress script has seen,
+and the quality it was saved with. Repeat runs only need a stat and a
+lookup to skip unchanged files.
+"""
+
+# =======================
+# MODULES IMPORTS
+# =======================
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+# =======================
+# VARIABLES
+# =======================
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# commit after this many writes, the rest is committed on close()
+COMMIT_EVERY = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha1 TEXT NOT NULL,
+    quality INTEGER,
+    processed_at REAL NOT NULL
+)
+"""
+
+
+def file_sha1(file_path, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Hash a file without reading it fully into memory.
+
+    Args:
+        file_path (str): Path to the file
+        chunk_size (int): Bytes read per iteration
+
+    Returns:
+        str: Hex SHA-1 digest of the file content
+    """
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as fh:
+        chunk = fh.read(chunk_size)
+        while chunk:
+            digest.update(chunk)
+            chunk = fh.read(chunk_size)
+    return digest.hexdigest()
+
+
+class ImageManifest(object):
+    """
+    SQLite backed record of processed images.
+
+    A lookup is a hit when the stored size and mtime match the file, or when
+    only the mtime changed and the content hash is still the same (touched
+    but not modified). Everything else is a miss.
+
+    The connection is shared between the walk and the result loop, which may
+    run on different threads when a process pool is used, so access is
+    serialized with a lock.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        # accept 8-bit byte string paths on Python 2
+        self._conn.text_factory = str
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+
+    def is_processed(self, file_path, st):
+        """
+        Check whether file_path is unchanged since it was last recorded.
+
+        Args:
+            file_path (str): Path to the file
+            st (os.stat_result): Current stat of the file
+
+        Returns:
+            bool: True on a manifest hit, False otherwise
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime, sha1 FROM images WHERE path = ?",
+                (file_path,)).fetchone()
+        hit = False
+        if row is not None and row[0] == st.st_size:
+            if row[1] == st.st_mtime:
+                hit = True
+            elif file_sha1(file_path) == row[2]:
+                # only touched, remember the new mtime to skip the hash next time
+                with self._lock:
+                    self._conn.execute(
+                        "UPDATE images SET mtime = ? WHERE path = ?",
+                        (st.st_mtime, file_path))
+                    self._written()
+                hit = True
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return hit
+
+    def record(self, file_path, quality=None):
+        """
+        Record the current state of file_path.
+
+        Args:
+            file_path (str): Path to the file, after any processing
+            quality (int): JPEG quality it was saved with, None if skipped
+        """
+        st = os.stat(file_path)
+        sha1 = file_sha1(file_path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO images "
+                "(path, size, mtime, sha1, quality, processed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (file_path, st.st_size, st.st_mtime, sha1, quality, time.time()))
+            self._written()
+
+    def _written(self):
+        # caller holds the lock
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        """Commit pending writes and close the database."""
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Single pass directory scanner shared by the image scripts.
+
+Walks a tree with scandir and yields ScanEntry objects whose stat result
+and file header are read at most once, so filters and callers never stat
+or open the same path again. A parallel mode lists several directories at
+the same time, which hides the per directory latency of NFS mounts.
+
+On Python 2 install the scandir backport (pip install scandir), without it
+the scanner falls back to os.listdir.
+"""
+
+# =======================
+# MODULES IMPORTS
+# =======================
+
+import os
+import time
+from stat import S_ISREG
+from multiprocessing.pool import ThreadPool
+from image_sniffer import HEADER_SIZE, read_header, sniff_header
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir  # Python 2 backport
+    except ImportError:
+        scandir = None
+
+
+class ScanEntry(object):
+    """
+    A file found by the scanner.
+
+    stat and header are loaded on first use and cached, so a predicate that
+    only looks at the name costs no syscall.
+    """
+
+    __slots__ = ('path', 'dirpath', 'name', '_dir_entry', '_stat', '_header')
+
+    def __init__(self, dirpath, name, dir_entry=None, st=None):
+        self.dirpath = dirpath
+        self.name = name
+        self.path = os.path.join(dirpath, name)
+        self._dir_entry = dir_entry
+        self._stat = st
+        self._header = None
+
+    @property
+    def stat(self):
+        if self._stat is None:
+            if self._dir_entry is not None:
+                self._stat = self._dir_entry.stat()
+            else:
+                self._stat = os.stat(self.path)
+        return self._stat
+
+    @property
+    def header(self):
+        if self._header is None:
+            self._header = read_header(self.path, HEADER_SIZE)
+        return self._header
+
+    @property
+    def image_type(self):
+        """Image type sniffed from the header, None if it is not an image."""
+        return sniff_header(self.header)
+
+
+# =======================
+# PREDICATES
+# =======================
+
+def newer_than(seconds, now=None):
+    """Match files modified less than seconds ago."""
+    now = time.time() if now is None else now
+    return lambda entry: now - entry.stat.st_mtime < seconds
+
+
+def modified_after(timestamp):
+    """Match files modified after timestamp."""
+    return lambda entry: entry.stat.st_mtime > timestamp
+
+
+def larger_than(size):
+    """Match files bigger than size bytes."""
+    return lambda entry: entry.stat.st_size > size
+
+
+def smaller_than(size):
+    """Match files smaller than size bytes."""
+    return lambda entry: entry.stat.st_size < size
+
+
+def has_extension(*extensions):
+    """Match files whose name ends with one of extensions, case insensitive."""
+    extensions = tuple(ext.lower() for ext in extensions)
+    return lambda entry: entry.name.lower().endswith(extensions)
+
+
+def is_image(entry):
+    """Match files whose magic bytes are those of an image."""
+    return entry.image_type is not None
+
+
+def matches(entry, predicates):
+    """
+    Apply predicates in order, cheap ones should come first.
+
+    A file that disappears or cannot be read does not match.
+    """
+    try:
+        for predicate in predicates:
+            if not predicate(entry):
+                return False
+    except (OSError, IOError):
+        return False
+    return True
+
+
+# =======================
+# SCANNING
+# =======================
+
+def list_dir(dirpath):
+    """
+    List one directory.
+
+    Returns:
+        tuple: (files, subdirs) where files are ScanEntry objects
+    """
+    files = []
+    subdirs = []
+    if scandir is not None:
+        for dir_entry in scandir(dirpath):
+            if dir_entry.is_dir(follow_symlinks=False):
+                subdirs.append(dir_entry.path)
+            elif dir_entry.is_file():
+                files.append(ScanEntry(dirpath, dir_entry.name, dir_entry))
+    else:
+        for name in os.listdir(dirpath):
+            path = os.path.join(dirpath, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                subdirs.append(path)
+            elif os.path.isfile(path):
+                files.append(ScanEntry(dirpath, name))
+    return files, subdirs
+
+
+def _scan_dir(job):
+    dirpath, predicates, onerror = job
+    try:
+        files, subdirs = list_dir(dirpath)
+    except OSError as error:
+        if onerror is not None:
+            onerror(error)
+        return [], []
+    return [entry for entry in files if matches(entry, predicates)], subdirs
+
+
+def scan(root, predicates=(), workers=1, onerror=None):
+    """
+    Yield the files under root that match every predicate.
+
+    Args:
+        root (str): Folder to scan recursively
+        predicates (list): Callables taking a ScanEntry
+        workers (int): Directories listed at the same time, 1 scans inline
+        onerror (callable): Called with the OSError of unreadable folders,
+            they are skipped silently by default like os.walk()
+    """
+    predicates = list(predicates)
+    if workers <= 1:
+        pending = [root]
+        while pending:
+            found, subdirs = _scan_dir((pending.pop(), predicates, onerror))
+            for entry in found:
+                yield entry
+            pending.extend(subdirs)
+        return
+
+    pool = ThreadPool(workers)
+    try:
+        pending = [root]
+        while pending:
+            jobs = [(dirpath, predicates, onerror) for dirpath in pending]
+            pending = []
+            for found, subdirs in pool.imap_unordered(_scan_dir, jobs):
+                for entry in found:
+                    yield entry
+                pending.extend(subdirs)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def scan_paths(paths, predicates=()):
+    """
+    Yield ScanEntry objects for explicit paths that exist and match.
+
+    Args:
+        paths (iterable): File paths
+        predicates (list): Callables taking a ScanEntry
+    """
+    predicates = list(predicates)
+    for path in paths:
+        entry = stat_entry(path)
+        if entry is not None and matches(entry, predicates):
+            yield entry
+
+
+def stat_entry(path):
+    """
+    Build a ScanEntry for a single path.
+
+    Returns:
+        ScanEntry: The entry, None if path is missing or not a regular file
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not S_ISREG(st.st_mode):
+        return None
+    dirpath, name = os.path.split(path)
+    return ScanEntry(dirpath, name, st=st)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Magic byte image sniffer, a faster replacement for imghdr.
+
+Reads a fixed HEADER_SIZE bytes with a single os.read and classifies the
+image with a lookup table keyed by the first byte. Returns the same names
+as imghdr ('jpeg', 'png', 'gif', 'webp', 'bmp', 'tiff') plus 'avif' and
+'heic', and keeps working on Python versions where imghdr was removed.
+"""
+
+# =======================
+# MODULES IMPORTS
+# =======================
+
+import os
+from multiprocessing.pool import ThreadPool
+
+# =======================
+# VARIABLES
+# =======================
+
+HEADER_SIZE = 32
+
+# first byte -> [(checks, type)], checks are (offset, magic) pairs
+SIGNATURES = {
+    b'\xff': [(((0, b'\xff\xd8\xff'),), 'jpeg')],
+    b'\x89': [(((0, b'\x89PNG\r\n\x1a\n'),), 'png')],
+    b'G': [(((0, b'GIF87a'),), 'gif'),
+           (((0, b'GIF89a'),), 'gif')],
+    b'R': [(((0, b'RIFF'), (8, b'WEBP')), 'webp')],
+    b'B': [(((0, b'BM'),), 'bmp')],
+    b'I': [(((0, b'II*\x00'),), 'tiff')],
+    b'M': [(((0, b'MM\x00*'),), 'tiff')],
+}
+
+# ISO base media files (AVIF, HEIC) start with a box size, then 'ftyp' and
+# the major brand
+FTYP = b'ftyp'
+FTYP_BRANDS = {
+    b'avif': 'avif', b'avis': 'avif',
+    b'heic': 'heic', b'heix': 'heic', b'hevc': 'heic', b'hevx': 'heic',
+    b'heim': 'heic', b'heis': 'heic', b'mif1': 'heic', b'msf1': 'heic',
+}
+# generic HEIF brands that may hold AVIF, told apart by the compatible brands
+GENERIC_HEIF_BRANDS = (b'mif1', b'msf1')
+
+OPEN_FLAGS = os.O_RDONLY | getattr(os, 'O_BINARY', 0)
+
+
+def sniff_header(header):
+    """
+    Classify an image from its first bytes.
+
+    Args:
+        header (bytes): At least the first HEADER_SIZE bytes of the file,
+            or the whole file if shorter
+
+    Returns:
+        str: Image type, None if it is not a known image
+    """
+    for checks, image_type in SIGNATURES.get(header[:1], ()):
+        for offset, magic in checks:
+            if header[offset:offset + len(magic)] != magic:
+                break
+        else:
+            return image_type
+    if header[4:8] == FTYP:
+        brand = header[8:12]
+        if brand in GENERIC_HEIF_BRANDS and b'avif' in header[16:HEADER_SIZE]:
+            return 'avif'
+        return FTYP_BRANDS.get(brand)
+    return None
+
+
+def read_header(file_path, size=HEADER_SIZE):
+    """Read the first size bytes of a file with a single os.read."""
+    fd = os.open(file_path, OPEN_FLAGS)
+    try:
+        return os.read(fd, size)
+    finally:
+        os.close(fd)
+
+
+def sniff(file_path):
+    """
+    Classify the image at file_path.
+
+    Returns:
+        str: Image type, None if it is not a known image
+
+    Raises:
+        OSError: If the file cannot be read
+    """
+    return sniff_header(read_header(file_path))
+
+
+def _sniff_or_none(file_path):
+    try:
+        return sniff(file_path)
+    except OSError:
+        return None
+
+
+def sniff_many(paths, workers=1):
+    """
+    Classify a list of files.
+
+    Args:
+        paths (list): File paths
+        workers (int): Files read at the same time, 1 reads them inline
+
+    Returns:
+        list: Image type or None for each path, in the same order;
+            unreadable files are None
+    """
+    if workers <= 1:
+        return [_sniff_or_none(path) for path in paths]
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(_sniff_or_none, paths, chunksize=256)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Single decode rendition engine.
+
+Decodes a source image once, using JPEG draft mode to let libjpeg scale the
+image down while decoding, and builds every configured size from the
+smallest already built image that is still large enough.
+"""
+
+# =======================
+# MODULES IMPORTS
+# =======================
+
+import time
+from PIL import Image
+
+# =======================
+# VARIABLES
+# =======================
+
+# how a rendition fits its box
+FIT_BOX = 'box'        # fit inside the box, like Image.thumbnail()
+FIT_WIDTH = 'width'    # scale to the box width keeping the ratio
+
+RESAMPLE = Image.LANCZOS
+
+
+def target_size(src_size, box, fit=FIT_BOX):
+    """
+    Compute the size of a rendition, never upscaling.
+
+    Args:
+        src_size (tuple): (width, height) of the source
+        box (tuple): (width, height) to fit, None keeps the source size
+        fit (str): FIT_BOX or FIT_WIDTH
+
+    Returns:
+        tuple: (width, height) of the rendition
+    """
+    width, height = src_size
+    if box is None:
+        return width, height
+    box_width, box_height = box
+    if fit == FIT_WIDTH:
+        if width <= box_width:
+            return width, height
+        return box_width, max(1, int(box_width * height / width))
+    if width <= box_width and height <= box_height:
+        return width, height
+    ratio = min(float(box_width) / width, float(box_height) / height)
+    return max(1, int(width * ratio)), max(1, int(height * ratio))
+
+
+def render_renditions(infile, sizes, fits=None, prepare=None):
+    """
+    Decode infile once and build one image per entry of sizes.
+
+    Renditions with the same size as their source share the image object,
+    treat the results as read only.
+
+    Args:
+        infile (str): Path to the source image
+        sizes (dict): name -> (width, height) box, None for full size
+        fits (dict): name -> FIT_BOX or FIT_WIDTH, FIT_BOX by default
+        prepare (callable): Applied to the decoded image, e.g. colorspace()
+
+    Returns:
+        tuple: (renditions, timings) where renditions maps name -> PIL.Image
+            and timings has the 'decode' and 'resample' seconds
+    """
+    fits = fits or {}
+    timings = {'decode': 0.0, 'resample': 0.0}
+
+    start = time.time()
+    with Image.open(infile) as im:
+        targets = dict((name, target_size(im.size, box, fits.get(name, FIT_BOX)))
+                       for name, box in sizes.items())
+        if im.format == 'JPEG':
+            # let libjpeg decode at 1/2, 1/4 or 1/8 scale, never below
+            # the largest rendition
+            im.draft(None, (max(w for w, _ in targets.values()),
+                            max(h for _, h in targets.values())))
+        im.load()
+        decoded = prepare(im) if prepare is not None else im
+        timings['decode'] = time.time() - start
+
+        start = time.time()
+        built = [decoded]
+        renditions = {}
+        # largest first so each smaller size starts from a closer intermediate
+        for name in sorted(targets, key=lambda n: targets[n][0] * targets[n][1], reverse=True):
+            width, height = targets[name]
+            sources = [b for b in built if b.size[0] >= width and b.size[1] >= height]
+            source = min(sources, key=lambda b: b.size[0] * b.size[1])
+            if source.size == (width, height):
+                rendition = source
+            else:
+                rendition = source.resize((width, height), RESAMPLE)
+                built.append(rendition)
+            renditions[name] = rendition
+        # the opened image is unusable once the with block closes it
+        for name, rendition in renditions.items():
+            if rendition is im:
+                renditions[name] = im.copy()
+        timings['resample'] = time.time() - start
+
+    return renditions, timings
@@ -0,0 +1,62 @@
+"""
+Compare DetachedSigner/DetachedVerifier with sign_message_detached() and
+verify_message_detached().
+
+    python benchmarks/bench_signer.py -n 500
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import ssl
+import time
+from typing import Callable
+
+from json_web_token import (
+    DetachedSigner,
+    DetachedVerifier,
+    get_private_key_from_pem,
+    sign_message_detached,
+    verify_message_detached
+)
+
+certificates_dir: str = os.path.join(os.path.dirname(__file__), '..', 'tests', 'testcerts')
+
+payload_no_encoded: dict = {"data": {"request": {"info_ex1": "value 1", "info_ex2": "value 2"}}}
+
+
+def ops_per_second(func: Callable[[], object], number: int) -> float:
+    func()  # warm up caches
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return number / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=300, help='Calls per case (default: 300)')
+    args = parser.parse_args()
+
+    with open(os.path.join(certificates_dir, 'example-cert.pem'), 'rb') as cert_file:
+        cert_der = ssl.PEM_cert_to_DER_cert(cert_file.read().decode("utf-8"))
+    with open(os.path.join(certificates_dir, 'example-priv_sk.pem'), 'rb') as key_file:
+        private_key = get_private_key_from_pem(key_file.read())
+
+    signer = DetachedSigner(private_key, cert_der)
+    verifier = DetachedVerifier(cert_der)
+    token = signer.sign(payload_no_encoded)
+
+    cases = [
+        ("sign_message_detached", lambda: sign_message_detached(private_key, cert_der, payload_no_encoded)),
+        ("DetachedSigner.sign", lambda: signer.sign(payload_no_encoded)),
+        ("verify_message_detached", lambda: verify_message_detached(token, payload_no_encoded)),
+        ("DetachedVerifier.verify", lambda: verifier.verify(token, payload_no_encoded)),
+    ]
+    for name, func in cases:
+        rate = ops_per_second(func, args.number)
+        print(f"{name:<26}{rate:>10.1f} ops/s {1e6 / rate:>10.1f} us/op")
+
+
+if __name__ == '__main__':
+    main()
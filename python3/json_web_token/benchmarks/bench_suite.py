@@ -0,0 +1,241 @@
+"""
+Benchmark sign_message_detached() and verify_message_detached().
+
+Runs every combination of payload size (1 KB to 10 MB), key (the bundled
+4096-bit RSA test key, generated 2048 and 3072-bit RSA keys for PS256, a
+P-256 key for ES256 and an Ed25519 key for EdDSA) and operation: sign,
+verify with a cold certificate cache (x5c parsed on every call) and verify
+with a warm one. Reports ops/s and p50/p99 latency, then the throughput of
+every key against the first one on the same payloads.
+
+    python benchmarks/bench_suite.py --save baseline.json
+    python benchmarks/bench_suite.py --compare baseline.json --tolerance 0.15
+    python benchmarks/bench_suite.py --keys rsa2048 ec-p256 ed25519 --sizes 1KB 1MB
+
+--compare exits with status 1 when a case's p50 got slower than the
+baseline by more than the tolerance.
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import ssl
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import cryptography
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from cryptography.x509.oid import NameOID
+
+from json_web_token import (
+    SUPPORTED_ALGORITHMS,
+    CertificateCache,
+    get_private_key_from_pem,
+    sign_message_detached,
+    verify_message_detached
+)
+
+certificates_dir: str = os.path.join(os.path.dirname(__file__), '..', 'tests', 'testcerts')
+
+PAYLOAD_SIZES = {'1KB': 1 << 10, '10KB': 10 << 10, '100KB': 100 << 10, '1MB': 1 << 20, '10MB': 10 << 20}
+KEYS = ['rsa2048', 'rsa3072', 'rsa4096', 'ec-p256', 'ed25519']
+OPERATIONS = ['sign', 'verify_cold', 'verify_warm']
+
+
+def make_payload(size: int) -> dict:
+    """A payload of records whose compact JSON is about size bytes."""
+    record = {"id": 0, "name": "item", "price": 12.5, "tags": ["a", "b"], "note": "x" * 40}
+    record_size = len(json.dumps(record, separators=(",", ":"))) + 1
+    count = max(1, size // record_size)
+    return {"data": {"records": [dict(record, id=i) for i in range(count)]}}
+
+
+def load_bundled_key() -> Tuple[object, bytes]:
+    with open(os.path.join(certificates_dir, 'example-cert.pem'), 'rb') as cert_file:
+        cert_der = ssl.PEM_cert_to_DER_cert(cert_file.read().decode("utf-8"))
+    with open(os.path.join(certificates_dir, 'example-priv_sk.pem'), 'rb') as key_file:
+        private_key = get_private_key_from_pem(key_file.read())
+    return private_key, cert_der
+
+
+def make_key(key_name: str) -> Tuple[object, bytes]:
+    """Generate a key (rsa<bits>, ec-p256 or ed25519) and a self-signed certificate (DER) for it."""
+    if key_name == 'ec-p256':
+        key = ec.generate_private_key(ec.SECP256R1())
+    elif key_name == 'ed25519':
+        key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        key = rsa.generate_private_key(public_exponent=65537, key_size=int(key_name[len('rsa'):]))
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, f"bench-{key_name}")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder()
+            .subject_name(name).issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=30))
+            # Ed25519 signs without a separate hash
+            .sign(key, None if key_name == 'ed25519' else hashes.SHA256()))
+    return key, cert.public_bytes(serialization.Encoding.DER)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted samples."""
+    return samples[min(len(samples) - 1, int(round(q * (len(samples) - 1))))]
+
+
+def measure(func: Callable[[], object], min_time: float, min_runs: int, max_runs: int) -> Dict[str, float]:
+    """Call func until min_time has passed (within the run limits), return the stats."""
+    func()  # warm up
+    samples = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < max_runs and (len(samples) < min_runs or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        'runs': len(samples),
+        'ops_per_sec': len(samples) / sum(samples),
+        'p50_us': percentile(samples, 0.50) * 1e6,
+        'p99_us': percentile(samples, 0.99) * 1e6,
+    }
+
+
+def run(sizes: List[str], keys: List[str], operations: List[str],
+        min_time: float, min_runs: int, max_runs: int) -> Dict[str, Dict[str, float]]:
+    bundled_key, bundled_der = load_bundled_key()
+    results = {}
+    for key_name in keys:
+        if key_name == f"rsa{bundled_key.key_size}":
+            private_key, cert_der = bundled_key, bundled_der
+        else:
+            private_key, cert_der = make_key(key_name)
+        warm_cache = CertificateCache()
+        for size_name in sizes:
+            payload = make_payload(PAYLOAD_SIZES[size_name])
+            token = sign_message_detached(private_key, cert_der, payload)
+            cases = {
+                'sign': lambda: sign_message_detached(private_key, cert_der, payload),
+                # a new cache per call parses the x5c certificate every time
+                'verify_cold': lambda: verify_message_detached(token, payload, cert_cache=CertificateCache(),
+                                                               algorithms=SUPPORTED_ALGORITHMS),
+                'verify_warm': lambda: verify_message_detached(token, payload, cert_cache=warm_cache,
+                                                               algorithms=SUPPORTED_ALGORITHMS),
+            }
+            for operation in operations:
+                name = f"{operation}/{key_name}/{size_name}"
+                results[name] = stats = measure(cases[operation], min_time, min_runs, max_runs)
+                print(f"{name:<28}{stats['ops_per_sec']:>10.1f} ops/s  p50 {stats['p50_us']:>11.1f} us"
+                      f"  p99 {stats['p99_us']:>11.1f} us  ({stats['runs']} runs)", flush=True)
+    return results
+
+
+def summarize(results: Dict[str, Dict[str, float]], keys: List[str]) -> None:
+    """Print the ops/s of every key against the first one, per operation and payload size."""
+    if len(keys) < 2:
+        return
+    print(f"\n{'case':<22}" + ''.join(f"{key_name:>16}" for key_name in keys))
+    for name in results:
+        operation, key_name, size_name = name.split('/')
+        if key_name != keys[0]:
+            continue
+        reference = results[name]['ops_per_sec']
+        row = f"{operation + '/' + size_name:<22}"
+        for other in keys:
+            ops_per_sec = results[f"{operation}/{other}/{size_name}"]['ops_per_sec']
+            row += f"{ops_per_sec:>9.0f} x{ops_per_sec / reference:<5.1f}"
+        print(row)
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[str]:
+    """Print p50 changes against the baseline, return the regressed case names."""
+    regressions = []
+    print(f"\n{'case':<28}{'baseline p50':>14}{'p50':>12}{'change':>10}")
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['p50_us'], stats['p50_us']
+        change = after / before - 1
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<28}{before:>12.1f}us{after:>10.1f}us{change:>+10.1%}{flag}")
+    return regressions
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+
+    parser.add_argument('--sizes', nargs='+', choices=list(PAYLOAD_SIZES), default=list(PAYLOAD_SIZES),
+                        help='Payload sizes (default: all)')
+
+    parser.add_argument('--keys', nargs='+', choices=KEYS, default=KEYS,
+                        help='Keys, the first is the reference of the summary (default: all)')
+
+    parser.add_argument('--ops', nargs='+', choices=OPERATIONS, default=OPERATIONS,
+                        help='Operations (default: all)')
+
+    parser.add_argument('--min-time', type=float, default=0.5,
+                        help='Seconds each case runs for at least (default: 0.5)')
+
+    parser.add_argument('--min-runs', type=int, default=5,
+                        help='Fewest calls per case (default: 5)')
+
+    parser.add_argument('--max-runs', type=int, default=2000,
+                        help='Most calls per case (default: 2000)')
+
+    parser.add_argument('--save', metavar='FILE',
+                        help='Write the results as a JSON baseline')
+
+    parser.add_argument('--compare', metavar='FILE',
+                        help='Compare against a JSON baseline, exit 1 on regression')
+
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed p50 slowdown against the baseline (default: 0.2 = 20%%)')
+
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_arguments()
+    results = run(args.sizes, args.keys, args.ops, args.min_time, args.min_runs, args.max_runs)
+    summarize(results, args.keys)
+
+    if args.save:
+        report = {
+            'meta': {
+                'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cryptography': cryptography.__version__,
+                'pyjwt': jwt.__version__,
+            },
+            'results': results,
+        }
+        with open(args.save, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+        print(f"\nBaseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as fh:
+            baseline = json.load(fh)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} cases slower than the baseline by more than {args.tolerance:.0%}")
+            return 1
+        print("\nNo regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,21 +5,122 @@ This package provides utilities for working with JWS (JSON Web Signature)
 according to RFC-7797, with support for detached payloads and x5c header.
 """
 
-from .utils import (
-    get_x509_cert_from_pem,
-    get_x509_cert_from_der,
-    get_private_key_from_pem,
-    sign_message_detached,
-    verify_message_detached
-)
-
-__all__ = [
-    'get_x509_cert_from_pem',
-    'get_x509_cert_from_der',
-    'get_private_key_from_pem',
-    'sign_message_detached',
-    'verify_message_detached'
-]
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+# public name -> submodule defining it; submodules, and with them PyJWT and
+# cryptography, are imported on first access so "import json_web_token"
+# stays cheap and side-effect free
+_EXPORTS = {
+    'get_x509_cert_from_pem': 'utils',
+    'get_x509_cert_from_der': 'utils',
+    'get_private_key_from_pem': 'utils',
+    'encode_x5c': 'utils',
+    'sign_message_detached': 'utils',
+    'verify_message_detached': 'utils',
+    'CacheStats': 'cert_cache',
+    'CertificateCache': 'cert_cache',
+    'certificate_fingerprint': 'cert_cache',
+    'default_certificate_cache': 'cert_cache',
+    'SignResult': 'batch',
+    'VerifyResult': 'batch',
+    'sign_many': 'batch',
+    'verify_many': 'batch',
+    'DetachedSigner': 'signer',
+    'DetachedVerifier': 'signer',
+    'detached_protected_header': 'signer',
+    'PayloadStream': 'streaming',
+    'sign_stream': 'streaming',
+    'verify_stream': 'streaming',
+    'JSON_BACKEND': 'payload',
+    'Payload': 'payload',
+    'canonicalize': 'payload',
+    'serialize_payload': 'payload',
+    'KeyRegistry': 'key_registry',
+    'KeyRegistryStats': 'key_registry',
+    'TrustStore': 'trust_store',
+    'chain_fingerprint': 'trust_store',
+    'DEFAULT_ALGORITHMS': 'algorithms',
+    'SUPPORTED_ALGORITHMS': 'algorithms',
+    'SigningKey': 'algorithms',
+    'VerifyingKey': 'algorithms',
+    'algorithm_for_key': 'algorithms',
+    'VerificationCache': 'verification_cache',
+    'VerificationCacheStats': 'verification_cache'
+}
+
+if TYPE_CHECKING:
+    from .utils import (
+        get_x509_cert_from_pem,
+        get_x509_cert_from_der,
+        get_private_key_from_pem,
+        encode_x5c,
+        sign_message_detached,
+        verify_message_detached
+    )
+    from .cert_cache import (
+        CacheStats,
+        CertificateCache,
+        certificate_fingerprint,
+        default_certificate_cache
+    )
+    from .batch import (
+        SignResult,
+        VerifyResult,
+        sign_many,
+        verify_many
+    )
+    from .signer import (
+        DetachedSigner,
+        DetachedVerifier,
+        detached_protected_header
+    )
+    from .streaming import (
+        PayloadStream,
+        sign_stream,
+        verify_stream
+    )
+    from .payload import (
+        JSON_BACKEND,
+        Payload,
+        canonicalize,
+        serialize_payload
+    )
+    from .key_registry import (
+        KeyRegistry,
+        KeyRegistryStats
+    )
+    from .trust_store import (
+        TrustStore,
+        chain_fingerprint
+    )
+    from .algorithms import (
+        DEFAULT_ALGORITHMS,
+        SUPPORTED_ALGORITHMS,
+        SigningKey,
+        VerifyingKey,
+        algorithm_for_key
+    )
+    from .verification_cache import (
+        VerificationCache,
+        VerificationCacheStats
+    )
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
+
 
 def hello() -> str:
     return "Hello from json-web-token!"
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from typing import Dict, Tuple, Union
+
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey, RSAPublicKey
+from jwt.algorithms import Algorithm, get_default_algorithms
+
+SigningKey = Union[RSAPrivateKey, ec.EllipticCurvePrivateKey, Ed25519PrivateKey]
+VerifyingKey = Union[RSAPublicKey, ec.EllipticCurvePublicKey, Ed25519PublicKey]
+
+# what verifiers accept unless told otherwise, the algorithm the package always used
+DEFAULT_ALGORITHMS: Tuple[str, ...] = ("PS256",)
+
+# algorithms a key can select, RSA keys keep PS256
+SUPPORTED_ALGORITHMS: Tuple[str, ...] = ("PS256", "ES256", "ES384", "ES512", "EdDSA")
+
+_EC_ALGORITHMS = {"secp256r1": "ES256", "secp384r1": "ES384", "secp521r1": "ES512"}
+
+_ALGORITHMS: Dict[str, Algorithm] = {name: algorithm for name, algorithm in get_default_algorithms().items()
+                                     if name in SUPPORTED_ALGORITHMS}
+
+
+def algorithm_for_key(key: Union[SigningKey, VerifyingKey]) -> str:
+    """
+    JWS algorithm for a private or public key.
+
+    RSA keys use PS256, EC keys ES256/ES384/ES512 after their curve
+    (P-256, P-384, P-521) and Ed25519 keys EdDSA.
+
+    Args:
+        key: Private or public key
+
+    Returns:
+        The "alg" header value
+
+    Raises:
+        ValueError: If the key type or curve is not supported
+    """
+    if isinstance(key, (RSAPrivateKey, RSAPublicKey)):
+        return "PS256"
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)):
+        algorithm = _EC_ALGORITHMS.get(key.curve.name)
+        if algorithm is None:
+            raise ValueError(f"Unsupported elliptic curve: {key.curve.name}")
+        return algorithm
+    if isinstance(key, (Ed25519PrivateKey, Ed25519PublicKey)):
+        return "EdDSA"
+    raise ValueError(f"Unsupported key type: {type(key).__name__}")
+
+
+def get_algorithm(name: str) -> Algorithm:
+    """
+    PyJWT algorithm object for a supported algorithm name.
+
+    Raises:
+        ValueError: If the algorithm is not supported
+    """
+    algorithm = _ALGORITHMS.get(name)
+    if algorithm is None:
+        raise ValueError(f"Unsupported algorithm: {name}")
+    return algorithm
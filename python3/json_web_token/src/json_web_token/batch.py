@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple, TypeVar, Union
+
+from .algorithms import DEFAULT_ALGORITHMS, SigningKey, VerifyingKey
+from .cert_cache import CertificateCache
+from .payload import Payload
+from .signer import DetachedSigner
+from .trust_store import TrustStore
+from .utils import _verify_detached
+from .verification_cache import VerificationCache
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass(frozen=True)
+class SignResult:
+    """Outcome of signing one payload of a batch."""
+
+    index: int
+    token: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass(frozen=True)
+class VerifyResult:
+    """Outcome of verifying one token of a batch."""
+
+    index: int
+    valid: bool
+    error: Optional[str] = None
+
+
+def _chunks(items: Iterable[T], size: int) -> Iterable[List[T]]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _fan_out(
+        func: Callable[[int, T], R],
+        items: Iterable[T],
+        max_workers: Optional[int],
+        chunk_size: int
+) -> List[R]:
+    """Run func(index, item) over items in a thread pool, results in input order."""
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    indexed = enumerate(items)
+    # a chunk per task keeps the executor overhead low for small payloads
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        results: List[R] = []
+        for chunk_results in executor.map(lambda chunk: [func(i, item) for i, item in chunk],
+                                          _chunks(indexed, chunk_size)):
+            results.extend(chunk_results)
+    return results
+
+
+def sign_many(
+        private_key: SigningKey,
+        certificate_chain: Union[bytes, Sequence[bytes]],
+        payloads: Iterable[Payload],
+        max_workers: Optional[int] = None,
+        chunk_size: int = 16,
+        canonical: bool = False
+) -> List[SignResult]:
+    """
+    Sign many payloads with the same key and x5c certificate.
+
+    A DetachedSigner computes the protected header and x5c encoding once,
+    the signatures run in a thread pool (cryptography releases the GIL
+    while signing). Every token is the same as sign_message_detached()
+    would return.
+
+    Args:
+        private_key: The private key used to sign the messages
+        certificate_chain: The decoded bytes of the X.509 certificate (DER encoded),
+            or a list of them with the leaf first
+        payloads: The payloads (not encoded), or their serialized bytes
+        max_workers: Threads in the pool, os.cpu_count() if None
+        chunk_size: Payloads handed to a thread at a time
+        canonical: Serialize dict payloads with RFC 8785 canonicalization
+
+    Returns:
+        One SignResult per payload, in input order; a payload that cannot be
+        signed has its error set instead of a token
+
+    Raises:
+        ValueError: If the private key type is not supported
+    """
+    signer = DetachedSigner(private_key, certificate_chain, canonical)
+
+    def sign_one(index: int, payload_no_encoded: Payload) -> SignResult:
+        try:
+            return SignResult(index, token=signer.sign(payload_no_encoded))
+        except ValueError as e:
+            return SignResult(index, error=str(e))
+
+    return _fan_out(sign_one, payloads, max_workers, chunk_size)
+
+
+def verify_many(
+        tokens_and_payloads: Iterable[Tuple[str, Payload]],
+        public_key: Optional[VerifyingKey] = None,
+        cert_cache: Optional[CertificateCache] = None,
+        max_workers: Optional[int] = None,
+        chunk_size: int = 16,
+        trust_store: Optional[TrustStore] = None,
+        canonical: bool = False,
+        algorithms: Sequence[str] = DEFAULT_ALGORITHMS,
+        verification_cache: Optional[VerificationCache] = None
+) -> List[VerifyResult]:
+    """
+    Verify many detached tokens in a thread pool.
+
+    Each token is checked like verify_message_detached() does, x5c
+    certificates go through the certificate cache so a certificate shared
+    by the batch is parsed once.
+
+    Args:
+        tokens_and_payloads: (token, payload not encoded) pairs
+        public_key: Optional public key used for every token
+        cert_cache: Cache for the x5c certificates, default_certificate_cache if None
+        max_workers: Threads in the pool, os.cpu_count() if None
+        chunk_size: Tokens handed to a thread at a time
+        trust_store: Optional TrustStore the x5c chains are validated against
+        canonical: Dict payloads were signed with RFC 8785 canonicalization
+        algorithms: The "alg" values accepted, PS256 alone by default
+        verification_cache: Optional VerificationCache of successful verifications,
+            repeated pairs within and across batches are verified once
+
+    Returns:
+        One VerifyResult per pair, in input order, with the reason of a failure
+    """
+    def verify_one(index: int, item: Tuple[str, Payload]) -> VerifyResult:
+        token_detached, payload_no_encoded = item
+        try:
+            _verify_detached(token_detached, payload_no_encoded, public_key, cert_cache, trust_store,
+                             canonical, algorithms, verification_cache)
+        except Exception as e:
+            logger.debug(f"Verification of token {index} failed: {e}")
+            return VerifyResult(index, False, str(e) or type(e).__name__)
+        return VerifyResult(index, True)
+
+    return _fan_out(verify_one, tokens_and_payloads, max_workers, chunk_size)
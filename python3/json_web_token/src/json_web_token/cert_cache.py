@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+from cryptography import x509
+from cryptography.x509 import Certificate
+
+from cryptography.hazmat.primitives.asymmetric.types import PublicKeyTypes
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    """Counters of a CertificateCache."""
+
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    size: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass
+class _Entry:
+    der: bytes
+    certificate: Certificate
+    public_key: PublicKeyTypes
+    expires_at: Optional[float]
+
+
+def certificate_fingerprint(der_data: bytes) -> str:
+    """
+    SHA-256 fingerprint of a DER-encoded certificate.
+
+    Args:
+        der_data: DER-encoded certificate data
+
+    Returns:
+        Lowercase hex digest
+    """
+    return hashlib.sha256(der_data).hexdigest()
+
+
+class CertificateCache:
+    """
+    Bounded LRU/TTL cache of parsed X.509 certificates and their public keys.
+
+    Entries are keyed by the SHA-256 fingerprint of the DER bytes, and a hit
+    also compares the stored DER bytes with the requested ones, so a cached
+    key is never returned for a different certificate.
+    """
+
+    def __init__(
+            self,
+            maxsize: int = 128,
+            ttl: Optional[float] = 3600.0,
+            clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            maxsize: Most certificates kept, least recently used are evicted
+            ttl: Seconds an entry is kept, None keeps it until evicted
+            clock: Monotonic time source, replaceable in tests
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, der_data: bytes) -> Tuple[Certificate, PublicKeyTypes]:
+        """
+        Return the parsed certificate and public key for DER bytes.
+
+        Args:
+            der_data: DER-encoded certificate data
+
+        Returns:
+            Tuple of (Certificate, public key)
+
+        Raises:
+            ValueError: If the certificate cannot be loaded
+        """
+        fingerprint = certificate_fingerprint(der_data)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                if entry.expires_at is not None and entry.expires_at <= now:
+                    del self._entries[fingerprint]
+                    self._expirations += 1
+                elif entry.der == der_data:
+                    self._entries.move_to_end(fingerprint)
+                    self._hits += 1
+                    return entry.certificate, entry.public_key
+            self._misses += 1
+
+        # parse outside the lock, concurrent misses for the same certificate
+        # just store the same value twice
+        try:
+            certificate = x509.load_der_x509_certificate(der_data)
+        except Exception as e:
+            logger.error(f"Failed to load DER certificate: {e}")
+            raise ValueError(f"Invalid DER certificate: {e}") from e
+        public_key = certificate.public_key()
+        expires_at = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[fingerprint] = _Entry(bytes(der_data), certificate, public_key, expires_at)
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+        return certificate, public_key
+
+    def invalidate(self, der_data: Optional[bytes] = None, fingerprint: Optional[str] = None) -> bool:
+        """
+        Drop one certificate from the cache.
+
+        Args:
+            der_data: DER-encoded certificate data
+            fingerprint: Or its SHA-256 hex fingerprint
+
+        Returns:
+            True if the certificate was cached
+        """
+        if fingerprint is None:
+            if der_data is None:
+                raise ValueError("Pass der_data or fingerprint")
+            fingerprint = certificate_fingerprint(der_data)
+        with self._lock:
+            return self._entries.pop(fingerprint.lower(), None) is not None
+
+    def clear(self) -> None:
+        """Drop every certificate, the counters are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, der_data: bytes) -> bool:
+        with self._lock:
+            entry = self._entries.get(certificate_fingerprint(der_data))
+            return entry is not None and entry.der == der_data
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions,
+                              self._expirations, len(self._entries))
+
+
+# shared by verify_message_detached() when no cache is passed
+default_certificate_cache = CertificateCache()
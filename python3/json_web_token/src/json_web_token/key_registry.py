@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .algorithms import SigningKey
+from .utils import get_private_key_from_pem
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class KeyRegistryStats:
+    """Counters of a KeyRegistry."""
+
+    keys: int
+    loads: int
+    load_failures: int
+    load_seconds: float
+    last_load_seconds: float
+
+    @property
+    def mean_load_seconds(self) -> float:
+        return self.load_seconds / self.loads if self.loads else 0.0
+
+
+@dataclass
+class _KeyEntry:
+    private_key: SigningKey
+    path: Optional[str]
+    password: Optional[bytes]
+    file_state: Optional[Tuple[int, int]]  # (st_mtime_ns, st_size) of path when loaded
+
+
+def _file_state(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class KeyRegistry:
+    """
+    Private keys loaded once per key ID and kept for the life of the process.
+
+    Loading a password-protected PEM runs a deliberately slow KDF, so keys
+    are loaded and validated on register() instead of per request. Keys
+    registered from a file can be rotated on disk: refresh() reloads the
+    files that changed, outside the lock, and swaps the new key in, so
+    get() never waits for a load.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        """
+        Args:
+            clock: Time source for the load latency, replaceable in tests
+        """
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._keys: Dict[str, _KeyEntry] = {}
+        self._loads = 0
+        self._load_failures = 0
+        self._load_seconds = 0.0
+        self._last_load_seconds = 0.0
+
+    def _load(self, pem_data: bytes, password: Optional[bytes]) -> SigningKey:
+        start = self._clock()
+        try:
+            private_key = get_private_key_from_pem(pem_data, password)
+        except ValueError:
+            with self._lock:
+                self._load_failures += 1
+            raise
+        elapsed = self._clock() - start
+        with self._lock:
+            self._loads += 1
+            self._load_seconds += elapsed
+            self._last_load_seconds = elapsed
+        return private_key
+
+    def register(
+            self,
+            key_id: str,
+            pem_data: Optional[bytes] = None,
+            path: Optional[str] = None,
+            password: Optional[bytes] = None
+    ) -> SigningKey:
+        """
+        Load a key and keep it under key_id, replacing any previous key.
+
+        Args:
+            key_id: Name the signers ask for
+            pem_data: PEM-encoded private key data
+            path: Or a PEM file, which refresh() watches for rotation
+            password: Optional password if the key is encrypted
+
+        Returns:
+            The loaded private key
+
+        Raises:
+            ValueError: If the key cannot be loaded
+        """
+        if (pem_data is None) == (path is None):
+            raise ValueError("Pass either pem_data or path")
+        file_state = None
+        if path is not None:
+            path = os.path.abspath(path)
+            file_state = _file_state(path)
+            with open(path, 'rb') as key_file:
+                pem_data = key_file.read()
+        private_key = self._load(pem_data, password)
+        with self._lock:
+            self._keys[key_id] = _KeyEntry(private_key, path, password, file_state)
+        logger.info(f"Loaded private key {key_id}")
+        return private_key
+
+    def get(self, key_id: str) -> SigningKey:
+        """
+        Return the current key for key_id.
+
+        Raises:
+            ValueError: If no key is registered under key_id
+        """
+        entry = self._keys.get(key_id)
+        if entry is None:
+            raise ValueError(f"Unknown key id: {key_id}")
+        return entry.private_key
+
+    def remove(self, key_id: str) -> bool:
+        """Forget a key, returns True if it was registered."""
+        with self._lock:
+            return self._keys.pop(key_id, None) is not None
+
+    def refresh(self) -> List[str]:
+        """
+        Reload the keys whose file changed since it was loaded.
+
+        A file that is missing or holds an invalid key is logged and the key
+        loaded before is kept, so a half-written rotation never breaks signing.
+
+        Returns:
+            The key IDs that were reloaded
+        """
+        with self._lock:
+            watched = [(key_id, entry) for key_id, entry in self._keys.items() if entry.path]
+        reloaded = []
+        for key_id, entry in watched:
+            try:
+                file_state = _file_state(entry.path)
+                if file_state == entry.file_state:
+                    continue
+                with open(entry.path, 'rb') as key_file:
+                    private_key = self._load(key_file.read(), entry.password)
+            except (OSError, ValueError) as e:
+                logger.error(f"Cannot reload private key {key_id}, keeping the current one: {e}")
+                continue
+            with self._lock:
+                # skip keys removed or registered again while loading
+                if self._keys.get(key_id) is entry:
+                    self._keys[key_id] = _KeyEntry(private_key, entry.path, entry.password, file_state)
+                    reloaded.append(key_id)
+                    logger.info(f"Reloaded private key {key_id} from {entry.path}")
+        return reloaded
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key_id: str) -> bool:
+        return key_id in self._keys
+
+    @property
+    def stats(self) -> KeyRegistryStats:
+        with self._lock:
+            return KeyRegistryStats(len(self._keys), self._loads, self._load_failures,
+                                    self._load_seconds, self._last_load_seconds)
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import gc
+import json
+import math
+import re
+from decimal import Decimal
+from typing import Any, Dict, Union
+
+try:
+    import orjson
+except ImportError:  # optional, pip install "json-web-token[fast]"
+    orjson = None
+
+# a dict is serialized, bytes-like payloads are the exact bytes that were signed
+Payload = Union[Dict[str, Any], bytes, bytearray, memoryview]
+
+JSON_BACKEND: str = "orjson" if orjson is not None else "json"
+
+# orjson output that json.dumps() would write differently: exponents
+# ("1e16" vs "1e+16"), small decimals ("0.00001" vs "1e-05"), bytes outside
+# printable ASCII (json escapes them) and null, which orjson also writes for
+# NaN. Checked with substring searches, one regex with alternatives would
+# cost more than orjson.dumps() itself.
+_ORJSON_EXPONENT = re.compile(rb'e-?[0-9]')
+
+# types orjson and json.dumps() serialize alike; orjson also writes datetime,
+# UUID, Enum, dataclass and subclass values that json.dumps() rejects or
+# writes differently, so a payload holding any other type goes to json
+_JSON_TYPES = frozenset({dict, list, tuple, str, int, float, bool, type(None)})
+
+if orjson is not None:
+    # orjson has no passthrough option for UUID and Enum, _json_types_only() catches those
+    _ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+                       | orjson.OPT_PASSTHROUGH_SUBCLASS)
+
+_JCS_ESCAPES = {'"': '\\"', '\\': '\\\\', '\b': '\\b', '\t': '\\t', '\n': '\\n', '\f': '\\f', '\r': '\\r'}
+_JCS_ESCAPE = re.compile(r'["\\\x00-\x1f]')
+
+# largest integer an IEEE 754 double holds exactly, RFC 8785 numbers are doubles
+_MAX_SAFE_INTEGER = 2 ** 53
+
+
+def _dumps_json(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def _json_types_only(obj: Any) -> bool:
+    """
+    Whether obj holds only dict, list, tuple, str, int, float, bool and None.
+
+    Walks the containers level by level with gc.get_referents(), which stays
+    in C: a dict with str keys reports its values, scalars report nothing.
+    Dict keys of other types are reported too, orjson rejects them anyway.
+    """
+    level = [obj]
+    while level:
+        if not _JSON_TYPES.issuperset(map(type, level)):
+            return False
+        level = gc.get_referents(*level)
+    return True
+
+
+def _dumps_orjson(obj: Any) -> bytes:
+    """orjson.dumps(), or json.dumps() where their output could differ."""
+    if not _json_types_only(obj):
+        return _dumps_json(obj)
+    try:
+        data: bytes = orjson.dumps(obj, option=_ORJSON_OPTIONS)
+    except TypeError:  # non-str keys, integers over 64 bits, other types json may handle
+        return _dumps_json(obj)
+    if (not data.isascii() or b"\x7f" in data or b"null" in data or b"0.0000" in data
+            or _ORJSON_EXPONENT.search(data)):
+        return _dumps_json(obj)
+    return data
+
+
+def _jcs_number(value: Union[int, float]) -> str:
+    """Number serialized like ECMAScript Number.prototype.toString()."""
+    if isinstance(value, int):
+        if abs(value) > _MAX_SAFE_INTEGER:
+            raise ValueError(f"Integer {value} is out of the IEEE 754 safe range")
+        return str(value)
+    if not math.isfinite(value):
+        raise ValueError(f"{value} cannot be serialized in canonical JSON")
+    if value == 0:
+        return "0"
+    # repr() is the shortest round-trip representation, only its layout differs
+    sign, digits, exponent = Decimal(repr(value)).as_tuple()
+    digits_str = "".join(map(str, digits)).rstrip("0")
+    exponent += len(digits) - len(digits_str)
+    k = len(digits_str)
+    n = exponent + k  # position of the decimal point
+    if k <= n <= 21:
+        text = digits_str + "0" * (n - k)
+    elif 0 < n <= 21:
+        text = digits_str[:n] + "." + digits_str[n:]
+    elif -6 < n <= 0:
+        text = "0." + "0" * -n + digits_str
+    else:
+        mantissa = digits_str if k == 1 else digits_str[0] + "." + digits_str[1:]
+        text = f"{mantissa}e{'+' if n - 1 >= 0 else '-'}{abs(n - 1)}"
+    return "-" + text if sign else text
+
+
+def _jcs_string(value: str) -> str:
+    return '"' + _JCS_ESCAPE.sub(lambda m: _JCS_ESCAPES.get(m.group()) or f"\\u{ord(m.group()):04x}",
+                                 value) + '"'
+
+
+def _jcs(value: Any) -> str:
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, str):
+        return _jcs_string(value)
+    if isinstance(value, (int, float)):
+        return _jcs_number(value)
+    if isinstance(value, dict):
+        for key in value:
+            if not isinstance(key, str):
+                raise TypeError(f"Keys must be str in canonical JSON, not {type(key).__name__}")
+        # members are sorted by the UTF-16 code units of their names
+        items = sorted(value.items(), key=lambda item: item[0].encode("utf-16-be"))
+        return "{" + ",".join(_jcs_string(k) + ":" + _jcs(v) for k, v in items) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(_jcs(item) for item in value) + "]"
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def canonicalize(obj: Any) -> bytes:
+    """
+    Serialize obj with the JSON Canonicalization Scheme (RFC 8785).
+
+    Object members are sorted, there is no whitespace, strings are UTF-8
+    with minimal escaping and numbers are written like ECMAScript does, so
+    every service produces the same bytes for the same data.
+
+    Args:
+        obj: JSON-compatible data
+
+    Returns:
+        The canonical UTF-8 bytes
+
+    Raises:
+        TypeError: If obj holds a value JSON cannot represent
+        ValueError: If obj holds NaN, an infinity or an integer over 2**53
+    """
+    return _jcs(obj).encode("utf-8")
+
+
+def serialize_payload(payload: Payload, canonical: bool = False) -> Union[bytes, bytearray, memoryview]:
+    """
+    Bytes that are signed for a payload.
+
+    A bytes-like payload is returned as is, without a copy, so a payload
+    serialized once can be both signed and verified. A dict is serialized
+    like json.dumps(payload, separators=(",", ":")) does, with orjson when it
+    is installed, or with RFC 8785 canonicalization.
+
+    Args:
+        payload: The payload (not encoded), or its serialized bytes
+        canonical: Serialize a dict with RFC 8785 instead
+
+    Returns:
+        The payload bytes
+    """
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return payload
+    if canonical:
+        return canonicalize(payload)
+    if orjson is not None:
+        return _dumps_orjson(payload)
+    return _dumps_json(payload)
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import json
+import logging
+from typing import Optional, Sequence, Union
+
+from jwt.utils import base64url_decode, base64url_encode
+
+from .algorithms import DEFAULT_ALGORITHMS, SigningKey, VerifyingKey, algorithm_for_key, get_algorithm
+from .cert_cache import CertificateCache, default_certificate_cache
+from .payload import Payload, serialize_payload
+from .utils import _verify_detached, encode_x5c
+
+logger = logging.getLogger(__name__)
+
+
+def detached_protected_header(
+        certificate_chain: Union[bytes, Sequence[bytes]],
+        algorithm: str = "PS256"
+) -> bytes:
+    """
+    Base64url protected header of a detached token with x5c.
+
+    The JSON is built exactly like jwt.api_jws.encode() does for
+    sign_message_detached(), so the tokens are byte-identical.
+
+    Args:
+        certificate_chain: The decoded bytes of the X.509 certificate (DER encoded),
+            or a list of them with the leaf first
+        algorithm: The "alg" header value
+
+    Returns:
+        The encoded header segment
+    """
+    header = {"typ": "JWT", "alg": algorithm, "b64": False, "crit": ["b64"],
+              "x5c": encode_x5c(certificate_chain)}
+    return base64url_encode(json.dumps(header, separators=(",", ":"), sort_keys=True).encode())
+
+
+class DetachedSigner:
+    """
+    Sign payloads with one key and x5c certificate.
+
+    The algorithm follows the key type like sign_message_detached() picks
+    it. The protected header is serialized and base64url-encoded once, each
+    sign() only serializes the payload and runs the signature.
+    """
+
+    def __init__(
+            self,
+            private_key: SigningKey,
+            certificate_chain: Union[bytes, Sequence[bytes]],
+            canonical: bool = False
+    ):
+        """
+        Args:
+            private_key: The private key used to sign messages
+            certificate_chain: The decoded bytes of the X.509 certificate (DER encoded),
+                or a list of them with the leaf first
+            canonical: Serialize dict payloads with RFC 8785 canonicalization
+
+        Raises:
+            ValueError: If the private key type is not supported
+        """
+        self.algorithm: str = algorithm_for_key(private_key)
+        self._algorithm = get_algorithm(self.algorithm)
+        self.private_key = private_key
+        self.certificate_chain = certificate_chain
+        self.canonical = canonical
+        self.header_b64: bytes = detached_protected_header(certificate_chain, self.algorithm)
+        self._signing_prefix: bytes = self.header_b64 + b"."
+        self._token_prefix: bytes = self.header_b64 + b".."
+
+    def sign(self, payload_no_encoded: Payload) -> str:
+        """
+        Sign message with b64 = false and x5c header.
+
+        Args:
+            payload_no_encoded: The payload (not encoded), or its serialized bytes
+
+        Returns:
+            A detached JWS token, the same as sign_message_detached() returns
+
+        Raises:
+            ValueError: If signing fails
+        """
+        try:
+            payload = serialize_payload(payload_no_encoded, self.canonical)
+            signature: bytes = self._algorithm.sign(self._signing_prefix + payload, self.private_key)
+        except Exception as e:
+            logger.error(f"Failed to sign message: {e}")
+            raise ValueError(f"Failed to sign message: {e}") from e
+        return (self._token_prefix + base64url_encode(signature)).decode()
+
+
+class DetachedVerifier:
+    """
+    Verify detached tokens against one certificate or public key.
+
+    Bound to a certificate, a token whose protected header is the one that
+    certificate produces is checked without parsing the header again: the
+    signing input is rebuilt from the precomputed header and the signature
+    is verified directly. Any other token goes through the full
+    verify_message_detached() checks with the bound key and the same
+    algorithm allow-list.
+    """
+
+    def __init__(
+            self,
+            certificate_chain: Optional[Union[bytes, Sequence[bytes]]] = None,
+            public_key: Optional[VerifyingKey] = None,
+            cert_cache: Optional[CertificateCache] = None,
+            canonical: bool = False,
+            algorithms: Sequence[str] = DEFAULT_ALGORITHMS
+    ):
+        """
+        Args:
+            certificate_chain: The decoded bytes of the X.509 certificate (DER encoded),
+                or a list of them with the leaf first
+            public_key: Or the public key, when tokens are not matched to a certificate
+            cert_cache: Cache used to parse certificate_chain, default_certificate_cache if None
+            canonical: Dict payloads were signed with RFC 8785 canonicalization
+            algorithms: The "alg" values accepted, PS256 alone by default
+
+        Raises:
+            ValueError: If neither certificate_chain nor public_key is given, the
+                certificate cannot be loaded or the algorithm of the key is not allowed
+        """
+        if certificate_chain is None and public_key is None:
+            raise ValueError("Pass certificate_chain or public_key")
+        self.header_b64: Optional[bytes] = None
+        self.algorithms = tuple(algorithms)
+        if certificate_chain is not None:
+            cache = cert_cache if cert_cache is not None else default_certificate_cache
+            if isinstance(certificate_chain, (bytes, bytearray, memoryview)):
+                leaf = certificate_chain
+            else:
+                leaf = certificate_chain[0]
+            _, certificate_key = cache.get(leaf)
+            if public_key is None:
+                public_key = certificate_key
+        self.algorithm: str = algorithm_for_key(public_key)
+        if self.algorithm not in self.algorithms:
+            raise ValueError(f"Algorithm {self.algorithm} of the key is not in {self.algorithms}")
+        self._algorithm = get_algorithm(self.algorithm)
+        if certificate_chain is not None:
+            self.header_b64 = detached_protected_header(certificate_chain, self.algorithm)
+        self.public_key = public_key
+        self.canonical = canonical
+
+    def verify(self, token_detached: str, payload_no_encoded: Payload) -> bool:
+        """
+        Verify a detached JWS token.
+
+        Args:
+            token_detached: The JWS Token string
+            payload_no_encoded: The payload (not encoded), or the exact bytes that were signed
+
+        Returns:
+            True if verification succeeds, False otherwise
+        """
+        try:
+            header_b64, detached, signature_b64 = token_detached.encode().split(b".")
+            if self.header_b64 is None or header_b64 != self.header_b64 or detached:
+                _verify_detached(token_detached, payload_no_encoded, self.public_key, None,
+                                 canonical=self.canonical, algorithms=self.algorithms)
+                return True
+            payload = serialize_payload(payload_no_encoded, self.canonical)
+            if self._algorithm.verify(header_b64 + b"." + payload, self.public_key,
+                             base64url_decode(signature_b64)):
+                return True
+            logger.debug("Verification failed: Signature verification failed")
+        except Exception as e:
+            logger.debug(f"Verification failed: {e}")
+        return False
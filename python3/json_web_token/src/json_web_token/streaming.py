@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import json
+import logging
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Sequence, Union
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, padding
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey, RSAPublicKey
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+from jwt.exceptions import InvalidSignatureError, InvalidTokenError
+from jwt.utils import base64url_decode, base64url_encode, der_to_raw_signature, raw_to_der_signature
+
+from .algorithms import DEFAULT_ALGORITHMS, SigningKey, VerifyingKey, algorithm_for_key
+from .cert_cache import CertificateCache
+from .signer import detached_protected_header
+from .trust_store import TrustStore
+from .utils import _x5c_public_key
+
+logger = logging.getLogger(__name__)
+
+# a file object read in chunks, or the chunks themselves
+PayloadStream = Union[BinaryIO, Iterable[bytes]]
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+# the padding PyJWT uses for PS256
+_PSS = padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=hashes.SHA256.digest_size)
+
+# algorithms whose signature can be computed over a digest; Ed25519 hashes
+# the message itself and has no prehashed variant, so EdDSA is not streamable
+_HASHES: Dict[str, hashes.HashAlgorithm] = {
+    "PS256": hashes.SHA256(),
+    "ES256": hashes.SHA256(),
+    "ES384": hashes.SHA384(),
+    "ES512": hashes.SHA512(),
+}
+
+
+def _chunks(source: PayloadStream, chunk_size: int) -> Iterator[bytes]:
+    if hasattr(source, 'read'):
+        return iter(lambda: source.read(chunk_size), b"")
+    return iter(source)
+
+
+def _digest(header_b64: bytes, source: PayloadStream, chunk_size: int,
+            algorithm: hashes.HashAlgorithm) -> bytes:
+    """Hash of the signing input header_b64 + "." + payload, read chunk by chunk."""
+    hasher = hashes.Hash(algorithm)
+    hasher.update(header_b64 + b".")
+    for chunk in _chunks(source, chunk_size):
+        hasher.update(chunk)
+    return hasher.finalize()
+
+
+def sign_stream(
+        private_key: SigningKey,
+        certificate_chain: Union[bytes, Sequence[bytes]],
+        source: PayloadStream,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> str:
+    """
+    Sign a payload read from a file or an iterator of chunks.
+
+    With b64 = false the payload is signed as raw bytes, so it is hashed
+    chunk by chunk and the digest is signed: memory use does not depend on
+    the payload size. The algorithm follows the key like in
+    sign_message_detached(): PS256 for RSA keys, ES256/ES384/ES512 for EC
+    keys. Ed25519 keys cannot sign a digest, so EdDSA is not supported here.
+    The token has the same header as sign_message_detached() for the same
+    bytes and verifies with verify_message_detached(); PSS and ECDSA
+    signatures are randomized, so no two tokens have the same signature.
+
+    Args:
+        private_key: The private key used to sign a message
+        certificate_chain: The decoded bytes of the X.509 certificate (DER encoded),
+            or a list of them with the leaf first
+        source: Binary file object, or an iterable of bytes chunks
+        chunk_size: Bytes read from a file object at a time
+
+    Returns:
+        A detached JWS token
+
+    Raises:
+        ValueError: If the key cannot sign a stream or signing fails
+    """
+    algorithm = algorithm_for_key(private_key)
+    if algorithm not in _HASHES:
+        raise ValueError(f"{algorithm} cannot sign a digest, use an RSA or EC key or sign_message_detached()")
+    hash_algorithm = _HASHES[algorithm]
+    try:
+        header_b64 = detached_protected_header(certificate_chain, algorithm)
+        digest = _digest(header_b64, source, chunk_size, hash_algorithm)
+        if isinstance(private_key, RSAPrivateKey):
+            signature = private_key.sign(digest, _PSS, Prehashed(hash_algorithm))
+        else:
+            # JWS carries the raw r || s form, not DER
+            signature = der_to_raw_signature(
+                private_key.sign(digest, ec.ECDSA(Prehashed(hash_algorithm))), private_key.curve)
+    except Exception as e:
+        logger.error(f"Failed to sign stream: {e}")
+        raise ValueError(f"Failed to sign stream: {e}") from e
+    return (header_b64 + b".." + base64url_encode(signature)).decode()
+
+
+def verify_stream(
+        token_detached: str,
+        source: PayloadStream,
+        public_key: Optional[VerifyingKey] = None,
+        cert_cache: Optional[CertificateCache] = None,
+        trust_store: Optional[TrustStore] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        algorithms: Sequence[str] = DEFAULT_ALGORITHMS
+) -> bool:
+    """
+    Verify a detached token against a payload read from a file or chunks.
+
+    Accepts any detached token with b64 = false whose algorithm is in the
+    allow-list (PS256 alone by default), whether it was made by
+    sign_stream() or sign_message_detached(). EdDSA tokens cannot be
+    verified from a stream and are rejected.
+
+    Args:
+        token_detached: The JWS Token string
+        source: Binary file object, or an iterable of bytes chunks, holding
+            the exact payload bytes that were signed
+        public_key: Optional public key used to verify message signature
+        cert_cache: Cache for the x5c certificate, default_certificate_cache if None
+        trust_store: Optional TrustStore the x5c chain is validated against
+        chunk_size: Bytes read from a file object at a time
+        algorithms: The "alg" values accepted
+
+    Returns:
+        True if verification succeeds, False otherwise
+    """
+    try:
+        header_b64, detached, signature_b64 = token_detached.encode().split(b".")
+        if detached:
+            raise InvalidTokenError("The payload segment of a detached token must be empty")
+        headers = json.loads(base64url_decode(header_b64))
+        algorithm = headers.get("alg")
+        if algorithm not in algorithms:
+            raise InvalidTokenError(f"Algorithm {algorithm} is not allowed")
+        if algorithm not in _HASHES:
+            raise InvalidTokenError(f"Algorithm {algorithm} cannot be verified from a stream")
+        crit = headers.get("crit")
+        if headers.get("b64") is not False or not isinstance(crit, list) or "b64" not in crit:
+            raise InvalidTokenError("Streamed payloads need b64 = false listed in crit")
+        if set(crit) - {"b64"}:
+            raise InvalidTokenError(f"Unsupported critical headers: {crit}")
+        if public_key is None:
+            public_key = _x5c_public_key(headers, cert_cache, trust_store)
+        if algorithm_for_key(public_key) != algorithm:
+            raise InvalidTokenError(f"The key cannot verify {algorithm} signatures")
+        hash_algorithm = _HASHES[algorithm]
+        signature = base64url_decode(signature_b64)
+        digest = _digest(header_b64, source, chunk_size, hash_algorithm)
+        try:
+            if isinstance(public_key, RSAPublicKey):
+                public_key.verify(signature, digest, _PSS, Prehashed(hash_algorithm))
+            else:
+                public_key.verify(raw_to_der_signature(signature, public_key.curve), digest,
+                                  ec.ECDSA(Prehashed(hash_algorithm)))
+        except InvalidSignature:
+            raise InvalidSignatureError("Signature verification failed") from None
+    except Exception as e:
+        logger.debug(f"Verification failed: {e}")
+        return False
+    return True
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import datetime
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.types import PublicKeyTypes
+from cryptography.hazmat.primitives.serialization import Encoding
+from cryptography.x509 import Certificate
+
+from .cert_cache import CacheStats, CertificateCache, certificate_fingerprint, default_certificate_cache
+
+logger = logging.getLogger(__name__)
+
+CertificateInput = Union[bytes, Certificate]
+
+
+def chain_fingerprint(chain: Sequence[bytes]) -> str:
+    """
+    SHA-256 fingerprint of an x5c chain, over the fingerprint of every certificate.
+
+    Args:
+        chain: DER-encoded certificates, leaf first
+
+    Returns:
+        Lowercase hex digest
+    """
+    digest = hashlib.sha256()
+    for der_data in chain:
+        digest.update(hashlib.sha256(der_data).digest())
+    return digest.hexdigest()
+
+
+def _validity(certificate: Certificate) -> Tuple[float, float]:
+    """not_valid_before and not_valid_after as POSIX timestamps."""
+    try:
+        before, after = certificate.not_valid_before_utc, certificate.not_valid_after_utc
+    except AttributeError:  # cryptography < 42
+        before = certificate.not_valid_before.replace(tzinfo=datetime.timezone.utc)
+        after = certificate.not_valid_after.replace(tzinfo=datetime.timezone.utc)
+    return before.timestamp(), after.timestamp()
+
+
+def _is_ca(certificate: Certificate) -> bool:
+    try:
+        return certificate.extensions.get_extension_for_class(x509.BasicConstraints).value.ca
+    except x509.ExtensionNotFound:
+        return False
+
+
+class TrustStore:
+    """
+    Root and intermediate certificates that x5c chains are validated against.
+
+    The store certificates are parsed once. A chain is valid when every
+    certificate is within its validity period and signed by the next one,
+    up to a root of the store; certificates between the leaf and the root
+    come from the chain itself or from the store intermediates and must be
+    CA certificates. Successful validations are memoized per chain
+    fingerprint until the earliest not_valid_after of the path, so a known
+    chain costs a dictionary lookup. Failures are not memoized.
+
+    cache_token identifies the store and its current contents for caches
+    that remember results obtained with it, like VerificationCache.
+    """
+
+    def __init__(
+            self,
+            roots: Iterable[CertificateInput] = (),
+            intermediates: Iterable[CertificateInput] = (),
+            max_depth: int = 8,
+            maxsize: int = 1024,
+            clock: Callable[[], float] = time.time
+    ):
+        """
+        Args:
+            roots: Trust anchors, DER bytes or Certificate objects
+            intermediates: Intermediate CA certificates, DER bytes or Certificate objects
+            max_depth: Most issuers between a leaf and its root
+            maxsize: Most validated chains remembered, least recently used are evicted
+            clock: Wall clock in POSIX seconds, replaceable in tests
+        """
+        self.max_depth = max_depth
+        self.maxsize = maxsize
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._roots: Dict[x509.Name, List[Certificate]] = {}
+        self._root_fingerprints: Dict[str, Certificate] = {}
+        self._intermediates: Dict[x509.Name, List[Certificate]] = {}
+        self._validated: "OrderedDict[str, Tuple[PublicKeyTypes, float]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        # unlike id(), never reused by another store
+        self._instance_id = uuid.uuid4().hex
+        self._generation = 0
+        for root in roots:
+            self.add_root(root)
+        for intermediate in intermediates:
+            self.add_intermediate(intermediate)
+
+    @classmethod
+    def from_pem(cls, roots_pem: bytes, intermediates_pem: Optional[bytes] = None, **kwargs) -> "TrustStore":
+        """
+        Build a store from PEM bundles.
+
+        Args:
+            roots_pem: One or more PEM-encoded root certificates
+            intermediates_pem: Optional PEM-encoded intermediate certificates
+            **kwargs: Passed to TrustStore()
+
+        Raises:
+            ValueError: If a bundle cannot be loaded
+        """
+        try:
+            roots = x509.load_pem_x509_certificates(roots_pem)
+            intermediates = x509.load_pem_x509_certificates(intermediates_pem) if intermediates_pem else []
+        except Exception as e:
+            logger.error(f"Failed to load PEM certificates: {e}")
+            raise ValueError(f"Invalid PEM certificates: {e}") from e
+        return cls(roots, intermediates, **kwargs)
+
+    @staticmethod
+    def _load(certificate: CertificateInput) -> Certificate:
+        if isinstance(certificate, Certificate):
+            return certificate
+        return default_certificate_cache.get(certificate)[0]
+
+    def add_root(self, certificate: CertificateInput) -> None:
+        """Trust a root certificate."""
+        certificate = self._load(certificate)
+        fingerprint = certificate_fingerprint(certificate.public_bytes(Encoding.DER))
+        with self._lock:
+            self._roots.setdefault(certificate.subject, []).append(certificate)
+            self._root_fingerprints[fingerprint] = certificate
+            self._generation += 1
+
+    def add_intermediate(self, certificate: CertificateInput) -> None:
+        """Make an intermediate CA certificate available to every chain."""
+        certificate = self._load(certificate)
+        with self._lock:
+            self._intermediates.setdefault(certificate.subject, []).append(certificate)
+            self._generation += 1
+
+    def clear(self) -> None:
+        """Forget every validated chain, e.g. after a revocation; the counters are kept."""
+        with self._lock:
+            self._validated.clear()
+            self._generation += 1
+
+    @property
+    def cache_token(self) -> str:
+        """Unique to this store, changes whenever its certificates change or clear() is called."""
+        with self._lock:
+            return f"{self._instance_id}:{self._generation}"
+
+    def validate(self, chain: Sequence[bytes], cert_cache: Optional[CertificateCache] = None) -> PublicKeyTypes:
+        """
+        Validate an x5c chain and return the leaf public key.
+
+        Args:
+            chain: DER-encoded certificates, leaf first
+            cert_cache: Cache used to parse the chain, default_certificate_cache if None
+
+        Returns:
+            The public key of the leaf certificate
+
+        Raises:
+            ValueError: If the chain does not lead to a trusted root
+        """
+        return self._validate(chain, cert_cache)[0]
+
+    def validated_until(self, chain: Sequence[bytes], cert_cache: Optional[CertificateCache] = None) -> float:
+        """
+        Validate an x5c chain and return when the validation expires.
+
+        Args:
+            chain: DER-encoded certificates, leaf first
+            cert_cache: Cache used to parse the chain, default_certificate_cache if None
+
+        Returns:
+            The earliest not_valid_after on the path to the root, the root
+            included, as a POSIX timestamp
+
+        Raises:
+            ValueError: If the chain does not lead to a trusted root
+        """
+        return self._validate(chain, cert_cache)[1]
+
+    def _validate(
+            self,
+            chain: Sequence[bytes],
+            cert_cache: Optional[CertificateCache]
+    ) -> Tuple[PublicKeyTypes, float]:
+        if not chain:
+            raise ValueError("Empty certificate chain")
+        key = chain_fingerprint(chain)
+        now = self._clock()
+        with self._lock:
+            entry = self._validated.get(key)
+            if entry is not None:
+                if now < entry[1]:
+                    self._validated.move_to_end(key)
+                    self._hits += 1
+                    return entry
+                del self._validated[key]
+                self._expirations += 1
+            self._misses += 1
+
+        cache = cert_cache if cert_cache is not None else default_certificate_cache
+        certificates = [cache.get(der_data)[0] for der_data in chain]
+        expires_at = self._build_path(certificates, now)
+        public_key = certificates[0].public_key()
+        with self._lock:
+            self._validated[key] = (public_key, expires_at)
+            while len(self._validated) > self.maxsize:
+                self._validated.popitem(last=False)
+                self._evictions += 1
+        return public_key, expires_at
+
+    def _check_time(self, certificate: Certificate, now: float) -> float:
+        not_before, not_after = _validity(certificate)
+        if not not_before <= now < not_after:
+            raise ValueError(f"Certificate {certificate.subject.rfc4514_string()} is not valid at this time")
+        return not_after
+
+    @staticmethod
+    def _find_issuer(certificate: Certificate, candidates: Iterable[Certificate]) -> Optional[Certificate]:
+        for candidate in candidates:
+            try:
+                certificate.verify_directly_issued_by(candidate)
+            except (ValueError, TypeError, InvalidSignature):
+                continue
+            return candidate
+        return None
+
+    def _build_path(self, certificates: List[Certificate], now: float) -> float:
+        """Walk from the leaf to a root, return the earliest not_valid_after on the path."""
+        current = certificates[0]
+        expires_at = self._check_time(current, now)
+        fingerprint = certificate_fingerprint(current.public_bytes(Encoding.DER))
+        with self._lock:
+            if fingerprint in self._root_fingerprints:
+                # the leaf itself is a trust anchor
+                return expires_at
+            roots = dict(self._roots)
+            intermediates = dict(self._intermediates)
+        chain_issuers: Dict[x509.Name, List[Certificate]] = {}
+        for certificate in certificates[1:]:
+            chain_issuers.setdefault(certificate.subject, []).append(certificate)
+
+        for _ in range(self.max_depth + 1):
+            root = self._find_issuer(current, roots.get(current.issuer, []))
+            if root is not None:
+                return min(expires_at, self._check_time(root, now))
+            issuer = self._find_issuer(current, chain_issuers.get(current.issuer, []) +
+                                       intermediates.get(current.issuer, []))
+            if issuer is None:
+                raise ValueError(f"No trusted issuer for {current.subject.rfc4514_string()}")
+            if not _is_ca(issuer):
+                raise ValueError(f"Issuer {issuer.subject.rfc4514_string()} is not a CA certificate")
+            expires_at = min(expires_at, self._check_time(issuer, now))
+            current = issuer
+        raise ValueError(f"Certificate chain longer than {self.max_depth} issuers")
+
+    @property
+    def stats(self) -> CacheStats:
+        """Counters of the validated chains memo."""
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions,
+                              self._expirations, len(self._validated))
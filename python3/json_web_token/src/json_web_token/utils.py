@@ -1,23 +1,24 @@
 from __future__ import annotations
 
 import base64
-import json
 import logging
-from typing import Dict, Any, Optional, Union, List
+import time
+from typing import Dict, Any, Optional, Union, List, Sequence, TYPE_CHECKING
 
-import requests
 from jwt import api_jws as jws
 from jwt.exceptions import InvalidTokenError
 from cryptography import x509
 from cryptography.hazmat.primitives.serialization import load_pem_private_key
-from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey, RSAPublicKey
 from cryptography.x509 import Certificate
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from .algorithms import DEFAULT_ALGORITHMS, SigningKey, VerifyingKey, algorithm_for_key
+from .cert_cache import CertificateCache, default_certificate_cache
+from .payload import Payload, serialize_payload
+from .verification_cache import VerificationCache, verification_key, x5c_not_after
+
+if TYPE_CHECKING:
+    from .trust_store import TrustStore
+
 logger = logging.getLogger(__name__)
 
 
@@ -63,24 +64,24 @@ def get_x509_cert_from_der(der_data: bytes) -> Certificate:
     return cert
 
 
-def get_private_key_from_pem(pem_data: bytes, password: Optional[bytes] = None) -> RSAPrivateKey:
+def get_private_key_from_pem(pem_data: bytes, password: Optional[bytes] = None) -> SigningKey:
     """
-    Load an RSA private key from PEM-encoded data.
+    Load an RSA, EC (P-256, P-384, P-521) or Ed25519 private key from PEM-encoded data.
     
     Args:
         pem_data: PEM-encoded private key data
         password: Optional password if the key is encrypted
         
     Returns:
-        RSAPrivateKey object
+        Private key object
         
     Raises:
-        ValueError: If private key cannot be loaded
+        ValueError: If private key cannot be loaded or has no signing algorithm
     """
     try:
         private_key = load_pem_private_key(pem_data, password=password)
-        if not isinstance(private_key, RSAPrivateKey):
-            raise ValueError("The provided key is not an RSA private key")
+        # raises for key types and curves sign_message_detached() cannot use
+        algorithm_for_key(private_key)
         return private_key
     except Exception as e:
         logger.error(f"Failed to load private key: {e}")
@@ -119,18 +120,39 @@ def _validate_headers(headers: Dict[str, Any]) -> None:
         raise ValueError("'x5c' header parameter must be a non-empty list")
 
 
+def encode_x5c(certificate_chain: Union[bytes, Sequence[bytes]]) -> List[str]:
+    """
+    Encode a certificate or a chain for the x5c header.
+
+    Args:
+        certificate_chain: DER-encoded certificate, or a list of them with the leaf first
+
+    Returns:
+        The standard base64 value of every certificate
+    """
+    if isinstance(certificate_chain, (bytes, bytearray, memoryview)):
+        certificate_chain = [certificate_chain]
+    return [base64.standard_b64encode(der_data).decode('utf-8') for der_data in certificate_chain]
+
+
 def sign_message_detached(
-        private_key: RSAPrivateKey,
-        certificate_chain: bytes,
-        payload_no_encoded: Dict[str, Any]
+        private_key: SigningKey,
+        certificate_chain: Union[bytes, Sequence[bytes]],
+        payload_no_encoded: Payload,
+        canonical: bool = False
 ) -> str:
     """
-    Sign message using PS256 alg, b64 = false and x5c header.
+    Sign message with b64 = false and x5c header.
+
+    The algorithm follows the key type: PS256 for RSA keys, ES256/ES384/ES512
+    for EC keys on P-256/P-384/P-521 and EdDSA for Ed25519 keys.
 
     Args:
         private_key: The private key used to sign a message
-        certificate_chain: The decoded bytes of the X.509 certificate (DER encoded)
-        payload_no_encoded: The payload (not encoded)
+        certificate_chain: The decoded bytes of the X.509 certificate (DER encoded),
+            or a list of them with the leaf first to send the whole chain
+        payload_no_encoded: The payload (not encoded), or its serialized bytes
+        canonical: Serialize a dict payload with RFC 8785 canonicalization
 
     Returns:
         A detached JWS token
@@ -139,60 +161,133 @@ def sign_message_detached(
         ValueError: If signing fails
     """
     try:
-        # encode DER certificate to base64
-        x5c: str = base64.standard_b64encode(certificate_chain).decode('utf-8')
+        # encode DER certificates to base64
+        x5c: List[str] = encode_x5c(certificate_chain)
 
         # check that detached content is automatically detected when b64 is false
         # insert x5c header
-        headers = {"b64": False, "crit": ["b64"], "x5c": [x5c]}
+        headers = {"b64": False, "crit": ["b64"], "x5c": x5c}
 
-        payload: bytes = json.dumps(payload_no_encoded, separators=(",", ":")).encode()
+        payload = serialize_payload(payload_no_encoded, canonical)
 
-        return jws.encode(payload, private_key, "PS256", headers)
+        return jws.encode(payload, private_key, algorithm_for_key(private_key), headers)
     except Exception as e:
         logger.error(f"Failed to sign message: {e}")
         raise ValueError(f"Failed to sign message: {e}") from e
 
 
+def _x5c_public_key(
+        headers: Dict[str, Any],
+        cert_cache: Optional[CertificateCache],
+        trust_store: Optional[TrustStore] = None
+):
+    """
+    Public key of the x5c certificate of validated headers.
+
+    Raises:
+        ValueError: If the headers are invalid or the x5c chain is not trusted
+    """
+    # validate headers
+    _validate_headers(headers)
+    # get x5c value
+    x5c_header: List[str] = headers.get('x5c')
+
+    if trust_store is not None:
+        # validate the whole chain, memoized per chain fingerprint
+        chain: List[bytes] = [base64.standard_b64decode(value) for value in x5c_header]
+        return trust_store.validate(chain, cert_cache)
+
+    # decode x5c value
+    certificate_chain_bytes: bytes = base64.standard_b64decode(x5c_header[0])
+
+    # get digital certificate of x5c header attrib and its public key
+    cache = cert_cache if cert_cache is not None else default_certificate_cache
+    _, public_key = cache.get(certificate_chain_bytes)
+    return public_key
+
+
+def _verify_detached(
+        token_detached: str,
+        payload_no_encoded: Payload,
+        public_key: Optional[VerifyingKey],
+        cert_cache: Optional[CertificateCache],
+        trust_store: Optional[TrustStore] = None,
+        canonical: bool = False,
+        algorithms: Sequence[str] = DEFAULT_ALGORITHMS,
+        verification_cache: Optional[VerificationCache] = None
+) -> None:
+    """
+    Verify a detached JWS token, raising on any failure.
+
+    Raises:
+        ValueError: If the headers are invalid or the x5c chain is not trusted
+        InvalidTokenError: If the token is malformed or the signature does not match
+    """
+    payload = serialize_payload(payload_no_encoded, canonical)
+
+    if verification_cache is not None:
+        key = verification_key(token_detached, payload, algorithms, public_key, trust_store)
+        if verification_cache.get(key):
+            return
+        start = time.thread_time()
+
+    headers: Optional[Dict[str, Any]] = None
+    verifying_key = public_key
+    if verifying_key is None:
+        # get headers
+        headers = jws.get_unverified_header(token_detached)
+        verifying_key = _x5c_public_key(headers, cert_cache, trust_store)
+
+    jws.decode(token_detached, verifying_key, algorithms=list(algorithms),
+               detached_payload=payload)
+
+    if verification_cache is not None:
+        # only reached on success, failures are never cached
+        cost = time.thread_time() - start
+        not_after = x5c_not_after(headers, cert_cache, trust_store) if headers is not None else None
+        verification_cache.put(key, cost, not_after)
+
+
 def verify_message_detached(
         token_detached: str, 
-        payload_no_encoded: Dict[str, Any],
-        public_key: Optional[RSAPublicKey] = None
+        payload_no_encoded: Payload,
+        public_key: Optional[VerifyingKey] = None,
+        cert_cache: Optional[CertificateCache] = None,
+        trust_store: Optional[TrustStore] = None,
+        canonical: bool = False,
+        algorithms: Sequence[str] = DEFAULT_ALGORITHMS,
+        verification_cache: Optional[VerificationCache] = None
 ) -> bool:
     """
-    Verify a JWS token detached using PS256, get public key from x5c header.
+    Verify a detached JWS token, get public key from x5c header.
 
     The public key is obtained from the certificate in x5c header if public_key is None.
+    Parsed certificates are cached by SHA-256 fingerprint, so a certificate seen
+    before is not decoded again. With a trust_store, the whole x5c chain must
+    lead to one of its roots. Only algorithms in the allow-list are accepted,
+    PS256 alone by default; pass e.g. ("PS256", "ES256", "EdDSA") to accept
+    tokens signed with EC or Ed25519 keys.
+
+    With a verification_cache, a (token, payload) pair that verified before
+    is accepted without repeating the work, until the entry expires.
 
     Args:
         token_detached: The JWS Token string
-        payload_no_encoded: The payload (not encoded)
+        payload_no_encoded: The payload (not encoded), or the exact bytes that were signed
         public_key: Optional public key used to verify message signature
+        cert_cache: Cache for the x5c certificate, default_certificate_cache if None
+        trust_store: Optional TrustStore the x5c chain is validated against
+        canonical: The payload was signed with RFC 8785 canonicalization
+        algorithms: The "alg" values accepted
+        verification_cache: Optional VerificationCache of successful verifications
 
     Returns:
         True if verification succeeds, False otherwise
     """
     try:
-        if public_key is None:
-            # get headers
-            headers: Dict[str, Any] = jws.get_unverified_header(token_detached)
-            # validate headers
-            _validate_headers(headers)
-            # get x5c value
-            x5c_header: List[str] = headers.get('x5c')
-            # decode x5c value
-            certificate_chain_bytes: bytes = base64.standard_b64decode(x5c_header[0])
-
-            # get digital certificate of x5c header attrib
-            crt_der: Certificate = get_x509_cert_from_der(certificate_chain_bytes)
-            # get public key from certificate DER
-            public_key = crt_der.public_key()
-
-        payload = json.dumps(payload_no_encoded, separators=(",", ":")).encode()
-
-        jws.decode(token_detached, public_key, algorithms=['PS256'],
-                   detached_payload=payload)
+        _verify_detached(token_detached, payload_no_encoded, public_key, cert_cache, trust_store,
+                         canonical, algorithms, verification_cache)
     except Exception as e:
         logger.debug(f"Verification failed: {e}")
         return False
-    return True
\ No newline at end of file
+    return True
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+from .cert_cache import CertificateCache, default_certificate_cache
+from .trust_store import TrustStore, _validity
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class VerificationCacheStats:
+    """Counters of a VerificationCache."""
+
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    size: int
+    saved_seconds: float
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass
+class _Entry:
+    expires_at: float
+    cost: float
+
+
+def verification_key(
+        token_detached: str,
+        payload: bytes,
+        algorithms: Sequence[str],
+        public_key: Any = None,
+        trust_store: Optional[TrustStore] = None
+) -> bytes:
+    """
+    Digest of a token, the exact payload bytes and how they are verified.
+
+    The allow-list and the source of the public key (x5c certificate,
+    explicit key or trust store) are part of the key, so a success is only
+    reused for the same question.
+
+    Args:
+        token_detached: The JWS Token string
+        payload: The serialized payload bytes
+        algorithms: The "alg" values accepted
+        public_key: Optional public key used instead of the x5c certificate
+        trust_store: Optional TrustStore the x5c chain is validated against
+
+    Returns:
+        SHA-256 digest
+    """
+    token = token_detached.encode()
+    digest = hashlib.sha256(len(token).to_bytes(8, "big") + token)
+    digest.update(len(payload).to_bytes(8, "big"))
+    digest.update(payload)
+    digest.update(",".join(sorted(algorithms)).encode())
+    if public_key is not None:
+        digest.update(b"\0key:" + public_key.public_bytes(Encoding.DER, PublicFormat.SubjectPublicKeyInfo))
+    elif trust_store is not None:
+        digest.update(b"\0trust_store:" + trust_store.cache_token.encode())
+    else:
+        digest.update(b"\0x5c")
+    return digest.digest()
+
+
+def x5c_not_after(
+        headers: Dict[str, Any],
+        cert_cache: Optional[CertificateCache] = None,
+        trust_store: Optional[TrustStore] = None
+) -> Optional[float]:
+    """
+    Earliest not_valid_after of the x5c certificates, as a POSIX timestamp.
+
+    With a trust store, the certificates of the validated path it added
+    (intermediates and the root the chain validated against) count too.
+
+    Args:
+        headers: JWS headers of a verified token
+        cert_cache: Cache for the x5c certificates, default_certificate_cache if None
+        trust_store: TrustStore the x5c chain was validated against
+
+    Returns:
+        The timestamp, None if the headers carry no x5c
+
+    Raises:
+        ValueError: If the chain no longer validates against trust_store
+    """
+    x5c = headers.get("x5c")
+    if not isinstance(x5c, list) or not x5c:
+        return None
+    cache = cert_cache if cert_cache is not None else default_certificate_cache
+    chain = [base64.standard_b64decode(value) for value in x5c]
+    not_after = min(_validity(cache.get(der_data)[0])[1] for der_data in chain)
+    if trust_store is not None:
+        # memoized by the store since the chain was just validated
+        not_after = min(not_after, trust_store.validated_until(chain, cert_cache))
+    return not_after
+
+
+class VerificationCache:
+    """
+    Bounded LRU/TTL cache of successful detached-token verifications.
+
+    Only successes are stored, a failed verification is repeated every time.
+    An entry lives for ttl seconds at most, and never past the earliest
+    not_valid_after of the token's x5c certificates and, with a TrustStore,
+    of the root the chain validated against. Successes obtained through a
+    TrustStore are keyed by its cache_token, so they are not reused once the
+    store's certificates change.
+    """
+
+    def __init__(
+            self,
+            maxsize: int = 4096,
+            ttl: float = 300.0,
+            clock: Callable[[], float] = time.time
+    ):
+        """
+        Args:
+            maxsize: Most verifications kept, least recently used are evicted
+            ttl: Seconds a verification is kept at most
+            clock: Wall-clock time source (certificate validity is absolute),
+                replaceable in tests
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        if ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[bytes, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._saved_seconds = 0.0
+
+    def get(self, key: bytes) -> bool:
+        """
+        Whether the verification with this key succeeded and has not expired.
+
+        Args:
+            key: Digest from verification_key()
+
+        Returns:
+            True on a hit
+        """
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at <= now:
+                    del self._entries[key]
+                    self._expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    self._saved_seconds += entry.cost
+                    return True
+            self._misses += 1
+            return False
+
+    def put(self, key: bytes, cost: float, not_after: Optional[float] = None) -> None:
+        """
+        Store a successful verification.
+
+        Args:
+            key: Digest from verification_key()
+            cost: CPU seconds the verification took, added to saved_seconds on every hit
+            not_after: Certificate validity end the entry must not outlive
+        """
+        now = self._clock()
+        expires_at = now + self.ttl
+        if not_after is not None:
+            expires_at = min(expires_at, not_after)
+        if expires_at <= now:
+            return
+        with self._lock:
+            self._entries[key] = _Entry(expires_at, cost)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def purge(self, expired_only: bool = False) -> int:
+        """
+        Drop cached verifications, the counters are kept.
+
+        Args:
+            expired_only: Drop only the entries past their expiry
+
+        Returns:
+            Number of entries dropped
+        """
+        with self._lock:
+            if not expired_only:
+                dropped = len(self._entries)
+                self._entries.clear()
+                return dropped
+            now = self._clock()
+            expired = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+            for key in expired:
+                del self._entries[key]
+            self._expirations += len(expired)
+            return len(expired)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def stats(self) -> VerificationCacheStats:
+        with self._lock:
+            return VerificationCacheStats(self._hits, self._misses, self._evictions,
+                                          self._expirations, len(self._entries), self._saved_seconds)
@@ -0,0 +1,161 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed448, ed25519
+from cryptography.x509.oid import NameOID
+from jwt import api_jws as jws
+
+from json_web_token import (
+    DetachedSigner,
+    DetachedVerifier,
+    KeyRegistry,
+    algorithm_for_key,
+    get_private_key_from_pem,
+    sign_many,
+    sign_message_detached,
+    verify_many,
+    verify_message_detached
+)
+
+from test_cert_cache import make_self_signed_der
+from test_key_registry import PASSWORD, encrypted_pem
+
+payload_no_encoded: dict = {"data": {"request": {"info_ex1": "value 1"}}}
+
+ALL_ALGORITHMS = ("PS256", "ES256", "ES384", "ES512", "EdDSA")
+
+
+def make_self_signed_der_for(key, common_name: str = "other") -> bytes:
+    """Self-signed certificate (DER) for an EC or Ed25519 key."""
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder()
+            .subject_name(name).issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=30))
+            # Ed25519 signs without a separate hash
+            .sign(key, None if isinstance(key, ed25519.Ed25519PrivateKey) else hashes.SHA256()))
+    return cert.public_bytes(serialization.Encoding.DER)
+
+
+class TestAlgorithms(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.rsa_key, cls.rsa_cert = make_self_signed_der("rsa")
+        cls.ec_key = ec.generate_private_key(ec.SECP256R1())
+        cls.ec_cert = make_self_signed_der_for(cls.ec_key, "ec")
+        cls.ed_key = ed25519.Ed25519PrivateKey.generate()
+        cls.ed_cert = make_self_signed_der_for(cls.ed_key, "ed25519")
+        cls.keys = [(cls.rsa_key, cls.rsa_cert, "PS256"), (cls.ec_key, cls.ec_cert, "ES256"),
+                    (cls.ed_key, cls.ed_cert, "EdDSA")]
+
+    def test_algorithm_for_key(self):
+        assert algorithm_for_key(self.rsa_key) == "PS256"
+        assert algorithm_for_key(self.ec_key.public_key()) == "ES256"
+        assert algorithm_for_key(ec.generate_private_key(ec.SECP384R1())) == "ES384"
+        assert algorithm_for_key(self.ed_key) == "EdDSA"
+        with self.assertRaises(ValueError):
+            algorithm_for_key(ec.generate_private_key(ec.SECP256K1()))
+        with self.assertRaises(ValueError):
+            algorithm_for_key(ed448.Ed448PrivateKey.generate())
+
+    def test_sign_and_verify_with_x5c(self):
+        for private_key, cert_der, algorithm in self.keys:
+            token = sign_message_detached(private_key, cert_der, payload_no_encoded)
+            headers = jws.get_unverified_header(token)
+
+            assert headers["alg"] == algorithm
+            assert headers["b64"] is False and headers["crit"] == ["b64"]
+            assert token.split(".")[1] == ""
+            assert verify_message_detached(token, payload_no_encoded, algorithms=ALL_ALGORITHMS) is True
+            assert verify_message_detached(token, {"data": "other"}, algorithms=ALL_ALGORITHMS) is False
+
+    def test_allow_list(self):
+        ec_token = sign_message_detached(self.ec_key, self.ec_cert, payload_no_encoded)
+        ed_token = sign_message_detached(self.ed_key, self.ed_cert, payload_no_encoded)
+
+        # PS256 alone unless told otherwise
+        assert verify_message_detached(ec_token, payload_no_encoded) is False
+        assert verify_message_detached(ed_token, payload_no_encoded) is False
+        assert verify_message_detached(ec_token, payload_no_encoded, algorithms=["EdDSA"]) is False
+        assert verify_message_detached(ed_token, payload_no_encoded, algorithms=["EdDSA"]) is True
+
+    def test_key_must_match_algorithm(self):
+        ec_token = sign_message_detached(self.ec_key, self.ec_cert, payload_no_encoded)
+
+        assert verify_message_detached(ec_token, payload_no_encoded, public_key=self.rsa_key.public_key(),
+                                       algorithms=ALL_ALGORITHMS) is False
+        assert verify_message_detached(ec_token, payload_no_encoded, public_key=self.ec_key.public_key(),
+                                       algorithms=["ES256"]) is True
+
+    def test_detached_signer_and_verifier(self):
+        for private_key, cert_der, algorithm in self.keys:
+            signer = DetachedSigner(private_key, cert_der)
+            verifier = DetachedVerifier(cert_der, algorithms=ALL_ALGORITHMS)
+            token = signer.sign(payload_no_encoded)
+
+            assert signer.algorithm == verifier.algorithm == algorithm
+            assert jws.get_unverified_header(token)["alg"] == algorithm
+            assert verifier.verify(token, payload_no_encoded) is True
+            assert verifier.verify(token, {"data": "other"}) is False
+            assert verify_message_detached(token, payload_no_encoded, algorithms=[algorithm]) is True
+            # a token of sign_message_detached() takes the same fast path
+            assert verifier.verify(sign_message_detached(private_key, cert_der, payload_no_encoded),
+                                   payload_no_encoded) is True
+
+    def test_verifier_rejects_key_outside_allow_list(self):
+        with self.assertRaises(ValueError):
+            DetachedVerifier(self.ec_cert)
+        with self.assertRaises(ValueError):
+            DetachedVerifier(public_key=self.ed_key.public_key(), algorithms=["PS256", "ES256"])
+
+    def test_load_pem(self):
+        for private_key, cert_der, algorithm in self.keys:
+            loaded = get_private_key_from_pem(encrypted_pem(private_key), PASSWORD)
+            token = sign_message_detached(loaded, cert_der, payload_no_encoded)
+
+            assert type(loaded) is type(private_key)
+            assert algorithm_for_key(loaded) == algorithm
+            assert verify_message_detached(token, payload_no_encoded, algorithms=[algorithm]) is True
+
+    def test_load_pem_rejects_keys_without_algorithm(self):
+        for private_key in (ec.generate_private_key(ec.SECP256K1()), ed448.Ed448PrivateKey.generate()):
+            with self.assertRaises(ValueError):
+                get_private_key_from_pem(encrypted_pem(private_key), PASSWORD)
+
+    def test_key_registry(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        keys = KeyRegistry()
+        keys.register("ec", pem_data=encrypted_pem(self.ec_key), password=PASSWORD)
+        ed_path = os.path.join(tmp_dir, 'ed25519.pem')
+        with open(ed_path, 'wb') as key_file:
+            key_file.write(encrypted_pem(self.ed_key))
+        keys.register("ed25519", path=ed_path, password=PASSWORD)
+
+        for key_id, cert_der, algorithm in (("ec", self.ec_cert, "ES256"), ("ed25519", self.ed_cert, "EdDSA")):
+            token = sign_message_detached(keys.get(key_id), cert_der, payload_no_encoded)
+            assert verify_message_detached(token, payload_no_encoded, algorithms=[algorithm]) is True
+        assert keys.stats.loads == 2
+
+    def test_batch(self):
+        payloads = [{"n": i} for i in range(5)]
+        for private_key, cert_der, algorithm in self.keys:
+            results = sign_many(private_key, cert_der, payloads, max_workers=2, chunk_size=2)
+            pairs = [(result.token, payload) for result, payload in zip(results, payloads)]
+
+            assert all(result.ok for result in results)
+            assert all(result.valid for result in verify_many(pairs, algorithms=[algorithm]))
+            if algorithm != "PS256":
+                assert not any(result.valid for result in verify_many(pairs))
+
+
+if __name__ == '__main__':
+    unittest.main()
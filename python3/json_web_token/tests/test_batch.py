@@ -0,0 +1,86 @@
+import os
+import ssl
+import unittest
+
+from jwt import api_jws as jws
+
+from json_web_token import (
+    CertificateCache,
+    get_private_key_from_pem,
+    sign_many,
+    sign_message_detached,
+    verify_many,
+    verify_message_detached
+)
+
+current_dir: str = os.path.dirname(__file__)
+certificates_dir: str = os.path.abspath(os.path.join(current_dir, 'testcerts'))
+
+
+def make_payloads(count: int) -> list:
+    return [{"data": {"request": {"info_ex1": f"value {i}"}}} for i in range(count)]
+
+
+class TestBatch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(certificates_dir, 'example-cert.pem'), 'rb') as cert_file:
+            cls.cert_der = ssl.PEM_cert_to_DER_cert(cert_file.read().decode("utf-8"))
+        with open(os.path.join(certificates_dir, 'example-priv_sk.pem'), 'rb') as key_file:
+            cls.private_key = get_private_key_from_pem(key_file.read())
+
+    def test_header_matches_sign_message_detached(self):
+        payload = make_payloads(1)[0]
+        [result] = sign_many(self.private_key, self.cert_der, [payload])
+        single = sign_message_detached(self.private_key, self.cert_der, payload)
+
+        assert result.ok
+        # PSS signatures are randomized, only the header is comparable
+        assert result.token.split(".")[0] == single.split(".")[0]
+        assert result.token.split(".")[1] == ""
+        assert jws.get_unverified_header(result.token) == jws.get_unverified_header(single)
+
+    def test_sign_many_results_are_in_order_and_verify(self):
+        payloads = make_payloads(40)
+        results = sign_many(self.private_key, self.cert_der, payloads, max_workers=4, chunk_size=3)
+
+        assert [r.index for r in results] == list(range(40))
+        for result, payload in zip(results, payloads):
+            assert verify_message_detached(result.token, payload) is True
+
+    def test_sign_many_reports_per_item_errors(self):
+        payloads = make_payloads(3)
+        payloads[1] = {"not serializable": object()}
+        results = sign_many(self.private_key, self.cert_der, payloads)
+
+        assert [r.ok for r in results] == [True, False, True]
+        assert results[1].token is None and "serializable" in results[1].error
+
+    def test_sign_many_rejects_non_rsa_key(self):
+        with self.assertRaises(ValueError):
+            sign_many(object(), self.cert_der, make_payloads(1))
+
+    def test_verify_many(self):
+        payloads = make_payloads(10)
+        tokens = [r.token for r in sign_many(self.private_key, self.cert_der, payloads)]
+        pairs = list(zip(tokens, payloads))
+        pairs[3] = (tokens[3], {"tampered": True})
+        pairs[7] = ("not a token", payloads[7])
+        cache = CertificateCache()
+
+        results = verify_many(pairs, cert_cache=cache, max_workers=3, chunk_size=2)
+
+        assert [r.index for r in results] == list(range(10))
+        assert [r.valid for r in results] == [i not in (3, 7) for i in range(10)]
+        assert results[3].error and results[7].error
+        assert results[0].error is None
+        assert cache.stats.misses + cache.stats.hits == 9
+        assert len(cache) == 1
+
+    def test_empty_batches(self):
+        assert sign_many(self.private_key, self.cert_der, []) == []
+        assert verify_many([]) == []
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import ssl
+import datetime
+import unittest
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from json_web_token import (
+    CertificateCache,
+    certificate_fingerprint,
+    get_private_key_from_pem,
+    sign_message_detached,
+    verify_message_detached
+)
+
+current_dir: str = os.path.dirname(__file__)
+certificates_dir: str = os.path.abspath(os.path.join(current_dir, 'testcerts'))
+
+payload_no_encoded: dict = {"data": {"request": {"info_ex1": "value 1"}}}
+
+
+def load_example_der() -> bytes:
+    with open(os.path.join(certificates_dir, 'example-cert.pem'), 'rb') as cert_file:
+        return ssl.PEM_cert_to_DER_cert(cert_file.read().decode("utf-8"))
+
+
+def load_example_private_key():
+    with open(os.path.join(certificates_dir, 'example-priv_sk.pem'), 'rb') as key_file:
+        return get_private_key_from_pem(key_file.read())
+
+
+def make_self_signed_der(common_name: str = "other") -> tuple:
+    """Generate a throwaway RSA key and self-signed certificate (DER)."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder()
+            .subject_name(name).issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=30))
+            .sign(key, hashes.SHA256()))
+    return key, cert.public_bytes(serialization.Encoding.DER)
+
+
+def public_der(public_key) -> bytes:
+    return public_key.public_bytes(serialization.Encoding.DER,
+                                   serialization.PublicFormat.SubjectPublicKeyInfo)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestCertificateCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.example_der = load_example_der()
+        cls.other_key, cls.other_der = make_self_signed_der()
+
+    def test_second_lookup_is_a_hit(self):
+        cache = CertificateCache()
+        cert_1, key_1 = cache.get(self.example_der)
+        cert_2, key_2 = cache.get(self.example_der)
+
+        assert cert_1 is cert_2 and key_1 is key_2
+        assert cache.stats.hits == 1
+        assert cache.stats.misses == 1
+        assert cache.stats.hit_rate == 0.5
+
+    def test_different_certificates_get_their_own_key(self):
+        cache = CertificateCache()
+        _, example_key = cache.get(self.example_der)
+        _, other_key = cache.get(self.other_der)
+
+        assert public_der(other_key) == public_der(self.other_key.public_key())
+        assert public_der(other_key) != public_der(example_key)
+
+    def test_entry_under_wrong_fingerprint_is_not_used(self):
+        cache = CertificateCache()
+        cache.get(self.example_der)
+        # simulate a fingerprint collision: the other certificate's slot
+        # holds the example certificate
+        entry = cache._entries.pop(certificate_fingerprint(self.example_der))
+        cache._entries[certificate_fingerprint(self.other_der)] = entry
+
+        _, key = cache.get(self.other_der)
+
+        assert public_der(key) == public_der(self.other_key.public_key())
+        assert cache.stats.hits == 0
+
+    def test_token_signed_by_other_key_fails_with_cached_certificate(self):
+        cache = CertificateCache()
+        private_key = load_example_private_key()
+        good_token = sign_message_detached(private_key, self.example_der, payload_no_encoded)
+        assert verify_message_detached(good_token, payload_no_encoded, cert_cache=cache) is True
+
+        # signed with the example key but carrying the other certificate
+        forged = sign_message_detached(private_key, self.other_der, payload_no_encoded)
+        assert verify_message_detached(forged, payload_no_encoded, cert_cache=cache) is False
+        # and the cached example certificate still verifies its own tokens
+        assert verify_message_detached(good_token, payload_no_encoded, cert_cache=cache) is True
+        assert cache.stats.hits == 1
+
+    def test_ttl_expires_entries(self):
+        clock = FakeClock()
+        cache = CertificateCache(ttl=10, clock=clock)
+        cache.get(self.example_der)
+        clock.now = 9.9
+        cache.get(self.example_der)
+        clock.now = 10.0
+        cache.get(self.example_der)
+
+        assert cache.stats.hits == 1
+        assert cache.stats.expirations == 1
+        assert cache.stats.misses == 2
+
+    def test_least_recently_used_is_evicted(self):
+        cache = CertificateCache(maxsize=1)
+        cache.get(self.example_der)
+        cache.get(self.other_der)
+
+        assert self.example_der not in cache
+        assert self.other_der in cache
+        assert cache.stats.evictions == 1
+
+    def test_invalidate(self):
+        cache = CertificateCache()
+        cache.get(self.example_der)
+        cache.get(self.other_der)
+
+        assert cache.invalidate(self.example_der) is True
+        assert cache.invalidate(fingerprint=certificate_fingerprint(self.other_der).upper()) is True
+        assert cache.invalidate(self.example_der) is False
+        assert len(cache) == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
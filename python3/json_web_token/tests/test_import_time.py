@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+import json_web_token
+
+# generous budgets, in microseconds, so only real regressions fail: the bare
+# package import takes about 1 ms, the first verify_message_detached import
+# (PyJWT and cryptography included) about 100 ms
+PACKAGE_IMPORT_BUDGET_US = 50_000
+FIRST_USE_IMPORT_BUDGET_US = 500_000
+
+HEAVY_MODULES = ['jwt', 'cryptography', 'requests', 'concurrent.futures', 'orjson']
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    src_dir = os.path.dirname(os.path.dirname(json_web_token.__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [src_dir, os.environ.get('PYTHONPATH')])))
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, env=env, check=True)
+
+
+def statement_import_us(statement: str) -> int:
+    """Microseconds spent importing modules for statement, from python -X importtime."""
+    stderr = run_python('-X', 'importtime', '-c', statement).stderr
+    total = 0
+    after_startup = False
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        if after_startup:
+            total += int(self_us)
+        elif name.strip() == 'site':
+            # everything before and including site is interpreter startup
+            after_startup = True
+    return total
+
+
+class TestImportTime(unittest.TestCase):
+    def test_import_has_no_heavy_dependencies_or_side_effects(self):
+        output = run_python('-c', (
+            "import json, logging, sys, json_web_token; "
+            f"print(json.dumps([[m for m in {HEAVY_MODULES!r} if m in sys.modules], "
+            "len(logging.getLogger().handlers)]))"
+        )).stdout
+        loaded, handlers = json.loads(output)
+
+        assert loaded == []
+        assert handlers == 0
+
+    def test_package_import_budget(self):
+        elapsed = min(statement_import_us('import json_web_token') for _ in range(3))
+        assert elapsed < PACKAGE_IMPORT_BUDGET_US, f"import json_web_token took {elapsed} us"
+
+    def test_first_use_import_budget(self):
+        elapsed = min(statement_import_us('from json_web_token import verify_message_detached')
+                      for _ in range(3))
+        assert elapsed < FIRST_USE_IMPORT_BUDGET_US, f"first use import took {elapsed} us"
+
+    def test_lazy_exports(self):
+        for name in json_web_token.__all__:
+            assert getattr(json_web_token, name) is not None
+        assert set(json_web_token.__all__) <= set(dir(json_web_token))
+        with self.assertRaises(AttributeError):
+            json_web_token.not_an_export
+
+
+if __name__ == '__main__':
+    unittest.main()
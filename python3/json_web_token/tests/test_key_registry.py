@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from json_web_token import KeyRegistry
+
+PASSWORD = b"s3cret"
+
+
+def encrypted_pem(private_key) -> bytes:
+    return private_key.private_bytes(serialization.Encoding.PEM,
+                                     serialization.PrivateFormat.PKCS8,
+                                     serialization.BestAvailableEncryption(PASSWORD))
+
+
+class TestKeyRegistry(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.key_1 = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        cls.key_2 = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.key_path = os.path.join(self.tmp_dir, 'signing.pem')
+        with open(self.key_path, 'wb') as key_file:
+            key_file.write(encrypted_pem(self.key_1))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def rotate(self, pem_data: bytes):
+        # write aside and rename, like a deployment would
+        tmp_path = self.key_path + '.tmp'
+        with open(tmp_path, 'wb') as key_file:
+            key_file.write(pem_data)
+        os.replace(tmp_path, self.key_path)
+        # make sure the change is seen even on coarse mtime filesystems
+        st = os.stat(self.key_path)
+        os.utime(self.key_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    def test_key_is_loaded_once(self):
+        registry = KeyRegistry()
+        registry.register("signing", path=self.key_path, password=PASSWORD)
+
+        first = registry.get("signing")
+        assert registry.get("signing") is first
+        assert registry.stats.loads == 1
+        assert registry.stats.last_load_seconds > 0
+        assert registry.refresh() == []
+        assert registry.stats.loads == 1
+
+    def test_rotation_from_disk(self):
+        registry = KeyRegistry()
+        registry.register("signing", path=self.key_path, password=PASSWORD)
+        self.rotate(encrypted_pem(self.key_2))
+
+        assert registry.refresh() == ["signing"]
+        assert registry.get("signing").private_numbers() == self.key_2.private_numbers()
+        assert registry.stats.loads == 2
+
+    def test_bad_rotation_keeps_current_key(self):
+        registry = KeyRegistry()
+        current = registry.register("signing", path=self.key_path, password=PASSWORD)
+        self.rotate(b"half written")
+
+        assert registry.refresh() == []
+        assert registry.get("signing") is current
+        assert registry.stats.load_failures == 1
+
+    def test_unknown_and_invalid_keys(self):
+        registry = KeyRegistry()
+        with self.assertRaises(ValueError):
+            registry.get("missing")
+        with self.assertRaises(ValueError):
+            registry.register("signing", pem_data=encrypted_pem(self.key_1), password=b"wrong")
+        with self.assertRaises(ValueError):
+            registry.register("signing")
+        assert "signing" not in registry
+
+    def test_register_pem_data(self):
+        registry = KeyRegistry()
+        registry.register("a", pem_data=encrypted_pem(self.key_1), password=PASSWORD)
+
+        assert len(registry) == 1
+        assert registry.remove("a") is True
+        assert registry.remove("a") is False
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import dataclasses
+import datetime
+import enum
+import json
+import os
+import ssl
+import unittest
+import uuid
+from collections import OrderedDict
+
+from json_web_token import (
+    DetachedSigner,
+    DetachedVerifier,
+    canonicalize,
+    get_private_key_from_pem,
+    serialize_payload,
+    sign_message_detached,
+    verify_message_detached
+)
+from json_web_token import payload as payload_module
+
+current_dir: str = os.path.dirname(__file__)
+certificates_dir: str = os.path.abspath(os.path.join(current_dir, 'testcerts'))
+
+payload_no_encoded: dict = {"data": {"request": {"info_ex1": "value 1"}}}
+
+# values where orjson and json.dumps() format differently
+TRICKY_PAYLOADS = [
+    {"float": 1.5, "exp": 1e16, "small": 1e-05, "tiny": 1.23e-05, "huge": 1.7976931348623157e308},
+    {"control": "\x1f\x7f\n\t\"\\/", "accents": "ñandú", "separator": "\u2028"},
+    {"null": None, "nan": float("nan"), "inf": float("inf")},
+    {"big": 2 ** 70, 1: "int key", "nested": [1, True, False, {}, -0.0]},
+    {"plain": "0.00001 is text", "e": "1e5", "number": 123456789012345.678},
+]
+
+
+class Color(enum.Enum):
+    RED = "red"
+
+
+class Level(enum.IntEnum):
+    HIGH = 1
+
+
+class Name(str):
+    pass
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+    y: int
+
+
+# values orjson serializes itself but json.dumps() rejects or writes differently
+NON_JSON_VALUES = [
+    datetime.datetime(2024, 1, 1), datetime.date(2024, 1, 1), datetime.time(12, 30),
+    uuid.UUID("12345678-1234-5678-1234-567812345678"), Color.RED, Level.HIGH,
+    Point(1, 2), Name("subclass"), OrderedDict(b=1, a=2), [1, (2, Color.RED)],
+]
+
+
+def dumps_or_error(dumps, payload):
+    try:
+        return dumps(payload)
+    except TypeError:
+        return TypeError
+
+
+class TestSerializePayload(unittest.TestCase):
+    def test_bytes_are_passed_through(self):
+        raw = b'{"a":1}'
+        view = memoryview(raw)
+
+        assert serialize_payload(raw) is raw
+        assert serialize_payload(view) is view
+
+    def test_dict_matches_json_dumps(self):
+        for payload in TRICKY_PAYLOADS:
+            expected = json.dumps(payload, separators=(",", ":")).encode()
+            assert serialize_payload(payload) == expected
+            assert payload_module._dumps_json(payload) == expected
+
+    def test_orjson_backend_is_byte_identical(self):
+        if payload_module.orjson is None:
+            self.skipTest("orjson is not installed")
+        for payload in TRICKY_PAYLOADS + [payload_no_encoded, {"list": list(range(100))}]:
+            expected = json.dumps(payload, separators=(",", ":")).encode()
+            assert payload_module._dumps_orjson(payload) == expected
+
+    def test_orjson_backend_matches_json_for_other_types(self):
+        if payload_module.orjson is None:
+            self.skipTest("orjson is not installed")
+        for value in NON_JSON_VALUES:
+            payload = {"data": {"value": value}}
+            # either the same bytes, or a TypeError from both backends
+            assert (dumps_or_error(payload_module._dumps_orjson, payload)
+                    == dumps_or_error(payload_module._dumps_json, payload)), value
+
+    def test_canonical_rfc8785_examples(self):
+        numbers = [333333333.33333329, 1E30, 4.50, 2e-3, 0.000000000000000000000000001,
+                   1e21, 1e20, -0.0, 1e-7, 0.000001, 100, -5]
+        assert canonicalize(numbers) == (b'[333333333.3333333,1e+30,4.5,0.002,1e-27,'
+                                         b'1e+21,100000000000000000000,0,1e-7,0.000001,100,-5]')
+        assert canonicalize({"b": 1, "a": {"d": None, "c": [True, False]}}) == \
+            b'{"a":{"c":[true,false],"d":null},"b":1}'
+        assert canonicalize({"\u20ac": 1, "\r": 2, "1": 3, "\U0001f600": 4, "\ufb33": 5}) == \
+            '{"\\r":2,"1":3,"\u20ac":1,"\U0001f600":4,"\ufb33":5}'.encode()
+        assert canonicalize("\x1f\x7f\u2028é") == '"\\u001f\x7f\u2028é"'.encode()
+
+    def test_canonical_rejects_non_json_values(self):
+        for value in (float("nan"), float("inf"), 2 ** 60, {1: 2}, object()):
+            with self.assertRaises((TypeError, ValueError)):
+                canonicalize(value)
+
+
+class TestPayloadSigning(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(certificates_dir, 'example-cert.pem'), 'rb') as cert_file:
+            cls.cert_der = ssl.PEM_cert_to_DER_cert(cert_file.read().decode("utf-8"))
+        with open(os.path.join(certificates_dir, 'example-priv_sk.pem'), 'rb') as key_file:
+            cls.private_key = get_private_key_from_pem(key_file.read())
+
+    def test_serialize_once_sign_and_verify_bytes(self):
+        raw = serialize_payload(payload_no_encoded)
+        token = sign_message_detached(self.private_key, self.cert_der, raw)
+
+        assert verify_message_detached(token, memoryview(raw)) is True
+        assert verify_message_detached(token, payload_no_encoded) is True
+        assert DetachedVerifier(self.cert_der).verify(token, raw) is True
+
+    def test_canonical_signatures_ignore_key_order(self):
+        signer = DetachedSigner(self.private_key, self.cert_der, canonical=True)
+        token = signer.sign({"b": 2, "a": 1})
+
+        assert verify_message_detached(token, {"a": 1, "b": 2}, canonical=True) is True
+        assert DetachedVerifier(self.cert_der, canonical=True).verify(token, {"a": 1, "b": 2}) is True
+        # the default serialization keeps the key order
+        assert verify_message_detached(token, {"b": 2, "a": 1}) is False
+
+
+if __name__ == '__main__':
+    unittest.main()
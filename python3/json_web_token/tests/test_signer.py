@@ -0,0 +1,81 @@
+import os
+import ssl
+import unittest
+
+from json_web_token import (
+    DetachedSigner,
+    DetachedVerifier,
+    detached_protected_header,
+    get_private_key_from_pem,
+    sign_message_detached,
+    verify_message_detached
+)
+
+from test_cert_cache import make_self_signed_der
+
+current_dir: str = os.path.dirname(__file__)
+certificates_dir: str = os.path.abspath(os.path.join(current_dir, 'testcerts'))
+
+payload_no_encoded: dict = {"data": {"request": {"info_ex1": "value 1"}}}
+
+
+class TestDetachedSigner(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(certificates_dir, 'example-cert.pem'), 'rb') as cert_file:
+            cls.cert_der = ssl.PEM_cert_to_DER_cert(cert_file.read().decode("utf-8"))
+        with open(os.path.join(certificates_dir, 'example-priv_sk.pem'), 'rb') as key_file:
+            cls.private_key = get_private_key_from_pem(key_file.read())
+
+    def test_header_is_byte_identical(self):
+        token = sign_message_detached(self.private_key, self.cert_der, payload_no_encoded)
+        signer = DetachedSigner(self.private_key, self.cert_der)
+
+        assert signer.header_b64 == detached_protected_header(self.cert_der)
+        # PSS signatures are randomized, the header and detached part must match
+        assert signer.sign(payload_no_encoded).rsplit(".", 1)[0] == token.rsplit(".", 1)[0]
+
+    def test_signer_tokens_verify_with_existing_function(self):
+        token = DetachedSigner(self.private_key, self.cert_der).sign(payload_no_encoded)
+
+        assert verify_message_detached(token, payload_no_encoded) is True
+        assert verify_message_detached(token, {"data": "tampered"}) is False
+
+    def test_verifier_accepts_sign_message_detached_tokens(self):
+        token = sign_message_detached(self.private_key, self.cert_der, payload_no_encoded)
+        verifier = DetachedVerifier(self.cert_der)
+
+        assert verifier.verify(token, payload_no_encoded) is True
+        assert verifier.verify(token, {"data": "tampered"}) is False
+        assert verifier.verify("not.a-token", payload_no_encoded) is False
+
+    def test_verifier_accepts_bytes_like_certificate(self):
+        token = sign_message_detached(self.private_key, self.cert_der, payload_no_encoded)
+
+        for cert_der in (bytearray(self.cert_der), memoryview(self.cert_der), [bytearray(self.cert_der)]):
+            verifier = DetachedVerifier(cert_der)
+            assert verifier.header_b64 == detached_protected_header(self.cert_der)
+            assert verifier.verify(token, payload_no_encoded) is True
+
+    def test_verifier_rejects_other_certificate(self):
+        other_key, other_der = make_self_signed_der()
+        other_token = DetachedSigner(other_key, other_der).sign(payload_no_encoded)
+
+        assert DetachedVerifier(self.cert_der).verify(other_token, payload_no_encoded) is False
+        assert DetachedVerifier(other_der).verify(other_token, payload_no_encoded) is True
+
+    def test_verifier_with_public_key_only(self):
+        token = DetachedSigner(self.private_key, self.cert_der).sign(payload_no_encoded)
+        verifier = DetachedVerifier(public_key=self.private_key.public_key())
+
+        assert verifier.verify(token, payload_no_encoded) is True
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            DetachedSigner(object(), self.cert_der)
+        with self.assertRaises(ValueError):
+            DetachedVerifier()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import io
+import os
+import ssl
+import tempfile
+import unittest
+
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from jwt import api_jws as jws
+
+from json_web_token import (
+    get_private_key_from_pem,
+    serialize_payload,
+    sign_message_detached,
+    sign_stream,
+    verify_message_detached,
+    verify_stream
+)
+
+from test_algorithms import make_self_signed_der_for
+
+current_dir: str = os.path.dirname(__file__)
+certificates_dir: str = os.path.abspath(os.path.join(current_dir, 'testcerts'))
+
+payload_no_encoded: dict = {"data": {"request": {"info_ex1": "value 1"}}}
+
+
+class TestStreaming(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(certificates_dir, 'example-cert.pem'), 'rb') as cert_file:
+            cls.cert_der = ssl.PEM_cert_to_DER_cert(cert_file.read().decode("utf-8"))
+        with open(os.path.join(certificates_dir, 'example-priv_sk.pem'), 'rb') as key_file:
+            cls.private_key = get_private_key_from_pem(key_file.read())
+        cls.raw = serialize_payload(payload_no_encoded)
+
+    def test_stream_token_matches_sign_message_detached(self):
+        streamed = sign_stream(self.private_key, self.cert_der, io.BytesIO(self.raw), chunk_size=5)
+        token = sign_message_detached(self.private_key, self.cert_der, payload_no_encoded)
+
+        # PSS signatures are randomized, the header and detached part must match
+        assert streamed.rsplit(".", 1)[0] == token.rsplit(".", 1)[0]
+        assert verify_message_detached(streamed, payload_no_encoded) is True
+        assert verify_stream(token, io.BytesIO(self.raw), chunk_size=7) is True
+
+    def test_chunk_iterator(self):
+        chunks = [self.raw[i:i + 3] for i in range(0, len(self.raw), 3)]
+        token = sign_stream(self.private_key, self.cert_der, iter(chunks))
+
+        assert verify_stream(token, chunks) is True
+        assert verify_stream(token, chunks[:-1]) is False
+        assert verify_stream(token, [self.raw + b" "]) is False
+
+    def test_large_file(self):
+        with tempfile.TemporaryFile() as fh:
+            block = os.urandom(1 << 16)
+            for _ in range(48):
+                fh.write(block)
+            fh.seek(0)
+            token = sign_stream(self.private_key, self.cert_der, fh)
+            fh.seek(0)
+            assert verify_stream(token, fh, public_key=self.private_key.public_key()) is True
+            fh.seek(0)
+            assert verify_message_detached(token, fh.read()) is True
+
+    def test_rejects_other_headers(self):
+        token = sign_stream(self.private_key, self.cert_der, [self.raw])
+        attached = jws.encode(self.raw, self.private_key, "PS256")
+
+        assert verify_stream(attached, [self.raw]) is False
+        assert verify_stream(token.replace("..", ".eA.", 1), [self.raw]) is False
+        assert verify_stream("garbage", [self.raw]) is False
+
+    def test_ec_keys(self):
+        for curve, algorithm in ((ec.SECP256R1(), "ES256"), (ec.SECP384R1(), "ES384"), (ec.SECP521R1(), "ES512")):
+            ec_key = ec.generate_private_key(curve)
+            ec_cert = make_self_signed_der_for(ec_key, algorithm)
+            streamed = sign_stream(ec_key, ec_cert, io.BytesIO(self.raw), chunk_size=5)
+            token = sign_message_detached(ec_key, ec_cert, payload_no_encoded)
+
+            assert jws.get_unverified_header(streamed)["alg"] == algorithm
+            assert verify_message_detached(streamed, payload_no_encoded, algorithms=[algorithm]) is True
+            assert verify_stream(token, [self.raw], algorithms=[algorithm]) is True
+            assert verify_stream(streamed, [self.raw], public_key=ec_key.public_key(),
+                                 algorithms=[algorithm]) is True
+            assert verify_stream(streamed, [self.raw + b" "], algorithms=[algorithm]) is False
+            # PS256 alone unless told otherwise
+            assert verify_stream(streamed, [self.raw]) is False
+            assert verify_stream(streamed, [self.raw], public_key=self.private_key.public_key(),
+                                 algorithms=["PS256", algorithm]) is False
+
+    def test_eddsa_is_not_streamable(self):
+        ed_key = ed25519.Ed25519PrivateKey.generate()
+        ed_cert = make_self_signed_der_for(ed_key, "ed25519")
+        token = sign_message_detached(ed_key, ed_cert, payload_no_encoded)
+
+        with self.assertRaises(ValueError):
+            sign_stream(ed_key, ed_cert, [self.raw])
+        assert verify_stream(token, [self.raw], algorithms=["EdDSA"]) is False
+
+    def test_sign_stream_errors(self):
+        with self.assertRaises(ValueError):
+            sign_stream(object(), self.cert_der, [self.raw])
+        with self.assertRaises(ValueError):
+            sign_stream(self.private_key, self.cert_der, ["not bytes"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import datetime
+import unittest
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+from json_web_token import (
+    TrustStore,
+    sign_message_detached,
+    verify_many,
+    verify_message_detached
+)
+
+from test_cert_cache import FakeClock
+
+payload_no_encoded: dict = {"data": {"request": {"info_ex1": "value 1"}}}
+
+NOW = datetime.datetime.now(datetime.timezone.utc)
+
+
+def issue(subject: str, key, issuer_name=None, issuer_key=None, ca: bool = False, days: int = 30):
+    """Issue a certificate for key, self-signed unless an issuer is given."""
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, subject)])
+    builder = (x509.CertificateBuilder()
+               .subject_name(name).issuer_name(issuer_name or name)
+               .public_key(key.public_key())
+               .serial_number(x509.random_serial_number())
+               .not_valid_before(NOW - datetime.timedelta(days=1))
+               .not_valid_after(NOW + datetime.timedelta(days=days)))
+    if ca:
+        builder = builder.add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+    return builder.sign(issuer_key or key, hashes.SHA256())
+
+
+def der(certificate) -> bytes:
+    return certificate.public_bytes(serialization.Encoding.DER)
+
+
+def not_after(certificate) -> float:
+    """not_valid_after as a POSIX timestamp, not_valid_after_utc needs cryptography >= 42."""
+    try:
+        return certificate.not_valid_after_utc.timestamp()
+    except AttributeError:
+        return certificate.not_valid_after.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+class TestTrustStore(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.root_key = ec.generate_private_key(ec.SECP256R1())
+        cls.root = issue("root", cls.root_key, ca=True, days=365)
+        cls.intermediate_key = ec.generate_private_key(ec.SECP256R1())
+        cls.intermediate = issue("intermediate", cls.intermediate_key, cls.root.subject,
+                                 cls.root_key, ca=True, days=20)
+        cls.leaf_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        cls.leaf = issue("leaf", cls.leaf_key, cls.intermediate.subject, cls.intermediate_key)
+        cls.chain = [der(cls.leaf), der(cls.intermediate)]
+
+    def test_chain_to_root_is_trusted_and_memoized(self):
+        store = TrustStore(roots=[der(self.root)])
+        token = sign_message_detached(self.leaf_key, self.chain, payload_no_encoded)
+
+        assert verify_message_detached(token, payload_no_encoded, trust_store=store) is True
+        assert verify_message_detached(token, payload_no_encoded, trust_store=store) is True
+        assert store.stats.misses == 1 and store.stats.hits == 1
+
+    def test_intermediate_from_store(self):
+        store = TrustStore(roots=[self.root], intermediates=[self.intermediate])
+        token = sign_message_detached(self.leaf_key, der(self.leaf), payload_no_encoded)
+
+        assert verify_message_detached(token, payload_no_encoded, trust_store=store) is True
+        # without the store intermediate the single leaf has no path to the root
+        assert verify_message_detached(token, payload_no_encoded,
+                                       trust_store=TrustStore(roots=[self.root])) is False
+
+    def test_unknown_root_is_rejected(self):
+        other_key = ec.generate_private_key(ec.SECP256R1())
+        store = TrustStore(roots=[issue("root", other_key, ca=True)])
+        token = sign_message_detached(self.leaf_key, self.chain, payload_no_encoded)
+
+        assert verify_message_detached(token, payload_no_encoded, trust_store=store) is False
+        # unchanged without a trust store
+        assert verify_message_detached(token, payload_no_encoded) is True
+
+    def test_issuer_must_be_a_ca(self):
+        not_ca = issue("intermediate", self.intermediate_key, self.root.subject, self.root_key)
+        store = TrustStore(roots=[self.root])
+
+        with self.assertRaises(ValueError):
+            store.validate([der(self.leaf), der(not_ca)])
+
+    def test_pinned_self_signed_leaf(self):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        certificate = issue("pinned", key)
+        token = sign_message_detached(key, der(certificate), payload_no_encoded)
+
+        assert verify_message_detached(token, payload_no_encoded,
+                                       trust_store=TrustStore(roots=[certificate])) is True
+
+    def test_memo_expires_with_earliest_not_valid_after(self):
+        clock = FakeClock()
+        clock.now = NOW.timestamp()
+        store = TrustStore(roots=[self.root], clock=clock)
+        store.validate(self.chain)
+
+        # the intermediate expires first, after 20 days
+        clock.now = (NOW + datetime.timedelta(days=19)).timestamp()
+        store.validate(self.chain)
+        assert store.stats.hits == 1
+
+        clock.now = (NOW + datetime.timedelta(days=21)).timestamp()
+        with self.assertRaises(ValueError):
+            store.validate(self.chain)
+        assert store.stats.expirations == 1 and len(store._validated) == 0
+
+    def test_verify_many_with_trust_store(self):
+        store = TrustStore(roots=[self.root])
+        tokens = [sign_message_detached(self.leaf_key, self.chain, payload_no_encoded) for _ in range(3)]
+
+        results = verify_many([(token, payload_no_encoded) for token in tokens], trust_store=store)
+
+        assert all(result.valid for result in results)
+        assert store.stats.misses + store.stats.hits == 3
+
+    def test_from_pem(self):
+        pem = self.root.public_bytes(serialization.Encoding.PEM)
+        store = TrustStore.from_pem(pem, self.intermediate.public_bytes(serialization.Encoding.PEM))
+
+        assert store.validate([der(self.leaf)]) is not None
+        with self.assertRaises(ValueError):
+            TrustStore.from_pem(b"not a pem")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import time
+import unittest
+
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from json_web_token import (
+    TrustStore,
+    VerificationCache,
+    get_x509_cert_from_der,
+    serialize_payload,
+    sign_message_detached,
+    verify_many,
+    verify_message_detached
+)
+from json_web_token.verification_cache import verification_key
+
+from test_cert_cache import FakeClock, make_self_signed_der
+from test_trust_store import der, issue, not_after
+
+payload_no_encoded: dict = {"data": {"request": {"info_ex1": "value 1"}}}
+
+
+class TestVerificationCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.private_key, cls.cert_der = make_self_signed_der("verification-cache")
+        cls.token = sign_message_detached(cls.private_key, cls.cert_der, payload_no_encoded)
+        cls.not_after = not_after(get_x509_cert_from_der(cls.cert_der))
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.clock.now = time.time()
+        self.cache = VerificationCache(maxsize=4, ttl=60.0, clock=self.clock)
+
+    def test_hit_after_success(self):
+        assert verify_message_detached(self.token, payload_no_encoded, verification_cache=self.cache) is True
+        assert verify_message_detached(self.token, payload_no_encoded, verification_cache=self.cache) is True
+        assert verify_message_detached(self.token, serialize_payload(payload_no_encoded),
+                                       verification_cache=self.cache) is True
+
+        stats = self.cache.stats
+        assert (stats.hits, stats.misses, stats.size) == (2, 1, 1)
+        assert stats.hit_rate == 2 / 3
+        assert stats.saved_seconds > 0
+
+    def test_failures_are_not_cached(self):
+        other = {"data": "other"}
+        for _ in range(3):
+            assert verify_message_detached(self.token, other, verification_cache=self.cache) is False
+
+        assert len(self.cache) == 0
+        assert self.cache.stats.misses == 3
+
+    def test_ttl(self):
+        verify_message_detached(self.token, payload_no_encoded, verification_cache=self.cache)
+        self.clock.now += 61
+
+        assert verify_message_detached(self.token, payload_no_encoded, verification_cache=self.cache) is True
+        stats = self.cache.stats
+        assert (stats.hits, stats.expirations) == (0, 1)
+
+    def test_ttl_capped_by_certificate_validity(self):
+        cache = VerificationCache(ttl=365 * 86400.0, clock=self.clock)
+        verify_message_detached(self.token, payload_no_encoded, verification_cache=cache)
+
+        self.clock.now = self.not_after - 1
+        assert cache.get(verification_key(self.token, serialize_payload(payload_no_encoded), ["PS256"]))
+        self.clock.now = self.not_after
+        assert not cache.get(verification_key(self.token, serialize_payload(payload_no_encoded), ["PS256"]))
+        assert cache.stats.expirations == 1
+
+    def test_context_is_part_of_the_key(self):
+        verify_message_detached(self.token, payload_no_encoded, verification_cache=self.cache)
+
+        # a success through the x5c certificate says nothing about a trust store
+        # or another public key
+        untrusted = TrustStore(clock=self.clock)
+        assert verify_message_detached(self.token, payload_no_encoded, trust_store=untrusted,
+                                       verification_cache=self.cache) is False
+        other_key, _ = make_self_signed_der("other-key")
+        assert verify_message_detached(self.token, payload_no_encoded, public_key=other_key.public_key(),
+                                       verification_cache=self.cache) is False
+        assert verify_message_detached(self.token, payload_no_encoded, algorithms=["ES256"],
+                                       verification_cache=self.cache) is False
+        assert self.cache.stats.hits == 0
+
+    def test_trust_store_identity_is_stable(self):
+        root_key = ec.generate_private_key(ec.SECP256R1())
+        root = issue("cache-root", root_key, ca=True, days=365)
+        leaf = issue("cache-leaf", self.private_key, root.subject, root_key)
+        token = sign_message_detached(self.private_key, [der(leaf)], payload_no_encoded)
+        store = TrustStore(roots=[der(root)], clock=self.clock)
+        payload = serialize_payload(payload_no_encoded)
+
+        assert verify_message_detached(token, payload, trust_store=store, verification_cache=self.cache) is True
+        assert verify_message_detached(token, payload, trust_store=store, verification_cache=self.cache) is True
+        assert self.cache.stats.hits == 1
+
+        # a store with the same roots is another store, whatever id() it gets
+        other = TrustStore(roots=[der(root)], clock=self.clock)
+        assert other.cache_token != store.cache_token
+        assert (verification_key(token, payload, ["PS256"], trust_store=other)
+                != verification_key(token, payload, ["PS256"], trust_store=store))
+        # so is the same store after its certificates change
+        token_before = store.cache_token
+        store.add_intermediate(der(root))
+        assert store.cache_token != token_before
+        store.clear()
+        assert verify_message_detached(token, payload, trust_store=store, verification_cache=self.cache) is True
+        assert self.cache.stats.hits == 1
+
+    def test_ttl_capped_by_trust_store_root(self):
+        # the root expires long before the leaf, which is the only x5c certificate
+        root_key = ec.generate_private_key(ec.SECP256R1())
+        root = issue("short-root", root_key, ca=True, days=5)
+        leaf = issue("long-leaf", self.private_key, root.subject, root_key, days=300)
+        token = sign_message_detached(self.private_key, [der(leaf)], payload_no_encoded)
+        store = TrustStore(roots=[der(root)], clock=self.clock)
+        cache = VerificationCache(ttl=365 * 86400.0, clock=self.clock)
+        root_not_after = not_after(root)
+
+        assert verify_message_detached(token, payload_no_encoded, trust_store=store,
+                                       verification_cache=cache) is True
+        key = verification_key(token, serialize_payload(payload_no_encoded), ["PS256"], trust_store=store)
+        self.clock.now = root_not_after - 1
+        assert cache.get(key)
+        self.clock.now = root_not_after
+        assert not cache.get(key)
+        assert root_not_after < not_after(leaf) - 200 * 86400
+
+    def test_purge_and_eviction(self):
+        payloads = [{"n": i} for i in range(6)]
+        pairs = [(sign_message_detached(self.private_key, self.cert_der, p), p) for p in payloads]
+        assert all(r.valid for r in verify_many(pairs + pairs[-2:], max_workers=1,
+                                                verification_cache=self.cache))
+
+        stats = self.cache.stats
+        assert (stats.size, stats.evictions, stats.hits) == (4, 2, 2)
+        self.clock.now += 61
+        assert self.cache.purge(expired_only=True) == 4
+        verify_message_detached(*pairs[0], verification_cache=self.cache)
+        assert self.cache.purge() == 1
+        assert len(self.cache) == 0
+        assert verify_message_detached(*pairs[0], verification_cache=self.cache) is True
+        assert self.cache.stats.hits == 2
+
+    def test_arguments(self):
+        with self.assertRaises(ValueError):
+            VerificationCache(maxsize=0)
+        with self.assertRaises(ValueError):
+            VerificationCache(ttl=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
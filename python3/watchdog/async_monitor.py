@@ -0,0 +1,221 @@
+# coding: utf-8
+"""
+Asyncio entry point for the file monitor.
+
+The watchdog observer still runs in its own thread, but its events are
+handed to the event loop with loop.call_soon_threadsafe() and land in an
+asyncio.Queue. Handlers are plain `async def` functions, run as tasks with
+at most `concurrency` of them in flight, so they can await uploads or
+database writes without a thread per handler. Nothing polls: the consumer
+sleeps on the queue and stop() wakes it with a sentinel.
+
+Example:
+
+    async def handle(event):
+        await upload(event.src_path)
+
+    asyncio.run(AsyncMonitor('/data/uploads', handle, patterns=['*.jpg']).run())
+"""
+
+import os
+import sys
+import signal
+import asyncio
+import argparse
+import logging
+from pathlib import Path
+
+from watchdog.events import PatternMatchingEventHandler
+from watchdog.observers import Observer
+
+from watchdog_2 import setup_logging
+
+_STOP = object()
+
+
+class AsyncEventBridge(PatternMatchingEventHandler):
+    """Forward matching events from the observer thread to an asyncio.Queue."""
+
+    def __init__(self, loop, queue, patterns=None, ignore_patterns=None,
+                 ignore_directories=False, case_sensitive=True):
+        super().__init__(
+            patterns=patterns,
+            ignore_patterns=ignore_patterns,
+            ignore_directories=ignore_directories,
+            case_sensitive=case_sensitive
+        )
+        self.loop = loop
+        self.queue = queue
+
+    def on_any_event(self, event):
+        """Runs on the observer thread, only schedules the put on the loop."""
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+
+class AsyncMonitor:
+    """Watch a folder and run an async handler for every matching event."""
+
+    def __init__(self, path, handler, patterns=None, ignore_patterns=None,
+                 ignore_directories=False, recursive=True, concurrency=10):
+        """
+        Args:
+            path (str): Folder to watch
+            handler (callable): `async def handler(event)`
+            patterns (list): Patterns to watch, all files if None
+            ignore_patterns (list): Patterns to ignore
+            ignore_directories (bool): Skip directory events
+            recursive (bool): Watch sub folders too
+            concurrency (int): Most handlers running at the same time
+        """
+        self.path = str(path)
+        self.handler = handler
+        self.patterns = patterns
+        self.ignore_patterns = ignore_patterns
+        self.ignore_directories = ignore_directories
+        self.recursive = recursive
+        self.concurrency = concurrency
+        self.event_count = 0
+        self.failed_count = 0
+        self._stop_requested = False
+        self._loop = None
+        self._queue = None
+
+    def stop(self):
+        """Ask run() to finish; safe to call from any thread or a signal handler."""
+        self._stop_requested = True
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, _STOP)
+
+    async def _handle(self, event, semaphore):
+        try:
+            await self.handler(event)
+        except Exception:
+            self.failed_count += 1
+            logging.exception(f"Handler failed for {event.event_type} - {event.src_path}")
+        finally:
+            semaphore.release()
+
+    async def run(self):
+        """
+        Watch until stop() is called.
+
+        Events already queued when stop() is called are still handled, and
+        run() returns once every handler has finished.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        if self._stop_requested:
+            self._queue.put_nowait(_STOP)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+
+        bridge = AsyncEventBridge(self._loop, self._queue, self.patterns, self.ignore_patterns,
+                                  self.ignore_directories)
+        observer = Observer()
+        observer.schedule(bridge, self.path, recursive=self.recursive)
+        observer.start()
+        try:
+            while True:
+                event = await self._queue.get()
+                if event is _STOP:
+                    break
+                self.event_count += 1
+                # wait for a free slot here, so a burst queues events, not tasks
+                await semaphore.acquire()
+                task = asyncio.create_task(self._handle(event, semaphore))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            observer.stop()
+            await asyncio.to_thread(observer.join)
+            # events the observer delivered before stopping
+            while not self._queue.empty():
+                event = self._queue.get_nowait()
+                if event is not _STOP:
+                    self.event_count += 1
+                    await semaphore.acquire()
+                    task = asyncio.create_task(self._handle(event, semaphore))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+
+
+async def log_event(event):
+    """Example handler: log the event and the file size without blocking the loop."""
+    logging.info(f"Event: {event.event_type} - {event.src_path}")
+    if event.event_type in ('created', 'modified') and not event.is_directory:
+        try:
+            file_size = await asyncio.to_thread(os.path.getsize, event.src_path)
+        except FileNotFoundError:
+            return
+        logging.info(f"{event.src_path} ({file_size} bytes)")
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Monitor file system events with asyncio handlers')
+
+    parser.add_argument('path', nargs='?', default=os.getcwd(),
+                        help='Directory path to monitor (default: current directory)')
+
+    parser.add_argument('-p', '--patterns', nargs='+', default=['*.py', '*.pyc'],
+                        help='File patterns to watch (default: *.py *.pyc)')
+
+    parser.add_argument('-i', '--ignore-patterns', nargs='+', default=['version.py'],
+                        help='File patterns to ignore (default: version.py)')
+
+    parser.add_argument('-d', '--ignore-directories', action='store_true',
+                        help='Ignore directory events')
+
+    parser.add_argument('-c', '--concurrency', type=int, default=10,
+                        help='Most handlers running at the same time (default: 10)')
+
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Enable verbose logging (DEBUG level)')
+
+    parser.add_argument('-l', '--log-file',
+                        help='Log to file instead of console')
+
+    return parser.parse_args()
+
+
+async def amain(args):
+    path = Path(args.path).resolve()
+    if not path.exists():
+        logging.error(f"Path does not exist: {path}")
+        return 1
+
+    monitor = AsyncMonitor(path, log_event, patterns=args.patterns,
+                           ignore_patterns=args.ignore_patterns,
+                           ignore_directories=args.ignore_directories,
+                           concurrency=args.concurrency)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, monitor.stop)
+        except NotImplementedError:
+            # Windows: Ctrl+C raises KeyboardInterrupt in asyncio.run() instead
+            pass
+
+    logging.info(f"Async monitor started on {path}. Press Ctrl+C to stop...")
+    await monitor.run()
+    logging.info(f"Monitoring stopped. Handled {monitor.event_count} events, "
+                 f"{monitor.failed_count} failed.")
+    return 0
+
+
+def main():
+    """Main function to run the asyncio file system monitor."""
+    args = parse_arguments()
+    setup_logging(logging.DEBUG if args.verbose else logging.INFO, args.log_file)
+    try:
+        return asyncio.run(amain(args))
+    except KeyboardInterrupt:
+        logging.info("Monitoring stopped (Ctrl+C pressed).")
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,247 @@
+# coding: utf-8
+"""
+Watch daemon that compresses new or modified images within seconds.
+
+Instead of waiting for the nightly compress_quality_images.py sweep, image
+events are coalesced per path, a file is considered settled once its size
+and mtime stop changing between two debounce windows, and settled files are
+handed to compress_quality_images.py -files in small batches. The pipeline's
+own output (thumbnails named *_resized_*, temporary tmp_* files) is ignored
+and every processed path gets a cooldown, so the daemon never loops on the
+files it just wrote.
+"""
+
+import os
+import sys
+import time
+import shlex
+import argparse
+import logging
+import threading
+import subprocess
+from pathlib import Path
+
+from watchdog.events import FileCreatedEvent, PatternMatchingEventHandler
+from watchdog.observers import Observer
+from watchdog.utils.patterns import match_any_paths
+
+from watchdog_2 import CoalescingEventQueue, setup_logging, wait_for_observer
+
+IMAGE_PATTERNS = ['*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.bmp', '*.tif', '*.tiff']
+
+# files written by the compression pipeline itself
+OWN_OUTPUT_PATTERNS = ['*_resized_*', 'tmp_*']
+
+COMPRESS_SCRIPT = Path(__file__).resolve().parents[2] / 'python2' / 'compress_quality_images.py'
+
+
+class ImageDaemon(PatternMatchingEventHandler):
+    """Feed settled image events to compress_quality_images.py in batches."""
+
+    def __init__(self, command, patterns=None, ignore_patterns=None, debounce=2.0,
+                 batch_size=50, batch_wait=1.0, cooldown=60.0):
+        """
+        Args:
+            command (list): Command line of the compressor, the settled
+                paths are appended after -files
+            patterns (list): Image patterns to watch
+            ignore_patterns (list): Extra patterns to ignore, the pipeline's
+                own output is always ignored
+            debounce (float): Seconds a path must be quiet before it is checked
+            batch_size (int): Most files handed to one compressor run
+            batch_wait (float): Seconds to wait for more files before running
+                a partial batch
+            cooldown (float): Seconds events are ignored for a processed path
+        """
+        super().__init__(
+            patterns=patterns or IMAGE_PATTERNS,
+            ignore_patterns=OWN_OUTPUT_PATTERNS + list(ignore_patterns or []),
+            ignore_directories=True,
+            case_sensitive=False
+        )
+        self.command = list(command)
+        self.queue = CoalescingEventQueue(debounce)
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.cooldown = cooldown
+        self.batches = 0
+        self.compressed = 0
+        self._last_seen = {}  # path -> (size, mtime) at the previous check
+        self._cooldown_until = {}
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        """Start the thread that runs the compressor."""
+        self._thread = threading.Thread(target=self._run, name="image-daemon", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Compress the settled files still queued and wait for the thread."""
+        self._stopping = True
+        self.queue.close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def on_created(self, event):
+        self.queue.put(event)
+
+    def on_modified(self, event):
+        self.queue.put(event)
+
+    def on_moved(self, event):
+        """A file moved into place is a new file at its destination."""
+        if match_any_paths([event.dest_path], included_patterns=self.patterns,
+                           excluded_patterns=self.ignore_patterns,
+                           case_sensitive=self.case_sensitive):
+            self.queue.put(FileCreatedEvent(event.dest_path))
+
+    def _settled_path(self, event):
+        """
+        Return the path of event if it is ready to compress.
+
+        A path is ready when its size and mtime match the previous check, one
+        debounce window earlier; otherwise it goes back to the queue.
+        """
+        path = event.src_path
+        if time.monotonic() < self._cooldown_until.get(path, 0):
+            logging.debug(f"Cooling down, skipped: {path}")
+            return None
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self._last_seen.pop(path, None)
+            return None
+        current = (st.st_size, st.st_mtime)
+        if self._last_seen.get(path) == current or self._stopping:
+            self._last_seen.pop(path, None)
+            return path
+        self._last_seen[path] = current
+        self.queue.put(event)
+        return None
+
+    def _run(self):
+        batch = []
+        while True:
+            item = self.queue.get(timeout=self.batch_wait if batch else None)
+            if item is not None:
+                path = self._settled_path(item[0])
+                if path is not None and path not in batch:
+                    batch.append(path)
+                if len(batch) < self.batch_size:
+                    continue
+            if batch:
+                self._compress(batch)
+                batch = []
+            elif item is None and self._stopping:
+                return
+
+    def _compress(self, paths):
+        """Run the compressor on paths and start their cooldown."""
+        start = time.monotonic()
+        try:
+            result = subprocess.run(self.command + ['-files'] + paths,
+                                    capture_output=True, text=True)
+        except OSError as error:
+            logging.error(f"Cannot run {self.command[0]}: {error}")
+            return
+        finally:
+            until = time.monotonic() + self.cooldown
+            for path in paths:
+                self._cooldown_until[path] = until
+        elapsed = time.monotonic() - start
+        self.batches += 1
+        if result.returncode:
+            logging.error(f"Compressor exited with {result.returncode} for {len(paths)} files: "
+                          f"{result.stderr.strip()}")
+            return
+        self.compressed += len(paths)
+        logging.info(f"Compressed batch of {len(paths)} files in {elapsed:.1f}s")
+        # forget expired cooldowns so the dict does not grow forever
+        now = time.monotonic()
+        self._cooldown_until = {p: t for p, t in self._cooldown_until.items() if t > now}
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Compress new or modified images as soon as they settle')
+
+    parser.add_argument('path', nargs='?', default=os.getcwd(),
+                        help='Directory path to monitor (default: current directory)')
+
+    parser.add_argument('-p', '--patterns', nargs='+', default=IMAGE_PATTERNS,
+                        help='Image patterns to watch (default: common image extensions)')
+
+    parser.add_argument('-i', '--ignore-patterns', nargs='+', default=[],
+                        help=f'Extra patterns to ignore, {" ".join(OWN_OUTPUT_PATTERNS)} are always ignored')
+
+    parser.add_argument('--python', default='python2',
+                        help='Interpreter for the compressor (default: python2)')
+
+    parser.add_argument('--compress-script', default=str(COMPRESS_SCRIPT),
+                        help='Path to compress_quality_images.py')
+
+    parser.add_argument('--compress-args', default='',
+                        help='Extra arguments for the compressor, e.g. "-workers 4 -target 70k"')
+
+    parser.add_argument('--debounce', type=float, default=2.0,
+                        help='Seconds a file must be quiet before it is checked (default: 2)')
+
+    parser.add_argument('--batch-size', type=int, default=50,
+                        help='Most files per compressor run (default: 50)')
+
+    parser.add_argument('--batch-wait', type=float, default=1.0,
+                        help='Seconds to wait for more files before a partial batch (default: 1)')
+
+    parser.add_argument('--cooldown', type=float, default=60.0,
+                        help='Seconds events are ignored for a processed file (default: 60)')
+
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Enable verbose logging (DEBUG level)')
+
+    parser.add_argument('-l', '--log-file',
+                        help='Log to file instead of console')
+
+    return parser.parse_args()
+
+
+def main():
+    """Run the daemon until Ctrl+C."""
+    args = parse_arguments()
+
+    log_level = logging.DEBUG if args.verbose else logging.INFO
+    setup_logging(log_level, args.log_file)
+
+    path = Path(args.path).resolve()
+    if not path.exists():
+        logging.error(f"Path does not exist: {path}")
+        return 1
+
+    command = [args.python, args.compress_script] + shlex.split(args.compress_args)
+    daemon = ImageDaemon(command, patterns=args.patterns, ignore_patterns=args.ignore_patterns,
+                         debounce=args.debounce, batch_size=args.batch_size,
+                         batch_wait=args.batch_wait, cooldown=args.cooldown)
+    daemon.start()
+
+    observer = Observer()
+    observer.schedule(daemon, str(path), recursive=True)
+    observer.start()
+    logging.info(f"Image daemon watching {path}, running: {' '.join(command)}")
+
+    try:
+        wait_for_observer(observer)
+    except KeyboardInterrupt:
+        logging.info("Stopping image daemon (Ctrl+C pressed)...")
+    finally:
+        observer.stop()
+        observer.join()
+        daemon.stop()
+        logging.info(f"Image daemon stopped. Compressed {daemon.compressed} files "
+                     f"in {daemon.batches} batches, {daemon.queue.dropped} events coalesced.")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,368 @@
+# coding: utf-8
+"""
+Crash-safe journal and catch-up scan for the watchdog monitor.
+
+The state of the watched tree (size and mtime of every matching file, plus
+the mtime of every directory when it was last listed) lives in a snapshot
+file and an append-only journal of the paths processed since. A checkpoint
+writes a new snapshot atomically and empties the journal; after a crash the
+snapshot plus the journal give back the last processed state. The snapshot
+is written from a copy of the state outside the lock, so processed events
+keep being recorded while it is written and fsynced.
+
+On startup catch_up() compares the tree with that state. A directory whose
+mtime did not change has the same entries as before, so only directories
+whose mtime changed are listed again and the catch-up cost grows with the
+number of changes, not with the size of the tree. Rewriting an existing
+file in place does not change its directory's mtime; use full=True
+(--catchup-full) to stat every file when that matters.
+"""
+
+import os
+import json
+import logging
+import threading
+
+from watchdog.events import (EVENT_TYPE_DELETED, EVENT_TYPE_MOVED, FileCreatedEvent,
+                             FileDeletedEvent, FileModifiedEvent)
+
+SNAPSHOT_VERSION = 1
+
+
+class MonitorJournal:
+    """
+    Processed state of a watched tree, persisted as snapshot plus journal.
+
+    Journal lines are JSON objects: {"o": "f", "p": path, "s": size, "m": mtime}
+    for a file, {"o": "x", "p": path} for a removed file or directory and
+    {"o": "d", "p": dirpath, "m": mtime, "c": subdirs} once a listed directory
+    is fully processed. Replaying them is idempotent, so a crash between writing the
+    snapshot and removing the journal it covers is harmless.
+    """
+
+    def __init__(self, state_dir, root, checkpoint_every=1000):
+        """
+        Args:
+            state_dir (str): Folder for snapshot.json and journal.jsonl, keep
+                it outside the watched tree
+            root (str): Watched folder, a snapshot of another root is ignored
+            checkpoint_every (int): Journal lines written before a checkpoint
+        """
+        os.makedirs(state_dir, exist_ok=True)
+        self.root = str(root)
+        self.snapshot_path = os.path.join(state_dir, 'snapshot.json')
+        self.journal_path = os.path.join(state_dir, 'journal.jsonl')
+        # journal covered by the snapshot being written, removed once it is
+        self.previous_journal_path = self.journal_path + '.1'
+        self.checkpoint_every = checkpoint_every
+        self.dirs = {}  # dirpath -> {"mtime": ns or None, "files": {name: [size, mtime]}, "subdirs": [names]}
+        self.has_snapshot = False
+        self._since_checkpoint = 0
+        self._outstanding = {}  # dirpath -> listing waiting for its replayed events
+        self._outstanding_paths = {}  # replayed path -> dirpath it was listed in
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()  # one snapshot written at a time
+        self._load()
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    # =======================
+    # PERSISTENCE
+    # =======================
+
+    def _load(self):
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as fh:
+                snapshot = json.load(fh)
+            if snapshot.get('version') == SNAPSHOT_VERSION and snapshot.get('root') == self.root:
+                self.dirs = snapshot['dirs']
+                self.has_snapshot = True
+            else:
+                logging.warning(f"Ignoring snapshot of another root or version: {self.snapshot_path}")
+        except FileNotFoundError:
+            pass
+        if not self.has_snapshot:
+            # a journal without its snapshot cannot be trusted
+            open(self.journal_path, 'w').close()
+            self._remove_previous_journal()
+            return
+        replayed = 0
+        # a previous journal is left by a crash during a checkpoint, its
+        # entries come before the current ones
+        for path in (self.previous_journal_path, self.journal_path):
+            try:
+                with open(path, encoding='utf-8') as fh:
+                    for line in fh:
+                        try:
+                            self._apply(json.loads(line))
+                        except ValueError:
+                            # last line cut short by the crash
+                            break
+                        replayed += 1
+            except FileNotFoundError:
+                pass
+        logging.info(f"Loaded snapshot of {len(self.dirs)} directories and {replayed} journal entries")
+        if os.path.exists(self.previous_journal_path):
+            self._write_snapshot(self.dirs)
+            open(self.journal_path, 'w').close()
+            self._remove_previous_journal()
+
+    def _apply(self, entry):
+        op, path = entry['o'], entry['p']
+        if op == 'f':
+            dirpath, name = os.path.split(path)
+            self._dir(dirpath)['files'][name] = [entry['s'], entry['m']]
+        elif op == 'x':
+            dirpath, name = os.path.split(path)
+            if dirpath in self.dirs:
+                self.dirs[dirpath]['files'].pop(name, None)
+            self._drop_tree(path)
+        elif op == 'd':
+            record = self._dir(path)
+            record['mtime'] = entry['m']
+            record['subdirs'] = entry['c']
+
+    def _dir(self, dirpath):
+        record = self.dirs.get(dirpath)
+        if record is None:
+            record = self.dirs[dirpath] = {'mtime': None, 'files': {}, 'subdirs': []}
+        return record
+
+    def _drop_tree(self, dirpath):
+        prefix = dirpath + os.sep
+        for known in [d for d in self.dirs if d == dirpath or d.startswith(prefix)]:
+            del self.dirs[known]
+
+    def _write(self, entry):
+        """Apply an entry and append it to the journal, caller holds the lock."""
+        self._apply(entry)
+        self._journal.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self._journal.flush()
+        self._since_checkpoint += 1
+
+    def _write_snapshot(self, dirs):
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump({'version': SNAPSHOT_VERSION, 'root': self.root, 'dirs': dirs},
+                      fh, separators=(',', ':'))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    def _remove_previous_journal(self):
+        try:
+            os.remove(self.previous_journal_path)
+        except FileNotFoundError:
+            pass
+
+    def _rotate(self):
+        """
+        Copy the state and start an empty journal, caller holds the lock.
+
+        Entries are never changed in place (file stats and subdir lists are
+        replaced), so copying the per-directory dicts is enough.
+        """
+        dirs = {dirpath: {'mtime': record['mtime'], 'files': dict(record['files']),
+                          'subdirs': record['subdirs']}
+                for dirpath, record in self.dirs.items()}
+        self._journal.close()
+        os.replace(self.journal_path, self.previous_journal_path)
+        self._journal = open(self.journal_path, 'w', encoding='utf-8')
+        self._since_checkpoint = 0
+        return dirs
+
+    def checkpoint(self, blocking=True):
+        """
+        Write the snapshot atomically and start an empty journal.
+
+        Only copying the state and switching journals hold the lock, events
+        recorded while the snapshot is written go to the new journal.
+
+        Args:
+            blocking (bool): Wait for a checkpoint already running, otherwise
+                return without writing one
+        """
+        if not self._checkpoint_lock.acquire(blocking):
+            return
+        try:
+            with self._lock:
+                dirs = self._rotate()
+            self._write_snapshot(dirs)
+            self._remove_previous_journal()
+            self.has_snapshot = True
+        finally:
+            self._checkpoint_lock.release()
+
+    def _checkpoint_if_due(self):
+        if self._since_checkpoint >= self.checkpoint_every:
+            self.checkpoint(blocking=False)
+
+    def close(self):
+        """Checkpoint and close the journal."""
+        self.checkpoint()
+        with self._lock:
+            self._journal.close()
+
+    # =======================
+    # PROCESSED EVENTS
+    # =======================
+
+    def record(self, event):
+        """
+        Record an event once the handler has processed it.
+
+        Created and modified files are stat'ed for their current size and
+        mtime; a file gone by then is recorded as removed.
+        """
+        with self._lock:
+            if event.event_type == EVENT_TYPE_MOVED:
+                self._write({'o': 'x', 'p': event.src_path})
+                self._done(event.src_path)
+                if not event.is_directory:
+                    self._record_file(event.dest_path)
+            else:
+                if event.event_type == EVENT_TYPE_DELETED:
+                    self._write({'o': 'x', 'p': event.src_path})
+                elif not event.is_directory:
+                    self._record_file(event.src_path)
+                self._done(event.src_path)
+        self._checkpoint_if_due()
+
+    def _record_file(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self._write({'o': 'x', 'p': path})
+            return
+        self._write({'o': 'f', 'p': path, 's': st.st_size, 'm': st.st_mtime_ns})
+
+    def _done(self, path):
+        """Mark a replayed path processed, a directory is marked once all are."""
+        dirpath = self._outstanding_paths.pop(path, None)
+        if dirpath is None:
+            return
+        listing = self._outstanding[dirpath]
+        listing['paths'].discard(path)
+        if not listing['paths']:
+            del self._outstanding[dirpath]
+            self._mark(dirpath, listing)
+
+    def _mark(self, dirpath, listing):
+        """Record a listed directory, caller holds the lock."""
+        for removed in listing['removed']:
+            self._write({'o': 'x', 'p': removed})
+        self._write({'o': 'd', 'p': dirpath, 'm': listing['mtime'], 'c': listing['subdirs']})
+
+    # =======================
+    # CATCH-UP
+    # =======================
+
+    def catch_up(self, matches, full=False):
+        """
+        Compare the tree with the recorded state.
+
+        Without a snapshot this records a baseline and returns nothing, the
+        first run does not replay the whole tree.
+
+        Args:
+            matches (callable): Takes a file path, True if it is watched
+            full (bool): Stat every file, also finds files rewritten in
+                place, instead of listing only changed directories
+
+        Returns:
+            list: Created, modified and deleted events for the differences
+        """
+        baseline = not self.has_snapshot
+        events = []
+        listed = 0
+        with self._lock:
+            pending = [self.root]
+            while pending:
+                dirpath = pending.pop()
+                record = self.dirs.get(dirpath)
+                try:
+                    mtime = os.stat(dirpath).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+                if record is not None and not full and record['mtime'] == mtime:
+                    pending.extend(os.path.join(dirpath, name) for name in record['subdirs'])
+                    continue
+                listed += 1
+                listing = self._list(dirpath, record, matches, baseline, events)
+                if listing is None:
+                    # left unmarked, it is listed again on the next start
+                    if record is not None:
+                        pending.extend(os.path.join(dirpath, name) for name in record['subdirs'])
+                    continue
+                listing['mtime'] = mtime
+                pending.extend(os.path.join(dirpath, name) for name in listing['subdirs'])
+                if listing['paths']:
+                    self._outstanding[dirpath] = listing
+                    for path in listing['paths']:
+                        self._outstanding_paths[path] = dirpath
+                elif baseline:
+                    self._apply({'o': 'd', 'p': dirpath, 'm': mtime, 'c': listing['subdirs']})
+                else:
+                    self._mark(dirpath, listing)
+        if baseline:
+            self.checkpoint()
+        else:
+            self._checkpoint_if_due()
+        logging.info(f"Catch-up listed {listed} of {len(self.dirs)} directories, "
+                     f"{len(events)} changes to replay")
+        return events
+
+    def _list(self, dirpath, record, matches, baseline, events):
+        """
+        List one directory and diff it, caller holds the lock.
+
+        Returns:
+            dict: Listing with the current "subdirs", the "removed" subdirs
+                and the replayed "paths" that must be processed before the
+                directory can be marked, None if it cannot be listed
+        """
+        known = dict(record['files']) if record is not None else {}
+        known_subdirs = set(record['subdirs']) if record is not None else set()
+        changed = set()
+        subdirs = []
+        listing = {'subdirs': subdirs, 'removed': [], 'paths': changed}
+        try:
+            entries = list(os.scandir(dirpath))
+        except OSError as error:
+            logging.warning(f"Cannot list {dirpath}: {error}")
+            return None
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+                continue
+            if not entry.is_file() or not matches(entry.path):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            current = [st.st_size, st.st_mtime_ns]
+            previous = known.pop(entry.name, None)
+            if baseline:
+                # the baseline goes straight to the snapshot written at the end
+                self._apply({'o': 'f', 'p': entry.path, 's': st.st_size, 'm': st.st_mtime_ns})
+            elif previous is None:
+                events.append(FileCreatedEvent(entry.path))
+                changed.add(entry.path)
+            elif previous != current:
+                events.append(FileModifiedEvent(entry.path))
+                changed.add(entry.path)
+        for name in known:
+            path = os.path.join(dirpath, name)
+            events.append(FileDeletedEvent(path))
+            changed.add(path)
+        for name in known_subdirs.difference(subdirs):
+            removed = os.path.join(dirpath, name)
+            listing['removed'].append(removed)
+            prefix = removed + os.sep
+            for known_dir, known_record in self.dirs.items():
+                if known_dir == removed or known_dir.startswith(prefix):
+                    for file_name in known_record['files']:
+                        path = os.path.join(known_dir, file_name)
+                        events.append(FileDeletedEvent(path))
+                        changed.add(path)
+        return listing
@@ -0,0 +1,261 @@
+# coding: utf-8
+"""
+Throughput and latency metrics for the watchdog monitor.
+
+MonitorMetrics counts events by type and by the pattern that matched them,
+keeps a per second window to report events/s, records a latency histogram
+per event type (from the moment the event entered the queue to the moment
+its handler finished) and samples backlog gauges such as the observer's
+inotify event queue. The numbers are served as plain text on a local HTTP
+port (GET /metrics, GET /metrics.json) and/or written periodically to a
+JSON snapshot file.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import PurePosixPath, PureWindowsPath
+
+# upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+NO_PATTERN = '*'
+
+# quantiles past the last bucket have no finite bound, JSON has no Infinity
+OVERFLOW_BOUND = '+Inf'
+
+
+def _label(value):
+    """Escape a Prometheus label value."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram with fixed buckets."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding quantile q, None if empty and
+        OVERFLOW_BOUND if it is past the last bucket.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts[:-1]):
+            seen += count
+            if seen >= rank:
+                return self.buckets[i]
+        return OVERFLOW_BOUND
+
+
+class MonitorMetrics:
+    """Counters, rates, latency histograms and backlog gauges of a monitor."""
+
+    def __init__(self, patterns=None, case_sensitive=True, window=60):
+        """
+        Args:
+            patterns (list): Handler patterns, events are counted by the
+                first one that matches
+            case_sensitive (bool): Match patterns like the handler does
+            window (int): Seconds used for the events/s rates
+        """
+        self.patterns = list(patterns or [])
+        self.case_sensitive = case_sensitive
+        self.window = window
+        self.started = time.monotonic()
+        self.totals = Counter()  # (type, pattern) -> events
+        self.latency = {}  # type -> LatencyHistogram
+        self._seconds = deque()  # (second, Counter of types)
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def add_gauge(self, name, func):
+        """Register a callable sampled on every snapshot, e.g. a queue size."""
+        self._gauges[name] = func
+
+    def pattern_of(self, path):
+        """First handler pattern matching path."""
+        pure = PurePosixPath(path) if self.case_sensitive else PureWindowsPath(path)
+        for pattern in self.patterns:
+            if pure.match(pattern if self.case_sensitive else pattern.lower()):
+                return pattern
+        return NO_PATTERN
+
+    def record_event(self, event):
+        """Count an event as received, runs on the observer thread."""
+        pattern = self.pattern_of(getattr(event, 'dest_path', '') or event.src_path)
+        second = int(time.monotonic())
+        with self._lock:
+            self.totals[(event.event_type, pattern)] += 1
+            if not self._seconds or self._seconds[-1][0] != second:
+                self._seconds.append((second, Counter()))
+                while self._seconds[0][0] <= second - self.window:
+                    self._seconds.popleft()
+            self._seconds[-1][1][event.event_type] += 1
+
+    def observe_latency(self, event_type, seconds):
+        """Record how long an event took from enqueue to handler completion."""
+        with self._lock:
+            histogram = self.latency.get(event_type)
+            if histogram is None:
+                histogram = self.latency[event_type] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def rates(self):
+        """Events per second by type over the last window seconds."""
+        now = int(time.monotonic())
+        span = min(self.window, max(1, now - int(self.started) + 1))
+        rates = Counter()
+        with self._lock:
+            for second, counts in self._seconds:
+                if second > now - self.window:
+                    rates.update(counts)
+        return {event_type: count / span for event_type, count in rates.items()}
+
+    def snapshot(self):
+        """All metrics as a JSON serializable dict."""
+        gauges = {}
+        for name, func in self._gauges.items():
+            try:
+                gauges[name] = func()
+            except Exception as error:
+                logging.debug(f"Gauge {name} failed: {error}")
+        with self._lock:
+            totals = [{'type': event_type, 'pattern': pattern, 'count': count}
+                      for (event_type, pattern), count in sorted(self.totals.items())]
+            latency = {event_type: {'count': h.count, 'sum': h.total,
+                                    'p50': h.quantile(0.5), 'p99': h.quantile(0.99),
+                                    'buckets': dict(zip([str(b) for b in h.buckets] + [OVERFLOW_BOUND], h.counts))}
+                       for event_type, h in sorted(self.latency.items())}
+        return {'timestamp': time.time(), 'uptime': time.monotonic() - self.started,
+                'events_total': totals, 'events_per_second': self.rates(),
+                'latency_seconds': latency, 'backlog': gauges}
+
+    def render_text(self):
+        """Metrics in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        lines = ['# TYPE watchdog_events_total counter']
+        for row in snap['events_total']:
+            lines.append(f'watchdog_events_total{{type="{_label(row["type"])}",pattern="{_label(row["pattern"])}"}} '
+                         f'{row["count"]}')
+        lines.append('# TYPE watchdog_events_per_second gauge')
+        for event_type, rate in sorted(snap['events_per_second'].items()):
+            lines.append(f'watchdog_events_per_second{{type="{_label(event_type)}"}} {rate:.3f}')
+        lines.append('# TYPE watchdog_handler_latency_seconds histogram')
+        with self._lock:
+            histograms = sorted(self.latency.items())
+            for event_type, h in histograms:
+                event_type = _label(event_type)
+                cumulative = 0
+                for bound, count in zip([str(b) for b in h.buckets] + [OVERFLOW_BOUND], h.counts):
+                    cumulative += count
+                    lines.append(f'watchdog_handler_latency_seconds_bucket{{type="{event_type}",le="{bound}"}} '
+                                 f'{cumulative}')
+                lines.append(f'watchdog_handler_latency_seconds_sum{{type="{event_type}"}} {h.total:.6f}')
+                lines.append(f'watchdog_handler_latency_seconds_count{{type="{event_type}"}} {h.count}')
+        lines.append('# TYPE watchdog_backlog gauge')
+        for name, value in sorted(snap['backlog'].items()):
+            lines.append(f'watchdog_backlog{{queue="{_label(name)}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """One line for the shutdown log."""
+        snap = self.snapshot()
+        def seconds(bound):
+            return bound if bound == OVERFLOW_BOUND else f"{bound}s"
+
+        latency = ', '.join(f"{event_type} p50<={seconds(h['p50'])} p99<={seconds(h['p99'])}"
+                            for event_type, h in snap['latency_seconds'].items())
+        return (f"{sum(row['count'] for row in snap['events_total'])} events, "
+                f"latency: {latency or 'none'}, backlog: {snap['backlog']}")
+
+
+class MetricsServer:
+    """Serve a MonitorMetrics on a local HTTP port from a daemon thread."""
+
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        outer = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = outer.render_text(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, content_type = json.dumps(outer.snapshot()), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logging.debug(f"metrics: {format % args}")
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-http", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class MetricsFileWriter:
+    """Write a MonitorMetrics snapshot to a JSON file every interval seconds."""
+
+    def __init__(self, metrics, path, interval=10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-file", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread and write a last snapshot."""
+        self._stop.set()
+        self._thread.join()
+        self.write()
+
+    def write(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(self.metrics.snapshot(), fh, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as error:
+                logging.warning(f"Cannot write metrics to {self.path}: {error}")
@@ -0,0 +1,252 @@
+# coding: utf-8
+"""
+Watch many roots, sharded across several observers.
+
+Roots come from a JSON config file, each with its own patterns:
+
+    {
+        "shards": 4,
+        "polling_interval": 5,
+        "roots": [
+            {"path": "/data/uploads/menu", "patterns": ["*.jpg", "*.png"],
+             "ignore_patterns": ["tmp_*", "*_resized_*"]},
+            {"path": "/data/uploads/docs", "patterns": ["*.pdf"], "recursive": false},
+            {"path": "/mnt/nfs/archive", "patterns": ["*.jpg"], "polling": true}
+        ]
+    }
+
+inotify needs one watch per directory, so roots are weighted by their
+directory count and spread greedily over `shards` observers, each with its
+own dispatch thread. A root that would exceed fs.inotify.max_user_watches,
+or whose watches fail with ENOSPC/EMFILE, falls back to a PollingObserver
+that rescans it every `polling_interval` seconds. `"polling": true` forces
+polling, e.g. for network mounts where inotify sees no remote changes.
+"""
+
+import os
+import json
+import errno
+import logging
+import traceback
+
+from watchdog.observers import Observer
+from watchdog.observers.api import ObservedWatch
+from watchdog.observers.polling import PollingObserver
+
+try:
+    from watchdog.observers.inotify_c import Inotify
+except ImportError:  # not on Linux
+    Inotify = None
+
+# inotify errors raised when the watch or instance limit is reached
+WATCH_LIMIT_ERRORS = (errno.ENOSPC, errno.EMFILE)
+
+MAX_USER_WATCHES = '/proc/sys/fs/inotify/max_user_watches'
+
+ROOT_DEFAULTS = {
+    'patterns': None,
+    'ignore_patterns': None,
+    'ignore_directories': False,
+    'recursive': True,
+    'polling': False,
+}
+
+
+def load_config(config_path):
+    """
+    Read a roots config file.
+
+    Returns:
+        dict: Config with "shards", "polling_interval" and "roots", every
+            root has all the keys of ROOT_DEFAULTS
+
+    Raises:
+        ValueError: If the file has no roots or a root has no path
+    """
+    with open(config_path, encoding='utf-8') as fh:
+        config = json.load(fh)
+    roots = []
+    for root in config.get('roots', []):
+        if not root.get('path'):
+            raise ValueError(f"Root without a path in {config_path}: {root}")
+        root = dict(ROOT_DEFAULTS, **root)
+        root['path'] = os.path.abspath(root['path'])
+        roots.append(root)
+    if not roots:
+        raise ValueError(f"No roots in {config_path}")
+    return {'shards': max(1, int(config.get('shards', 1))),
+            'polling_interval': float(config.get('polling_interval', 5)),
+            'roots': roots}
+
+
+def count_dirs(path, recursive=True):
+    """Number of inotify watches path needs: itself plus every sub folder."""
+    if not recursive:
+        return 1
+    count = 0
+    pending = [path]
+    while pending:
+        dirpath = pending.pop()
+        count += 1
+        try:
+            with os.scandir(dirpath) as entries:
+                pending.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+        except OSError:
+            continue
+    return count
+
+
+def shard_roots(roots, shards):
+    """
+    Spread roots over shards, biggest first onto the lightest shard.
+
+    Args:
+        roots (list): Root dicts with a "watches" count
+        shards (int): Number of observers
+
+    Returns:
+        list: One list of roots per shard
+    """
+    buckets = [[] for _ in range(shards)]
+    loads = [0] * shards
+    for root in sorted(roots, key=lambda r: r['watches'], reverse=True):
+        lightest = loads.index(min(loads))
+        buckets[lightest].append(root)
+        loads[lightest] += root['watches']
+    return buckets
+
+
+def release_failed_inotify(error):
+    """
+    Close the inotify instance left by a schedule() that failed.
+
+    The emitter builds its Inotify while starting; when adding the watches
+    fails half way the instance, its fd and the watches added so far are
+    only referenced by the traceback. Closing the fd releases the watches.
+    """
+    if Inotify is None:
+        return
+    for frame, _ in traceback.walk_tb(error.__traceback__):
+        instance = frame.f_locals.get('self')
+        if isinstance(instance, Inotify):
+            for name in ('_inotify_fd', '_kill_r', '_kill_w'):
+                fd = instance.__dict__.get(name)
+                if fd is not None:
+                    os.close(fd)
+            return
+
+
+def inotify_watch_limit():
+    """fs.inotify.max_user_watches, None where inotify is not used."""
+    try:
+        with open(MAX_USER_WATCHES) as fh:
+            return int(fh.read())
+    except (OSError, ValueError):
+        return None
+
+
+class ShardedMonitor:
+    """Schedule the roots of a config over several observers."""
+
+    def __init__(self, config, handler_factory, observer_class=Observer):
+        """
+        Args:
+            config (dict): As returned by load_config()
+            handler_factory (callable): Takes a root dict, returns the event
+                handler for that root
+            observer_class (type): Native observer used by the shards
+        """
+        self.config = config
+        self.handler_factory = handler_factory
+        self.observer_class = observer_class
+        self.observers = []
+        self.polling_observer = None
+        self.handlers = []
+        self.shards = []  # per shard: list of roots scheduled natively
+        self.polled = []  # roots on the polling observer
+
+    def _poll(self, handler, root):
+        if self.polling_observer is None:
+            self.polling_observer = PollingObserver(timeout=self.config['polling_interval'])
+            self.polling_observer.start()
+        self.polling_observer.schedule(handler, root['path'], recursive=root['recursive'])
+        self.polled.append(root)
+
+    def start(self):
+        """Count watches, shard the roots and start every observer."""
+        native = []
+        for root in self.config['roots']:
+            if root['polling']:
+                root['watches'] = 0
+                handler = self.handler_factory(root)
+                self.handlers.append(handler)
+                self._poll(handler, root)
+            else:
+                root['watches'] = count_dirs(root['path'], root['recursive'])
+                native.append(root)
+        budget = inotify_watch_limit()
+        used = 0
+
+        for shard in shard_roots(native, self.config['shards']):
+            observer = self.observer_class()
+            # started first, so schedule() adds the watches right away and
+            # a limit error is raised for the root that caused it
+            observer.start()
+            self.observers.append(observer)
+            scheduled = []
+            for root in shard:
+                handler = self.handler_factory(root)
+                self.handlers.append(handler)
+                if budget is not None and used + root['watches'] > budget:
+                    logging.warning(f"{root['path']} needs {root['watches']} watches, over the "
+                                    f"inotify limit of {budget}; polling it instead")
+                    self._poll(handler, root)
+                    continue
+                try:
+                    observer.schedule(handler, root['path'], recursive=root['recursive'])
+                except OSError as error:
+                    if error.errno not in WATCH_LIMIT_ERRORS:
+                        raise
+                    # the failed watch got no emitter, drop its handler too
+                    release_failed_inotify(error)
+                    observer.remove_handler_for_watch(
+                        handler, ObservedWatch(root['path'], recursive=root['recursive']))
+                    logging.warning(f"{root['path']}: {error.strerror}; polling it instead")
+                    self._poll(handler, root)
+                    continue
+                used += root['watches']
+                scheduled.append(root)
+            if not scheduled:
+                # every root of the shard is polled, its dispatch thread has nothing to do
+                observer.stop()
+                observer.join()
+                self.observers.remove(observer)
+                continue
+            self.shards.append(scheduled)
+
+    def all_observers(self):
+        return self.observers + ([self.polling_observer] if self.polling_observer else [])
+
+    def report(self):
+        """
+        Watch counts per shard.
+
+        Returns:
+            list: One dict per shard with "shard", "kind", "roots" and
+                "watches"; polled roots are reported as a last "polling" shard
+        """
+        rows = [{'shard': index, 'kind': 'native', 'roots': [root['path'] for root in shard],
+                 'watches': sum(root['watches'] for root in shard)}
+                for index, shard in enumerate(self.shards)]
+        if self.polled:
+            rows.append({'shard': len(self.shards), 'kind': 'polling',
+                         'roots': [root['path'] for root in self.polled],
+                         'watches': 0})
+        return rows
+
+    def stop(self):
+        """Stop and join every observer."""
+        for observer in self.all_observers():
+            observer.stop()
+        for observer in self.all_observers():
+            observer.join()
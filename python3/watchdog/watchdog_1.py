@@ -1,8 +1,8 @@
 # coding: utf-8
 
 import logging
+import os
 import sys
-import time
 
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
@@ -35,8 +35,10 @@ if __name__ == '__main__':
     observer.schedule(event_handler, path, recursive=True)
     observer.start()
     try:
-        while True:
-            time.sleep(1)
+        # returns when the observer thread ends; Ctrl+C interrupts it except on
+        # Windows, where the join needs a timeout to notice it
+        while observer.is_alive():
+            observer.join(1 if os.name == 'nt' else None)
     finally:
         observer.stop()
         observer.join()
@@ -3,11 +3,20 @@
 import sys
 import time
 import os
+import heapq
 import argparse
+import threading
 from pathlib import Path
 
-from watchdog.events import PatternMatchingEventHandler
+from watchdog.events import (EVENT_TYPE_CLOSED, EVENT_TYPE_CLOSED_NO_WRITE,
+                             EVENT_TYPE_CREATED, EVENT_TYPE_MODIFIED,
+                             EVENT_TYPE_OPENED, PatternMatchingEventHandler)
 from watchdog.observers import Observer
+from watchdog.utils.patterns import match_any_paths
+
+from monitor_journal import MonitorJournal
+from monitor_metrics import MetricsFileWriter, MetricsServer, MonitorMetrics
+from sharded_monitor import ShardedMonitor, load_config
 
 import logging
 
@@ -34,11 +43,115 @@ def setup_logging(log_level=logging.INFO, log_file=None):
     )
 
 
+class CoalescingEventQueue:
+    """
+    Queue between the observer thread and the workers that merges bursts.
+
+    Events are keyed by path. A new event for a path that is still pending
+    replaces the pending one (a created file stays created while it is being
+    written, open/close events never replace anything) and restarts its
+    debounce window; an event is handed out only
+    after the path has been quiet for `debounce` seconds.
+    """
+
+    # events that do not change what a pending event means
+    FOLDED_INTO_ANY = (EVENT_TYPE_OPENED, EVENT_TYPE_CLOSED, EVENT_TYPE_CLOSED_NO_WRITE)
+    # events that do not change what a pending "created" means
+    FOLDED_INTO_CREATED = FOLDED_INTO_ANY + (EVENT_TYPE_MODIFIED,)
+
+    def __init__(self, debounce=0.5, clock=time.monotonic):
+        self.debounce = debounce
+        self.dropped = 0
+        self._clock = clock
+        self._pending = {}  # path -> [event, last_seen, enqueued_at]
+        self._deadlines = []  # heap of (deadline, seq, path), one per path
+        self._seq = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def depth(self):
+        """Number of paths waiting to be processed."""
+        with self._cond:
+            return len(self._pending)
+
+    def put(self, event):
+        """Add an event, merging it with a pending event for the same path."""
+        now = self._clock()
+        with self._cond:
+            pending = self._pending.get(event.src_path)
+            if pending is None:
+                self._pending[event.src_path] = [event, now, now]
+                self._seq += 1
+                heapq.heappush(self._deadlines, (now + self.debounce, self._seq, event.src_path))
+                self._cond.notify()
+                return
+            self.dropped += 1
+            folded = (self.FOLDED_INTO_CREATED if pending[0].event_type == EVENT_TYPE_CREATED
+                      else self.FOLDED_INTO_ANY)
+            if event.event_type not in folded:
+                pending[0] = event
+            pending[1] = now
+
+    def get(self, timeout=None):
+        """
+        Wait for the next settled event.
+
+        Args:
+            timeout (float): Seconds to wait, None waits until close()
+
+        Returns:
+            tuple: (event, enqueued_at) or None on timeout or once the
+                queue is closed and drained
+        """
+        give_up = None if timeout is None else self._clock() + timeout
+        with self._cond:
+            while True:
+                now = self._clock()
+                if self._deadlines:
+                    deadline, seq, path = self._deadlines[0]
+                    event, last_seen, enqueued_at = self._pending[path]
+                    settled = last_seen + self.debounce
+                    if settled > deadline:
+                        # the path got new events, wait for its new window
+                        heapq.heapreplace(self._deadlines, (settled, seq, path))
+                        continue
+                    if deadline <= now or self._closed:
+                        heapq.heappop(self._deadlines)
+                        del self._pending[path]
+                        return event, enqueued_at
+                    wait = deadline - now
+                elif self._closed:
+                    return None
+                else:
+                    wait = None
+                if give_up is not None:
+                    if now >= give_up:
+                        return None
+                    wait = give_up - now if wait is None else min(wait, give_up - now)
+                self._cond.wait(wait)
+
+    def close(self):
+        """Release every pending event now and stop the workers once drained."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
 class EnhancedEventHandler(PatternMatchingEventHandler):
-    """Enhanced event handler with detailed event processing."""
+    """
+    Enhanced event handler with detailed event processing.
+
+    The observer thread only counts events and puts them in a
+    CoalescingEventQueue; a pool of worker threads does the processing and
+    records each processed event in the MonitorJournal, if any. With a
+    MonitorMetrics every event is counted on arrival and its latency, from
+    enqueue to the end of process(), is recorded.
+    """
     
     def __init__(self, patterns=None, ignore_patterns=None, 
-                 ignore_directories=False, case_sensitive=True):
+                 ignore_directories=False, case_sensitive=True,
+                 debounce=0.5, workers=2, journal=None, metrics=None):
         super().__init__(
             patterns=patterns,
             ignore_patterns=ignore_patterns, 
@@ -46,35 +159,104 @@ class EnhancedEventHandler(PatternMatchingEventHandler):
             case_sensitive=case_sensitive
         )
         self.event_count = 0
+        self.processed_count = 0
+        self.queue = CoalescingEventQueue(debounce)
+        self.workers = workers
+        self.journal = journal
+        self.metrics = metrics
+        self._threads = []
+        self._lock = threading.Lock()
+    
+    def start(self):
+        """Start the worker threads."""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"event-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self):
+        """Process the pending events and wait for the workers."""
+        self.queue.close()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
     
     def on_any_event(self, event):
-        """Handle any file system event."""
+        """Queue any file system event, runs on the observer thread."""
         self.event_count += 1
-        logging.info(f"Event #{self.event_count}: {event.event_type} - {event.src_path}")
+        if self.metrics is not None:
+            self.metrics.record_event(event)
+        self.queue.put(event)
+    
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            event, enqueued_at = item
+            try:
+                self.process(event)
+                if self.journal is not None:
+                    self.journal.record(event)
+            except Exception:
+                logging.exception(f"Failed to process {event.event_type} - {event.src_path}")
+            if self.metrics is not None:
+                self.metrics.observe_latency(event.event_type, time.monotonic() - enqueued_at)
+            with self._lock:
+                self.processed_count += 1
+    
+    def process(self, event):
+        """Handle a coalesced event on a worker thread."""
+        logging.info(f"Event: {event.event_type} - {event.src_path}")
+        handler = getattr(self, f"process_{event.event_type}", None)
+        if handler is not None:
+            handler(event)
     
-    def on_created(self, event):
+    def matches(self, path):
+        """True if path passes the patterns of this handler."""
+        return match_any_paths([path], included_patterns=self.patterns,
+                               excluded_patterns=self.ignore_patterns,
+                               case_sensitive=self.case_sensitive)
+    
+    def _log_size(self, message, path):
+        try:
+            file_size = os.path.getsize(path)
+        except FileNotFoundError:
+            logging.debug(f"Gone before processing: {path}")
+            return
+        logging.info(f"{message}: {path} ({file_size} bytes)")
+    
+    def process_created(self, event):
         """Handle file/directory creation event."""
         logging.debug(f"Created: {event.src_path}")
         if not event.is_directory:
-            file_size = os.path.getsize(event.src_path)
-            logging.info(f"New file created: {event.src_path} ({file_size} bytes)")
+            self._log_size("New file created", event.src_path)
     
-    def on_deleted(self, event):
+    def process_deleted(self, event):
         """Handle file/directory deletion event."""
         logging.debug(f"Deleted: {event.src_path}")
     
-    def on_modified(self, event):
+    def process_modified(self, event):
         """Handle file/directory modification event."""
         logging.debug(f"Modified: {event.src_path}")
         if not event.is_directory:
-            file_size = os.path.getsize(event.src_path)
-            logging.info(f"File modified: {event.src_path} ({file_size} bytes)")
+            self._log_size("File modified", event.src_path)
     
-    def on_moved(self, event):
+    def process_moved(self, event):
         """Handle file/directory move event."""
         logging.debug(f"Moved: {event.src_path} -> {event.dest_path}")
 
 
+def wait_for_observer(observer):
+    """Block until the observer thread ends or Ctrl+C, without periodic wake-ups."""
+    if os.name == 'nt':
+        # a join without timeout cannot be interrupted by Ctrl+C on Windows
+        while observer.is_alive():
+            observer.join(1)
+    else:
+        observer.join()
+
+
 def parse_arguments():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(
@@ -101,7 +283,111 @@ def parse_arguments():
     parser.add_argument('-l', '--log-file',
                         help='Log to file instead of console')
     
-    return parser.parse_args()
+    parser.add_argument('--debounce', type=float, default=0.5,
+                        help='Seconds a path must be quiet before its events are processed (default: 0.5)')
+    
+    parser.add_argument('--workers', type=int, default=2,
+                        help='Threads processing events (default: 2)')
+    
+    parser.add_argument('--state-dir',
+                        help='Keep a journal and snapshot here and catch up on changes missed while stopped')
+    
+    parser.add_argument('--catchup-full', action='store_true',
+                        help='Stat every file on catch-up, also finds files rewritten in place')
+    
+    parser.add_argument('--checkpoint-every', type=int, default=1000,
+                        help='Journal entries between snapshots (default: 1000)')
+    
+    parser.add_argument('--metrics-port', type=int,
+                        help='Serve metrics on http://127.0.0.1:PORT/metrics (text) and /metrics.json')
+    
+    parser.add_argument('--metrics-file',
+                        help='Write a JSON metrics snapshot to this file periodically')
+    
+    parser.add_argument('--metrics-interval', type=float, default=10.0,
+                        help='Seconds between metrics snapshots (default: 10)')
+    
+    parser.add_argument('-c', '--config',
+                        help='JSON file with many roots and their patterns, sharded across observers; '
+                             'replaces path, --patterns and --ignore-patterns')
+    
+    args = parser.parse_args()
+    if args.config and args.state_dir:
+        parser.error('--state-dir watches a single root and cannot be used with --config')
+    return args
+
+
+def start_exporters(metrics, args):
+    """Start the metrics endpoint and/or snapshot file asked for on the command line."""
+    exporters = []
+    if args.metrics_port is not None:
+        exporters.append(MetricsServer(metrics, args.metrics_port))
+        logging.info(f"Metrics on http://127.0.0.1:{exporters[-1].port}/metrics")
+    if args.metrics_file:
+        exporters.append(MetricsFileWriter(metrics, args.metrics_file, args.metrics_interval))
+    for exporter in exporters:
+        exporter.start()
+    return exporters
+
+
+def run_sharded(args):
+    """Watch the roots of args.config with one handler per root."""
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as error:
+        logging.error(f"Cannot load {args.config}: {error}")
+        return 1
+    
+    metrics = None
+    if args.metrics_port is not None or args.metrics_file:
+        patterns = [p for root in config['roots'] for p in (root['patterns'] or [])]
+        metrics = MonitorMetrics(list(dict.fromkeys(patterns)))
+    
+    def make_handler(root):
+        handler = EnhancedEventHandler(
+            patterns=root['patterns'],
+            ignore_patterns=root['ignore_patterns'],
+            ignore_directories=root['ignore_directories'],
+            debounce=args.debounce,
+            workers=args.workers,
+            metrics=metrics
+        )
+        handler.start()
+        return handler
+    
+    monitor = ShardedMonitor(config, make_handler)
+    monitor.start()
+    for row in monitor.report():
+        logging.info(f"Shard {row['shard']} ({row['kind']}): {len(row['roots'])} roots, "
+                     f"{row['watches']} watches: {', '.join(row['roots'])}")
+    
+    exporters = []
+    if metrics is not None:
+        for index, observer in enumerate(monitor.all_observers()):
+            metrics.add_gauge(f'observer_{index}', observer.event_queue.qsize)
+        metrics.add_gauge('coalescing', lambda: sum(h.queue.depth for h in monitor.handlers))
+        metrics.add_gauge('coalesced_dropped', lambda: sum(h.queue.dropped for h in monitor.handlers))
+        exporters = start_exporters(metrics, args)
+    
+    try:
+        logging.info("Observers started. Press Ctrl+C to stop...")
+        for observer in monitor.all_observers():
+            wait_for_observer(observer)
+    except KeyboardInterrupt:
+        logging.info("Stopping observers (Ctrl+C pressed)...")
+    finally:
+        monitor.stop()
+        for handler in monitor.handlers:
+            handler.stop()
+        for exporter in exporters:
+            exporter.stop()
+        if metrics is not None:
+            logging.info(f"Metrics: {metrics.summary()}")
+        logging.info(f"Monitoring stopped. Received {sum(h.event_count for h in monitor.handlers)} events, "
+                     f"processed {sum(h.processed_count for h in monitor.handlers)}, "
+                     f"dropped {sum(h.queue.dropped for h in monitor.handlers)} by coalescing.")
+    
+    return 0
 
 
 def main():
@@ -112,6 +398,9 @@ def main():
     log_level = logging.DEBUG if args.verbose else logging.INFO
     setup_logging(log_level, args.log_file)
     
+    if args.config:
+        return run_sharded(args)
+    
     # Normalize and validate path
     path = Path(args.path).resolve()
     if not path.exists():
@@ -122,28 +411,61 @@ def main():
     logging.info(f"Watching patterns: {args.patterns}")
     logging.info(f"Ignoring patterns: {args.ignore_patterns}")
     
+    journal = None
+    if args.state_dir:
+        journal = MonitorJournal(args.state_dir, path, args.checkpoint_every)
+    
+    metrics = None
+    if args.metrics_port is not None or args.metrics_file:
+        metrics = MonitorMetrics(args.patterns)
+    
     # Create event handler
     event_handler = EnhancedEventHandler(
         patterns=args.patterns,
         ignore_patterns=args.ignore_patterns,
-        ignore_directories=args.ignore_directories
+        ignore_directories=args.ignore_directories,
+        debounce=args.debounce,
+        workers=args.workers,
+        journal=journal,
+        metrics=metrics
     )
+    event_handler.start()
     
     # Setup and start observer
     observer = Observer()
     observer.schedule(event_handler, str(path), recursive=args.recursive)
     observer.start()
     
+    exporters = []
+    if metrics is not None:
+        metrics.add_gauge('observer', observer.event_queue.qsize)
+        metrics.add_gauge('coalescing', lambda: event_handler.queue.depth)
+        metrics.add_gauge('coalesced_dropped', lambda: event_handler.queue.dropped)
+        exporters = start_exporters(metrics, args)
+    
+    if journal is not None:
+        # the observer is already running, nothing changes unseen meanwhile
+        for event in journal.catch_up(event_handler.matches, full=args.catchup_full):
+            event_handler.dispatch(event)
+    
     try:
         logging.info("Observer started. Press Ctrl+C to stop...")
-        while True:
-            time.sleep(1)
+        wait_for_observer(observer)
     except KeyboardInterrupt:
         logging.info("Stopping observer (Ctrl+C pressed)...")
     finally:
         observer.stop()
         observer.join()
-        logging.info(f"Monitoring stopped. Processed {event_handler.event_count} events.")
+        event_handler.stop()
+        if journal is not None:
+            journal.close()
+        for exporter in exporters:
+            exporter.stop()
+        if metrics is not None:
+            logging.info(f"Metrics: {metrics.summary()}")
+        logging.info(f"Monitoring stopped. Received {event_handler.event_count} events, "
+                     f"processed {event_handler.processed_count}, "
+                     f"dropped {event_handler.queue.dropped} by coalescing.")
     
     return 0
 